@@ -0,0 +1,207 @@
+# backend/app/appointments/archive_ndjson.py
+# Partitioned, gzip-compressed NDJSON archive of appointment rows in S3:
+#   s3://<bucket>/<S3_PREFIX_APPTS_NDJSON>/dt=YYYY-MM-DD/clinic=<slug>/part-<ts>-<id>.ndjson.gz
+#
+#   python -m app.appointments.archive_ndjson compact [--delete] [--dry-run] [--batch 5000] [--force]
+#   python -m app.appointments.archive_ndjson read --date 2025-01-06 --clinic medmitra-clinic
+import os
+import io
+import re
+import sys
+import gzip
+import json
+import time
+import uuid
+import logging
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import boto3
+
+log = logging.getLogger("appt-archive-ndjson")
+
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_BUCKET_NAME") or "").strip() or None
+S3_PREFIX_APPTS = os.getenv("S3_PREFIX_APPTS", "appointments").strip().strip("/")
+S3_PREFIX_APPTS_NDJSON = os.getenv("S3_PREFIX_APPTS_NDJSON", "appointments_ndjson").strip().strip("/")
+COMPACT_MAX_PENDING = int(os.getenv("COMPACT_MAX_PENDING", "50000"))   # rows buffered across partitions
+
+Partition = Tuple[str, str]  # (date, clinic slug)
+
+
+def _slug(v: str) -> str:
+    s = re.sub(r"[^a-z0-9]+", "-", (v or "").strip().lower()).strip("-")
+    return s[:64] or "unknown"
+
+
+def partition_of(item: Dict[str, Any]) -> Partition:
+    details = item.get("appointment_details") or {}
+    if not isinstance(details, dict):
+        details = {}
+    day = (details.get("dateISO") or item.get("dateISO") or str(item.get("createdAt") or ""))[:10]
+    if not re.match(r"^\d{4}-\d{2}-\d{2}$", day):
+        day = "unknown"
+    return day, _slug(details.get("clinicName") or item.get("clinicName") or "")
+
+
+def partition_prefix(day: str, clinic: str) -> str:
+    return f"{S3_PREFIX_APPTS_NDJSON}/dt={day}/clinic={_slug(clinic)}/"
+
+
+def encode_batch(records: Iterable[Dict[str, Any]]) -> bytes:
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6, mtime=0) as gz:
+        for rec in records:
+            gz.write(json.dumps(rec, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8"))
+            gz.write(b"\n")
+    return buf.getvalue()
+
+
+def write_partition(s3, bucket: str, part: Partition, records: List[Dict[str, Any]]) -> str:
+    key = f"{partition_prefix(*part)}part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=encode_batch(records),
+        ContentType="application/x-ndjson",
+        ContentEncoding="gzip",
+    )
+    return key
+
+
+def group_by_partition(items: Iterable[Dict[str, Any]]) -> Dict[Partition, List[Dict[str, Any]]]:
+    groups: Dict[Partition, List[Dict[str, Any]]] = defaultdict(list)
+    for it in items:
+        groups[partition_of(it)].append(it)
+    return groups
+
+
+def _iter_keys(s3, bucket: str, prefix: str) -> Iterator[str]:
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []) or []:
+            yield obj["Key"]
+
+
+def iter_partition(s3, bucket: str, day: str, clinic: str) -> Iterator[Dict[str, Any]]:
+    """Stream every record of one partition; objects are decompressed incrementally."""
+    for key in _iter_keys(s3, bucket, partition_prefix(day, clinic)):
+        if not key.endswith(".ndjson.gz"):
+            continue
+        body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+        with gzip.GzipFile(fileobj=body, mode="rb") as gz:
+            for line in gz:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class CompactError(Exception):
+    pass
+
+
+def _marker_prefix() -> str:
+    # outside dt=..., so partition reads never see it
+    return f"{S3_PREFIX_APPTS_NDJSON}/_compacted/"
+
+
+def compact(s3, bucket: str, batch: int = 5000, delete: bool = False, dry_run: bool = False,
+            max_pending: int = COMPACT_MAX_PENDING, force: bool = False) -> Dict[str, int]:
+    """
+    Rewrite per-object archives (<S3_PREFIX_APPTS>/<patientId>/<appointmentId>.json) into
+    partitioned NDJSON batches of up to `batch` records. At most `max_pending` rows are
+    buffered across partitions; past that the largest partition is written early.
+    Originals are only deleted (with --delete) after the batch holding them has been written.
+
+    Without --delete the originals stay, so running again would write every record a
+    second time: such a run leaves a marker under <S3_PREFIX_APPTS_NDJSON>/_compacted/
+    and later runs (with or without --delete) refuse to start while one exists; remove the
+    marker once the originals are gone, or pass --force.
+    """
+    if not dry_run and not force:
+        previous = next(_iter_keys(s3, bucket, _marker_prefix()), None)
+        if previous:
+            raise CompactError(
+                f"{previous} records an earlier compaction that kept its originals; running again "
+                f"would duplicate them. Delete the originals (and the marker) first, or use --force."
+            )
+    pending: Dict[Partition, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+    buffered = 0
+    out = {"read": 0, "written": 0, "objects": 0, "deleted": 0, "skipped": 0}
+
+    def flush(part: Partition):
+        nonlocal buffered
+        rows = pending.pop(part, [])
+        if not rows:
+            return
+        buffered -= len(rows)
+        if not dry_run:
+            write_partition(s3, bucket, part, [r for _, r in rows])
+        out["written"] += len(rows)
+        out["objects"] += 1
+        if delete and not dry_run:
+            keys = [k for k, _ in rows]
+            for i in range(0, len(keys), 1000):
+                s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]], "Quiet": True})
+            out["deleted"] += len(keys)
+
+    for key in _iter_keys(s3, bucket, f"{S3_PREFIX_APPTS}/"):
+        if not key.endswith(".json"):
+            continue
+        try:
+            item = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+        except Exception:
+            log.warning("Skipping unreadable archive object %s", key, exc_info=True)
+            out["skipped"] += 1
+            continue
+        out["read"] += 1
+        part = partition_of(item)
+        pending[part].append((key, item))
+        buffered += 1
+        if len(pending[part]) >= batch:
+            flush(part)
+        elif buffered > max_pending:
+            flush(max(pending, key=lambda p: len(pending[p])))
+
+    for part in list(pending):
+        flush(part)
+    if not delete and not dry_run and out["written"]:
+        s3.put_object(
+            Bucket=bucket, Key=f"{_marker_prefix()}{int(time.time())}.json",
+            Body=json.dumps(out).encode(), ContentType="application/json",
+        )
+    return out
+
+
+def _main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m app.appointments.archive_ndjson")
+    ap.add_argument("--bucket", default=S3_BUCKET)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compact", help="rewrite per-object JSON archives into NDJSON partitions")
+    c.add_argument("--batch", type=int, default=5000)
+    c.add_argument("--delete", action="store_true", help="delete originals once rewritten")
+    c.add_argument("--dry-run", action="store_true")
+    c.add_argument("--max-pending", type=int, default=COMPACT_MAX_PENDING, help="rows buffered across partitions")
+    c.add_argument("--force", action="store_true", help="run even though an earlier run kept its originals")
+    r = sub.add_parser("read", help="stream one partition to stdout as NDJSON")
+    r.add_argument("--date", required=True)
+    r.add_argument("--clinic", required=True)
+    args = ap.parse_args(argv)
+
+    if not args.bucket:
+        ap.error("S3_BUCKET (or --bucket) is required")
+    s3 = boto3.client("s3", region_name=AWS_REGION)
+
+    if args.cmd == "compact":
+        try:
+            out = compact(s3, args.bucket, args.batch, args.delete, args.dry_run, args.max_pending, args.force)
+        except CompactError as e:
+            sys.exit(str(e))
+        print(json.dumps(out))
+    else:
+        for rec in iter_partition(s3, args.bucket, args.date, args.clinic):
+            sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    _main()
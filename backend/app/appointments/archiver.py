@@ -0,0 +1,208 @@
+# backend/app/appointments/archiver.py
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import boto3
+from botocore.config import Config
+
+from app.appointments import archive_ndjson
+
+log = logging.getLogger("appt-archiver")
+
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_BUCKET_NAME") or "").strip() or None
+S3_PREFIX_APPTS = os.getenv("S3_PREFIX_APPTS", "appointments").strip().strip("/")
+
+ARCHIVE_QUEUE_MAX = int(os.getenv("ARCHIVE_QUEUE_MAX", "10000"))
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "2"))
+ARCHIVE_MAX_RETRIES = int(os.getenv("ARCHIVE_MAX_RETRIES", "5"))
+ARCHIVE_BACKOFF_BASE = float(os.getenv("ARCHIVE_BACKOFF_BASE", "0.2"))   # seconds
+ARCHIVE_BACKOFF_MAX = float(os.getenv("ARCHIVE_BACKOFF_MAX", "10"))
+ARCHIVE_SHUTDOWN_TIMEOUT = float(os.getenv("ARCHIVE_SHUTDOWN_TIMEOUT", "20"))
+
+# "object": one JSON per appointment; "ndjson": buffered, partitioned .ndjson.gz batches
+ARCHIVE_MODE = os.getenv("ARCHIVE_MODE", "object").strip().lower()
+ARCHIVE_BATCH_MAX = int(os.getenv("ARCHIVE_BATCH_MAX", "500"))
+ARCHIVE_FLUSH_SECONDS = float(os.getenv("ARCHIVE_FLUSH_SECONDS", "30"))
+
+_STOP = object()
+
+
+def archive_key(item: Dict[str, Any]) -> str:
+    return f"{S3_PREFIX_APPTS}/{item['patientId']}/{item['appointmentId']}.json"
+
+
+class AppointmentArchiver:
+    """
+    Copies booked appointment rows to S3 off the request path.
+    Bounded in-memory queue drained by worker threads; each upload is retried
+    with jittered exponential backoff. Items still queued at shutdown are
+    flushed (up to ARCHIVE_SHUTDOWN_TIMEOUT); a full queue drops and counts.
+    In "ndjson" mode each worker buffers up to ARCHIVE_BATCH_MAX rows or
+    ARCHIVE_FLUSH_SECONDS and writes one object per (date, clinic) partition.
+    """
+
+    def __init__(self, bucket: Optional[str], workers: int, maxsize: int, mode: str = "object"):
+        self.bucket = bucket
+        self.mode = "ndjson" if mode == "ndjson" else "object"
+        self.workers = max(1, workers)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._s3 = None
+        self._closed = False
+        self.enqueued = 0
+        self.archived = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket)
+
+    def _client(self):
+        if self._s3 is None:
+            self._s3 = boto3.client(
+                "s3",
+                region_name=AWS_REGION,
+                config=Config(max_pool_connections=self.workers, retries={"total_max_attempts": 1}),
+            )
+        return self._s3
+
+    def _start(self):
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"appt-archiver-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, item: Dict[str, Any]) -> Optional[str]:
+        """Queue `item` for archiving; returns its S3 key, or None if archiving is off / queue full."""
+        if not self.enabled or self._closed:
+            return None
+        self._start()
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            log.warning("Archive queue full; dropped %s/%s", item.get("patientId"), item.get("appointmentId"))
+            return None
+        with self._lock:
+            self.enqueued += 1
+        return archive_key(item) if self.mode == "object" else None
+
+    def _upload(self, item: Dict[str, Any]):
+        self._client().put_object(
+            Bucket=self.bucket,
+            Key=archive_key(item),
+            Body=json.dumps(item, ensure_ascii=False, default=str).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def _run(self):
+        if self.mode == "ndjson":
+            return self._run_batched()
+        while True:
+            item = self._q.get()
+            try:
+                if item is _STOP:
+                    return
+                self._with_retry(lambda: self._upload(item), 1, f"{item.get('patientId')}/{item.get('appointmentId')}")
+            finally:
+                self._q.task_done()
+
+    def _run_batched(self):
+        stop = False
+        while not stop:
+            buf: List[Dict[str, Any]] = []
+            deadline = None
+            while len(buf) < ARCHIVE_BATCH_MAX:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                self._q.task_done()
+                if item is _STOP:
+                    stop = True
+                    break
+                buf.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + ARCHIVE_FLUSH_SECONDS
+            for part, rows in archive_ndjson.group_by_partition(buf).items():
+                ok = self._with_retry(
+                    lambda: archive_ndjson.write_partition(self._client(), self.bucket, part, rows),
+                    len(rows),
+                    f"partition dt={part[0]} clinic={part[1]}",
+                )
+                if ok:
+                    with self._lock:
+                        self.batches += 1
+
+    def _with_retry(self, fn, count: int, what: str) -> bool:
+        for attempt in range(ARCHIVE_MAX_RETRIES + 1):
+            try:
+                fn()
+                with self._lock:
+                    self.archived += count
+                return True
+            except Exception:
+                if attempt >= ARCHIVE_MAX_RETRIES:
+                    break
+                with self._lock:
+                    self.retries += 1
+                delay = min(ARCHIVE_BACKOFF_MAX, ARCHIVE_BACKOFF_BASE * (2 ** attempt))
+                time.sleep(random.uniform(delay / 2, delay))
+        with self._lock:
+            self.failed += count
+        log.warning("S3 archive failed for %s", what, exc_info=True)
+        return False
+
+    def shutdown(self, timeout: float = ARCHIVE_SHUTDOWN_TIMEOUT):
+        """Stop accepting work, drain the queue, and join the workers (bounded by `timeout`)."""
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        if not threads:
+            return
+        deadline = time.monotonic() + timeout
+        for _ in threads:
+            try:
+                self._q.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        left = self._q.qsize()
+        if left:
+            log.warning("Archiver shutdown with %d items still queued", left)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "mode": self.mode,
+                "queueDepth": self._q.qsize(),
+                "queueMax": self._q.maxsize,
+                "workers": len(self._threads),
+                "enqueued": self.enqueued,
+                "archived": self.archived,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "retries": self.retries,
+                "batches": self.batches,
+            }
+
+
+archiver = AppointmentArchiver(S3_BUCKET, ARCHIVE_WORKERS, ARCHIVE_QUEUE_MAX, ARCHIVE_MODE)
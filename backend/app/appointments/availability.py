@@ -1,24 +1,82 @@
 # backend/app/appointments/availability.py
 import os
 import logging
-from typing import Optional
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as date_cls, timedelta
+from typing import Dict, List, Optional
 from boto3.dynamodb.conditions import Key
 from fastapi import APIRouter, HTTPException, Query
 
+from app.db import dynamo
+from app.appointments.slot_cache import availability_cache
+from app.appointments.schedule import schedule_book
+
 log = logging.getLogger("appt-availability")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
-AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_SLOTS = os.getenv("DDB_TABLE_SLOTS", "medmitra_appointment_slots")
-DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
+
+# Bulk fan-out: one range query per resource, run on a bounded pool.
+AVAILABILITY_FANOUT_WORKERS = int(os.getenv("AVAILABILITY_FANOUT_WORKERS", "8"))
+AVAILABILITY_MAX_RESOURCES = int(os.getenv("AVAILABILITY_MAX_RESOURCES", "50"))
+AVAILABILITY_MAX_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "31"))
+
+_fanout = ThreadPoolExecutor(max_workers=AVAILABILITY_FANOUT_WORKERS, thread_name_prefix="avail")
 
 def _slots_table():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb.Table(DDB_TABLE_SLOTS)
+    return dynamo.table(DDB_TABLE_SLOTS)
+
+def _query_booked(resource_key: str, key_cond) -> Dict[str, List[str]]:
+    """Run a slots query to completion (follows LastEvaluatedKey) -> {date: [HH:mm]}."""
+    tbl = _slots_table()
+    kwargs = {
+        "KeyConditionExpression": Key("resourceKey").eq(resource_key) & key_cond,
+        "ProjectionExpression": "slotKey",
+    }
+    by_date: Dict[str, set] = {}
+    while True:
+        resp = tbl.query(**kwargs)
+        for it in resp.get("Items", []):
+            sk = it.get("slotKey", "")
+            if "#" in sk:
+                d, t = sk.split("#", 1)
+                by_date.setdefault(d, set()).add(t)
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            break
+        kwargs["ExclusiveStartKey"] = lek
+    return {d: sorted(ts) for d, ts in by_date.items()}
+
+def _date_range(start: str, end: str) -> List[str]:
+    try:
+        d0 = date_cls.fromisoformat(start)
+        d1 = date_cls.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="dates must be 'YYYY-MM-DD'")
+    if d1 < d0:
+        raise HTTPException(status_code=422, detail="'to' must not be before 'from'")
+    days = (d1 - d0).days + 1
+    if days > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"date range too long (max {AVAILABILITY_MAX_DAYS} days)")
+    return [(d0 + timedelta(days=i)).isoformat() for i in range(days)]
+
+def booked_for_range(resource_key: str, dates: List[str]) -> Dict[str, List[str]]:
+    """Booked slots for every date in `dates` (contiguous, ascending), cache-first."""
+    out: Dict[str, List[str]] = {}
+    for d in dates:
+        cached = availability_cache.get(resource_key, d)
+        if cached is None:
+            break
+        out[d] = cached
+    else:
+        return out
+
+    token = availability_cache.token()
+    found = _query_booked(resource_key, Key("slotKey").between(f"{dates[0]}#", f"{dates[-1]}#~"))
+    out = {d: found.get(d, []) for d in dates}
+    for d, booked in out.items():
+        availability_cache.put(resource_key, d, booked, token)
+    return out
 
 @router.get("/availability")
 def availability(
@@ -35,19 +93,83 @@ def availability(
     }
     """
     resource_key = f"{type}#{resourceId}"
+    cached = availability_cache.get(resource_key, date)
+    if cached is not None:
+        return {"resourceKey": resource_key, "date": date, "booked": cached}
     try:
-        tbl = _slots_table()
-        prefix = f"{date}#"
-        resp = tbl.query(
-            KeyConditionExpression=Key("resourceKey").eq(resource_key) & Key("slotKey").begins_with(prefix)
-        )
-        booked: list[str] = []
-        for it in resp.get("Items", []):
-            sk = it.get("slotKey", "")
-            if "#" in sk:
-                booked.append(sk.split("#", 1)[1])
-        booked = sorted(set(booked))
+        token = availability_cache.token()
+        booked = _query_booked(resource_key, Key("slotKey").begins_with(f"{date}#")).get(date, [])
+        availability_cache.put(resource_key, date, booked, token)
         return {"resourceKey": resource_key, "date": date, "booked": booked}
     except Exception as e:
         log.exception("Slots query failed")
         raise HTTPException(status_code=500, detail=str(e))
+
+def _parse_ids(resourceIds: str) -> List[str]:
+    ids = list(dict.fromkeys(r.strip() for r in resourceIds.split(",") if r.strip()))
+    if not ids:
+        raise HTTPException(status_code=422, detail="resourceIds required")
+    if len(ids) > AVAILABILITY_MAX_RESOURCES:
+        raise HTTPException(status_code=422, detail=f"too many resourceIds (max {AVAILABILITY_MAX_RESOURCES})")
+    return ids
+
+def _fetch_booked(type: str, ids: List[str], dates: List[str]) -> Dict[str, Dict[str, List[str]]]:
+    try:
+        futures = {rid: _fanout.submit(booked_for_range, f"{type}#{rid}", dates) for rid in ids}
+        return {rid: fut.result() for rid, fut in futures.items()}
+    except Exception as e:
+        log.exception("Bulk slots query failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/availability/bulk")
+def availability_bulk(
+    type: str = Query(..., regex="^(doctor|lab)$"),
+    resourceIds: str = Query(..., min_length=1, description="comma-separated resource ids"),
+    from_: str = Query(..., alias="from", regex=r"^\d{4}-\d{2}-\d{2}$"),
+    to: Optional[str] = Query(None, regex=r"^\d{4}-\d{2}-\d{2}$"),
+):
+    """
+    Booked slots for several resources over a date range, one round trip.
+    {
+      "type": "doctor",
+      "from": "YYYY-MM-DD",
+      "to": "YYYY-MM-DD",
+      "booked": { "<resourceId>": { "YYYY-MM-DD": ["HH:mm", ...] } }
+    }
+    """
+    ids = _parse_ids(resourceIds)
+    dates = _date_range(from_, to or from_)
+    booked = _fetch_booked(type, ids, dates)
+    return {"type": type, "from": dates[0], "to": dates[-1], "booked": booked}
+
+@router.get("/availability/free")
+def availability_free(
+    type: str = Query(..., regex="^(doctor|lab)$"),
+    resourceIds: str = Query(..., min_length=1, description="comma-separated resource ids"),
+    from_: str = Query(..., alias="from", regex=r"^\d{4}-\d{2}-\d{2}$"),
+    to: Optional[str] = Query(None, regex=r"^\d{4}-\d{2}-\d{2}$"),
+    next: int = Query(0, ge=0, le=100, description="also return the N earliest free slots"),
+):
+    """
+    Free slots computed server-side from each resource's working-hour template
+    minus the booked slots table.
+    {
+      "type": "doctor",
+      "from": "YYYY-MM-DD",
+      "to": "YYYY-MM-DD",
+      "free": { "<resourceId>": { "YYYY-MM-DD": ["HH:mm", ...] } },
+      "next": { "<resourceId>": [{"date": "YYYY-MM-DD", "time": "HH:mm"}, ...] }
+    }
+    """
+    ids = _parse_ids(resourceIds)
+    dates = _date_range(from_, to or from_)
+    booked = _fetch_booked(type, ids, dates)
+
+    free: Dict[str, Dict[str, List[str]]] = {}
+    upcoming: Dict[str, List[Dict[str, str]]] = {}
+    for rid in ids:
+        free[rid], upcoming[rid] = schedule_book.free_slots(f"{type}#{rid}", booked[rid], dates, next)
+    out = {"type": type, "from": dates[0], "to": dates[-1], "free": free}
+    if next:
+        out["next"] = upcoming
+    return out
@@ -1,37 +1,24 @@
 # backend/app/appointments/book.py
 import os
-import json
 import uuid
 import logging
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
-import boto3
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel, Field, constr
 
+from app.db import dynamo
+from app.appointments.slot_cache import availability_cache
+from app.appointments.archiver import archiver
+
 log = logging.getLogger("appt-book")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_APPTS = os.getenv("DDB_TABLE_APPOINTMENTS", "medmitra-appointments")
 DDB_TABLE_SLOTS = os.getenv("DDB_TABLE_SLOTS", "medmitra_appointment_slots")
-S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_BUCKET_NAME") or "").strip() or None
-S3_PREFIX_APPTS = os.getenv("S3_PREFIX_APPTS", "appointments").strip().strip("/")
-
-DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
-
-def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
-
-ddb = _ddb()
-tbl_appts = ddb.Table(DDB_TABLE_APPTS)
-tbl_slots = ddb.Table(DDB_TABLE_SLOTS)
-s3 = boto3.client("s3", region_name=AWS_REGION) if S3_BUCKET else None
 
 def _now_iso():
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
@@ -61,16 +48,6 @@ class BookRequest(BaseModel):
 def _slot_key(date_iso: str, time_slot: str) -> str:
     return f"{date_iso}#{time_slot}"
 
-def _lock_slot(resource_key: str, slot_key: str, patient_id: str, appointment_id: str):
-    item = {
-        "resourceKey": resource_key,
-        "slotKey": slot_key,
-        "patientId": patient_id,
-        "appointmentId": appointment_id,
-        "createdAt": _now_iso(),
-    }
-    tbl_slots.put_item(Item=item, ConditionExpression="attribute_not_exists(slotKey)")
-
 @router.post("/book")
 def book_appointment(payload: BookRequest = Body(...)):
     appt = payload.appointment_details
@@ -80,18 +57,15 @@ def book_appointment(payload: BookRequest = Body(...)):
     appointment_id = str(uuid.uuid4())
     slot_key = _slot_key(appt.dateISO, appt.timeSlot)
     resource_key = f"doctor#{appt.doctorId}"
-
-    # 1) lock slot
-    try:
-        _lock_slot(resource_key, slot_key, payload.patientId, appointment_id)
-    except ClientError as e:
-        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
-            raise HTTPException(status_code=409, detail="Selected time slot is no longer available")
-        log.exception("Slot lock error")
-        raise HTTPException(status_code=500, detail=e.response.get("Error", {}).get("Message", str(e)))
-
-    # 2) write appointment
     created_at = _now_iso()
+
+    slot_item = {
+        "resourceKey": {"S": resource_key},
+        "slotKey": {"S": slot_key},
+        "patientId": {"S": payload.patientId},
+        "appointmentId": {"S": appointment_id},
+        "createdAt": {"S": created_at},
+    }
     item: Dict[str, Any] = {
         "patientId": payload.patientId,
         "appointmentId": appointment_id,
@@ -106,38 +80,42 @@ def book_appointment(payload: BookRequest = Body(...)):
         "dateKey": slot_key,
     }
 
+    # 1) lock slot + write appointment in one atomic round trip (no orphaned locks, no rollback)
     try:
-        tbl_appts.put_item(
-            Item=item,
-            ConditionExpression="attribute_not_exists(patientId) AND attribute_not_exists(appointmentId)"
-        )
+        dynamo.client().transact_write_items(TransactItems=[
+            {
+                "Put": {
+                    "TableName": DDB_TABLE_SLOTS,
+                    "Item": slot_item,
+                    "ConditionExpression": "attribute_not_exists(slotKey)",
+                }
+            },
+            {
+                "Put": {
+                    "TableName": DDB_TABLE_APPTS,
+                    "Item": dynamo.to_item(item),
+                    "ConditionExpression": "attribute_not_exists(patientId) AND attribute_not_exists(appointmentId)",
+                }
+            },
+        ])
     except ClientError as e:
-        # rollback slot on failure
-        try:
-            tbl_slots.delete_item(Key={"resourceKey": resource_key, "slotKey": slot_key})
-        except Exception:
-            pass
-        log.exception("Dynamo put_item failed")
-        raise HTTPException(status_code=500, detail=e.response.get("Error", {}).get("Message", str(e)))
-
-    # 3) archive to S3 (optional, best effort)
-    if s3 and S3_BUCKET:
-        try:
-            key = f"{S3_PREFIX_APPTS}/{payload.patientId}/{appointment_id}.json"
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=key,
-                Body=json.dumps(item, ensure_ascii=False).encode("utf-8"),
-                ContentType="application/json",
-            )
-            item["s3Key"] = key
-        except Exception:
-            log.warning("S3 archive failed for %s/%s", payload.patientId, appointment_id, exc_info=True)
+        err = e.response.get("Error", {})
+        if err.get("Code") == "TransactionCanceledException":
+            reasons = e.response.get("CancellationReasons") or []
+            # reasons[0] is the slot lock; a concurrent transaction on the same slot is also a lost race
+            if not reasons or reasons[0].get("Code") in ("ConditionalCheckFailed", "TransactionConflict"):
+                raise HTTPException(status_code=409, detail="Selected time slot is no longer available")
+        log.exception("Booking transaction failed")
+        raise HTTPException(status_code=500, detail=err.get("Message", str(e)))
+    availability_cache.add_booked(resource_key, appt.dateISO, [appt.timeSlot])
+
+    # 2) archive to S3 in the background (optional, best effort)
+    s3_key = archiver.submit(item)
 
     return {
         "patientId": payload.patientId,
         "appointmentId": appointment_id,
         "createdAt": created_at,
         "recordType": "doctor",
-        **({"s3Key": item.get("s3Key")} if item.get("s3Key") else {})
+        **({"s3Key": s3_key} if s3_key else {})
     }
@@ -1,35 +1,24 @@
 import os
-import json
 import uuid
 import logging
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
-import boto3
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, constr, validator
 
+from app.db import dynamo
+from app.appointments.slot_cache import availability_cache
+from app.appointments.archiver import archiver
+
 log = logging.getLogger("appt-book-batch")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_APPTS = os.getenv("DDB_TABLE_APPOINTMENTS", "medmitra-appointments")
 DDB_TABLE_SLOTS = os.getenv("DDB_TABLE_SLOTS", "medmitra_appointment_slots")
-S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_BUCKET_NAME") or "").strip() or None
-S3_PREFIX_APPTS = os.getenv("S3_PREFIX_APPTS", "appointments").strip().strip("/")
-
-DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
-
-def _ddb():
-  kw = {"region_name": AWS_REGION}
-  if DYNAMODB_ENDPOINT:
-    kw["endpoint_url"] = DYNAMODB_ENDPOINT
-  return boto3.client("dynamodb", **kw), boto3.resource("dynamodb", **kw)
-
-dcl, dbr = _ddb()
-tbl_appts = dbr.Table(DDB_TABLE_APPTS)
-s3 = boto3.client("s3", region_name=AWS_REGION) if S3_BUCKET else None
 
 def _now_iso():
   return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
@@ -57,11 +46,14 @@ class BookBatchRequest(BaseModel):
   appointment_details: AppointmentDetails
   timeSlots: List[constr(strip_whitespace=True, max_length=32)] = Field(..., description="HH:mm list")
   source: Optional[str] = "kiosk"
+  bestEffort: bool = Field(False, description="on conflict, book whichever slots are still free")
 
   @validator("timeSlots")
   def _len(cls, v):
     if not v or not isinstance(v, list):
       raise ValueError("timeSlots must be a non-empty list")
+    # a transaction may touch each slot item only once
+    v = list(dict.fromkeys(v))
     if len(v) > 12:
       raise ValueError("timeSlots too many (max 12)")
     return v
@@ -69,97 +61,123 @@ class BookBatchRequest(BaseModel):
 def _slot_key(date_iso: str, time_slot: str) -> str:
   return f"{date_iso}#{time_slot}"
 
-@router.post("/book-batch")
-def book_batch(payload: BookBatchRequest = Body(...)):
+def _appointment_item(payload: BookBatchRequest, aid: str, t: str, created_at: str) -> Dict[str, Any]:
+  appt = payload.appointment_details
+  return {
+    "patientId": payload.patientId,
+    "appointmentId": aid,
+    "createdAt": created_at,
+    "recordType": "doctor",
+    "status": "BOOKED",
+    "source": payload.source or "kiosk",
+    "dateKey": _slot_key(appt.dateISO, t),
+    "doctorId": appt.doctorId,
+    # denormalized fields
+    "appointment_details": {**appt.dict(), "timeSlot": t},
+  }
+
+def _transact(payload: BookBatchRequest, slots: List[str], created_at: str) -> Tuple[Dict[str, Dict[str, Any]], List[str], List[str]]:
+  """
+  One TransactWriteItems for `slots`: per slot, a conditional lock Put then the appointment Put.
+  -> ({slot: appointment item}, [], []) on success, ({}, taken, contended) when cancelled:
+  `taken` slots failed their lock condition (already booked), `contended` ones only collided
+  with another in-flight transaction (TransactionConflict) and may well still be free.
+  """
   appt = payload.appointment_details
-  if "T" in appt.dateISO:
-    raise HTTPException(status_code=422, detail="dateISO must be 'YYYY-MM-DD'")
-
-  dateISO = appt.dateISO
   resource_key = f"doctor#{appt.doctorId}"
-
-  # Prepare transact items: for each slot -> Put to SLOTS with condition; and Put to APPTS with condition
+  items: Dict[str, Dict[str, Any]] = {}
   transact_items: List[Dict[str, Any]] = []
-  appointment_ids: List[str] = []
-  created_at = _now_iso()
 
-  for t in payload.timeSlots:
+  for t in slots:
     aid = str(uuid.uuid4())
-    appointment_ids.append(aid)
-
-    # Slot lock item
-    slot_item = {
-      "resourceKey": {"S": resource_key},
-      "slotKey": {"S": _slot_key(dateISO, t)},
-      "patientId": {"S": payload.patientId},
-      "appointmentId": {"S": aid},
-      "createdAt": {"S": created_at},
-    }
+    items[t] = _appointment_item(payload, aid, t, created_at)
     transact_items.append({
       "Put": {
         "TableName": DDB_TABLE_SLOTS,
-        "Item": slot_item,
+        "Item": {
+          "resourceKey": {"S": resource_key},
+          "slotKey": {"S": _slot_key(appt.dateISO, t)},
+          "patientId": {"S": payload.patientId},
+          "appointmentId": {"S": aid},
+          "createdAt": {"S": created_at},
+        },
         "ConditionExpression": "attribute_not_exists(slotKey)"
       }
     })
-
-    # Appointment item
-    appt_item = {
-      "patientId": {"S": payload.patientId},
-      "appointmentId": {"S": aid},
-      "createdAt": {"S": created_at},
-      "recordType": {"S": "doctor"},
-      "status": {"S": "BOOKED"},
-      "source": {"S": (payload.source or "kiosk")},
-      "dateKey": {"S": _slot_key(dateISO, t)},
-      "doctorId": {"S": appt.doctorId},
-      # denormalized fields
-      "appointment_details": {"S": json.dumps({**appt.dict(), "dateISO": dateISO, "timeSlot": t}, ensure_ascii=False)},
-    }
     transact_items.append({
       "Put": {
         "TableName": DDB_TABLE_APPTS,
-        "Item": appt_item,
+        "Item": dynamo.to_item(items[t]),
         "ConditionExpression": "attribute_not_exists(patientId) AND attribute_not_exists(appointmentId)"
       }
     })
 
   try:
-    # Atomic write
-    dcl.transact_write_items(TransactItems=transact_items)
+    dynamo.client().transact_write_items(TransactItems=transact_items)
+  except ClientError as e:
+    if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+      raise
+    # CancellationReasons is index-aligned with TransactItems: [lock0, appt0, lock1, appt1, ...]
+    reasons = e.response.get("CancellationReasons") or []
+    taken = [slots[i // 2] for i, r in enumerate(reasons) if i % 2 == 0 and r.get("Code") == "ConditionalCheckFailed"]
+    contended = [slots[i // 2] for i, r in enumerate(reasons) if i % 2 == 0 and r.get("Code") == "TransactionConflict"]
+    if not taken and not contended:
+      raise
+    return {}, taken, contended
+  return items, [], []
+
+@router.post("/book-batch")
+def book_batch(payload: BookBatchRequest = Body(...)):
+  """
+  Atomically book several slots of one doctor on one date.
+  - 200 {"appointments": [...], "conflicts": []}
+  - 409 {"detail": ..., "conflicts": ["HH:mm", ...]} listing exactly the slots already taken.
+  With bestEffort=true a conflict triggers one retry with only the free slots, so the
+  kiosk gets whatever could be booked in at most two round trips; "conflicts" then lists
+  the slots that were skipped.
+  """
+  appt = payload.appointment_details
+  if "T" in appt.dateISO:
+    raise HTTPException(status_code=422, detail="dateISO must be 'YYYY-MM-DD'")
+
+  resource_key = f"doctor#{appt.doctorId}"
+  created_at = _now_iso()
+  slots = list(payload.timeSlots)
+  skipped: List[str] = []
+  booked: List[str] = []   # ConditionalCheckFailed: another booking holds the lock
+
+  try:
+    items, taken, contended = _transact(payload, slots, created_at)
+    conflicts = taken + contended
+    booked += taken
+    if conflicts and payload.bestEffort:
+      skipped = conflicts
+      free = [t for t in slots if t not in set(conflicts)]
+      if free:
+        items, taken, contended = _transact(payload, free, created_at)
+        conflicts = taken + contended
+        booked += taken
+        skipped = skipped + conflicts
   except ClientError as e:
-    code = e.response.get("Error", {}).get("Code", "")
-    # Return 409 + tell which slots conflicted if we can infer
-    if code in ("TransactionCanceledException", "ConditionalCheckFailed"):
-      return {"detail": "One or more slots are no longer available", "conflicts": payload.timeSlots}, 409
     log.exception("TransactWrite failed")
     raise HTTPException(status_code=500, detail=e.response.get("Error", {}).get("Message", str(e)))
 
-  # Optional: archive to S3 (best-effort)
-  if s3 and S3_BUCKET:
-    for aid, t in zip(appointment_ids, payload.timeSlots):
-      item = {
-        "patientId": payload.patientId,
-        "appointmentId": aid,
-        "createdAt": created_at,
-        "recordType": "doctor",
-        "status": "BOOKED",
-        "source": payload.source or "kiosk",
-        "appointment_details": {**appt.dict(), "dateISO": dateISO, "timeSlot": t},
-        "doctorId": appt.doctorId,
-        "dateKey": _slot_key(dateISO, t),
-      }
-      try:
-        key = f"{S3_PREFIX_APPTS}/{payload.patientId}/{aid}.json"
-        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=json.dumps(item, ensure_ascii=False).encode("utf-8"), ContentType="application/json")
-      except Exception:
-        log.warning("S3 archive failed for batch item %s", aid, exc_info=True)
+  # only failed lock conditions prove a slot is taken; a TransactionConflict just means another
+  # transaction was touching it at the same moment, so those stay as the cache has them
+  availability_cache.add_booked(resource_key, appt.dateISO, list(items) + booked)
+  if not items:
+    return JSONResponse(
+      status_code=409,
+      content={"detail": "One or more slots are no longer available", "conflicts": skipped or conflicts},
+    )
+
+  for item in items.values():
+    archiver.submit(item)
 
-  # Return all appointment ids
   out = [{
     "patientId": payload.patientId,
-    "appointmentId": aid,
+    "appointmentId": item["appointmentId"],
     "createdAt": created_at,
     "timeSlot": t
-  } for aid, t in zip(appointment_ids, payload.timeSlots)]
-  return {"appointments": out}
+  } for t, item in items.items()]
+  return {"appointments": out, "conflicts": skipped}
@@ -1,17 +1,28 @@
 import os
 import re
+import json
 import logging
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, validator
 from botocore.exceptions import ClientError
+from app.db import dynamo
 from app.db.dynamo import appointments_table
 
 log = logging.getLogger("appt-kiosk-attach")
 router = APIRouter(prefix="/kiosk/appointments", tags=["kiosk-appointments"])
 
+# attach-batch: entries per call (a transaction holds at most 100 items) and parallel writes
+KIOSK_ATTACH_BATCH_MAX = min(100, int(os.getenv("KIOSK_ATTACH_BATCH_MAX", "25")))
+KIOSK_ATTACH_BATCH_WORKERS = int(os.getenv("KIOSK_ATTACH_BATCH_WORKERS", "8"))
+
+_batch_pool = ThreadPoolExecutor(max_workers=KIOSK_ATTACH_BATCH_WORKERS, thread_name_prefix="kiosk-attach")
+
 class KioskPayload(BaseModel):
     # required keys to locate the row
     patientId: str = Field(..., min_length=6)
@@ -34,73 +45,247 @@ class KioskPayload(BaseModel):
 def _now():
     return datetime.now(timezone.utc).isoformat()
 
+
+def _ddb_value(v: Any) -> Any:
+    # resource API rejects float; JSON numbers go in as Decimal
+    return json.loads(json.dumps(v), parse_float=Decimal)
+
+
+_KEY_COND = "attribute_exists(patientId) AND attribute_exists(appointmentId)"
+
+
+def _nested_update(pid: str, aid: str, kiosk_in: Dict[str, Any], created_at: str, now: str) -> Dict[str, Any]:
+    """
+    One update_item that SETs kiosk.<key> per incoming key (siblings untouched, so
+    concurrent attaches of different keys merge) and kiosk.createdAt only if absent.
+    Needs the `kiosk` map to exist already.
+    """
+    names = {"#k": "kiosk", "#u": "updatedAt", "#c": "createdAt"}
+    values: Dict[str, Any] = {":u": now, ":c": created_at}
+    sets = []
+    for i, (key, val) in enumerate(kiosk_in.items()):
+        names[f"#a{i}"] = key
+        values[f":v{i}"] = _ddb_value(val)
+        sets.append(f"#k.#a{i} = :v{i}")
+    sets.append("#k.#c = if_not_exists(#k.#c, :c)")
+    sets.append("#u = :u")
+    return {
+        "Key": {"patientId": pid, "appointmentId": aid},
+        "UpdateExpression": "SET " + ", ".join(sets),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+        "ConditionExpression": _KEY_COND,
+    }
+
+
+def _create_update(pid: str, aid: str, kiosk_in: Dict[str, Any], created_at: str, now: str) -> Dict[str, Any]:
+    """First attach for a row: write the whole map, only if nobody created it meanwhile."""
+    return {
+        "Key": {"patientId": pid, "appointmentId": aid},
+        "UpdateExpression": "SET #k = :k, #u = :u",
+        "ExpressionAttributeNames": {"#k": "kiosk", "#u": "updatedAt"},
+        "ExpressionAttributeValues": {":k": _ddb_value({**kiosk_in, "createdAt": created_at}), ":u": now},
+        "ConditionExpression": _KEY_COND + " AND attribute_not_exists(kiosk)",
+    }
+
+
+def _enrich(kiosk: Dict[str, Any]):
+    kiosk_in = dict(kiosk or {})
+    kiosk_in.setdefault("source", "kiosk")
+    now = _now()
+    kiosk_in["updatedAt"] = now
+    created_at = kiosk_in.pop("createdAt", None) or now
+    return kiosk_in, created_at, now
+
+
+def _is_missing_map(e: ClientError) -> bool:
+    err = e.response["Error"]
+    return err.get("Code") == "ValidationException" and "document path" in err.get("Message", "")
+
+
+def _attach(tbl, pid: str, aid: str, kiosk: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach one payload; returns the UPDATED_NEW attributes. ClientErrors propagate."""
+    kiosk_in, created_at, now = _enrich(kiosk)
+    try:
+        return tbl.update_item(**_nested_update(pid, aid, kiosk_in, created_at, now), ReturnValues="UPDATED_NEW")["Attributes"]
+    except ClientError as e:
+        if not _is_missing_map(e):
+            raise
+    # no kiosk map yet (first attach): create it whole
+    try:
+        return tbl.update_item(
+            **_create_update(pid, aid, kiosk_in, created_at, now),
+            ReturnValues="UPDATED_NEW", ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"].get("Code") != "ConditionalCheckFailedException":
+            raise
+        item = e.response.get("Item")
+        if item is None or "kiosk" not in item:
+            raise  # row missing -> 404 upstream
+    # a concurrent first attach created the map between our two writes: merge into it
+    return tbl.update_item(**_nested_update(pid, aid, kiosk_in, created_at, now), ReturnValues="UPDATED_NEW")["Attributes"]
+
+
+def _client_error(e: ClientError) -> HTTPException:
+    code = e.response["Error"].get("Code")
+    msg = e.response["Error"].get("Message", str(e))
+    if code == "ConditionalCheckFailedException":
+        return HTTPException(status_code=404, detail="Appointment not found")
+    log.exception("DynamoDB update failed: %s", msg)
+    return HTTPException(status_code=500, detail=f"DynamoDB error: {msg}")
+
+
 @router.post("/attach")
 def attach_kiosk_data(payload: KioskPayload = Body(...)):
     """
     Merge/attach kiosk details into the appointment row as a single map field 'kiosk'.
     - Requires existing item (patientId + appointmentId).
-    - Adds/updates kiosk.updatedAt; sets kiosk.createdAt if first time.
-    - Server-side merge logic to preserve previous 'kiosk' content.
+    - One update_item: each incoming key is SET as kiosk.<key>, so keys written by other
+      attaches (payment vs reason) are kept; kiosk.createdAt is set only the first time.
+    - Returns only the attributes this call wrote (kiosk keys + updatedAt).
     """
     tbl = appointments_table()
     pid = payload.patientId.strip()
     aid = payload.appointmentId.strip()
-
-    # Server-enrichment
-    kiosk_in = dict(payload.kiosk or {})
-    kiosk_in.setdefault("source", "kiosk")
-    kiosk_in["updatedAt"] = _now()
-
-    # Use UpdateExpression with if_not_exists to keep earlier data and shallow-merge.
-    # We compute the new merged map in a single SET by reading existing, but DDB
-    # can't do deep merge. Strategy: if kiosk exists -> overwrite top-level with
-    # client-provided keys. If not exists -> create full map.
-    # Easiest robust approach: SET kiosk = if_not_exists(kiosk, :empty) and then
-    # overwrite kiosk with :knew (single write). That's acceptable since kiosk is
-    # kiosk-owned and we control callers.
     try:
-        # Check whether kiosk exists so we can set createdAt once
-        resp = tbl.get_item(Key={"patientId": pid, "appointmentId": aid})
-        item = resp.get("Item")
-        if not item:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-
-        existing_kiosk = item.get("kiosk") or {}
-        if "createdAt" not in existing_kiosk:
-            kiosk_in.setdefault("createdAt", _now())
-
-        # Final write: replace 'kiosk' atomically, do not touch other attrs
-        update_resp = tbl.update_item(
-            Key={"patientId": pid, "appointmentId": aid},
-            UpdateExpression="SET #k = :k, #u = :u",
-            ExpressionAttributeNames={
-                "#k": "kiosk",
-                "#u": "updatedAt",
-            },
-            ExpressionAttributeValues={
-                ":k": {**existing_kiosk, **kiosk_in},  # shallow merge (kiosk-level)
-                ":u": _now(),
-            },
-            ConditionExpression="attribute_exists(patientId) AND attribute_exists(appointmentId)",
-            ReturnValues="ALL_NEW",
-        )
-
-        return {
-            "ok": True,
-            "patientId": pid,
-            "appointmentId": aid,
-            "kiosk": update_resp["Attributes"].get("kiosk", {}),
-            "updatedAt": update_resp["Attributes"].get("updatedAt"),
-        }
-    except HTTPException:
-        raise
+        attrs = _attach(tbl, pid, aid, payload.kiosk)
     except ClientError as e:
-        code = e.response["Error"].get("Code")
-        msg  = e.response["Error"].get("Message", str(e))
-        if code == "ConditionalCheckFailedException":
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        log.exception("DynamoDB update failed: %s", msg)
-        raise HTTPException(status_code=500, detail=f"DynamoDB error: {msg}")
+        raise _client_error(e)
     except Exception as e:
         log.exception("Unexpected error")
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "ok": True,
+        "patientId": pid,
+        "appointmentId": aid,
+        "kiosk": attrs.get("kiosk", {}),
+        "updatedAt": attrs.get("updatedAt"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Batch attach (multi-slot checkout: same payment/device payload on every appointment)
+# ---------------------------------------------------------------------------
+class AttachBatchReq(BaseModel):
+    items: List[KioskPayload]
+    allOrNothing: bool = Field(False, description="apply every entry in one transaction, or none")
+
+    @validator("items")
+    def _items(cls, v):
+        if not v:
+            raise ValueError("items must be a non-empty list")
+        if len(v) > KIOSK_ATTACH_BATCH_MAX:
+            raise ValueError(f"items too many (max {KIOSK_ATTACH_BATCH_MAX})")
+        return v
+
+
+def _result(p: KioskPayload, status: int, attrs: Optional[Dict[str, Any]] = None, detail: Optional[str] = None) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"patientId": p.patientId.strip(), "appointmentId": p.appointmentId.strip(), "ok": status == 200, "status": status}
+    if attrs is not None:
+        out["updatedAt"] = attrs.get("updatedAt")
+    if detail:
+        out["detail"] = detail
+    return out
+
+
+def _attach_result(p: KioskPayload) -> Dict[str, Any]:
+    try:
+        attrs = _attach(appointments_table(), p.patientId.strip(), p.appointmentId.strip(), p.kiosk)
+    except ClientError as e:
+        err = _client_error(e)
+        return _result(p, err.status_code, detail=err.detail)
+    except Exception as e:
+        log.exception("Unexpected error")
+        return _result(p, 500, detail=str(e))
+    return _result(p, 200, attrs)
+
+
+def _typed(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Resource-style update_item kwargs -> a TransactWriteItems Update."""
+    return {"Update": {
+        "TableName": dynamo.DDB_TABLE_APPOINTMENTS,
+        "Key": dynamo.to_item(update["Key"]),
+        "UpdateExpression": update["UpdateExpression"],
+        "ExpressionAttributeNames": update["ExpressionAttributeNames"],
+        "ExpressionAttributeValues": dynamo.to_item(update["ExpressionAttributeValues"]),
+        "ConditionExpression": update["ConditionExpression"],
+    }}
+
+
+def _transact(updates: List[Dict[str, Any]]) -> List[str]:
+    """
+    One TransactWriteItems. -> [] on success, else the index-aligned cancellation codes
+    ("None" for items that were fine). Non-cancellation ClientErrors propagate.
+    """
+    try:
+        dynamo.client().transact_write_items(TransactItems=[_typed(u) for u in updates])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+            raise
+        return [r.get("Code", "None") for r in e.response.get("CancellationReasons") or []] or ["Unknown"] * len(updates)
+    return []
+
+
+def _attach_all(items: List[KioskPayload]) -> List[Dict[str, Any]]:
+    """All-or-nothing: nested-path updates in one transaction; missing kiosk maps are created first."""
+    enriched = [_enrich(p.kiosk) for p in items]
+    keys = [(p.patientId.strip(), p.appointmentId.strip()) for p in items]
+    updates = [_nested_update(pid, aid, k, c, n) for (pid, aid), (k, c, n) in zip(keys, enriched)]
+
+    def failed(codes: List[str]) -> List[Dict[str, Any]]:
+        out = []
+        for p, code in zip(items, codes):
+            if code == "ConditionalCheckFailed":
+                out.append(_result(p, 404, detail="Appointment not found"))
+            elif code not in ("None", ""):
+                out.append(_result(p, 409, detail=f"Transaction cancelled ({code})"))
+            else:
+                out.append(_result(p, 409, detail="Not applied: another entry failed"))
+        return out
+
+    try:
+        codes = _transact(updates)
+    except ClientError as e:
+        if not _is_missing_map(e):
+            raise
+        codes = ["ValidationError"]
+    if codes and all(c in ("None", "ValidationError") for c in codes):
+        # some rows have no kiosk map yet: create empty maps (only on existing rows), then retry
+        ensure = [{
+            "Key": {"patientId": pid, "appointmentId": aid},
+            "UpdateExpression": "SET #k = if_not_exists(#k, :e)",
+            "ExpressionAttributeNames": {"#k": "kiosk"},
+            "ExpressionAttributeValues": {":e": {}},
+            "ConditionExpression": _KEY_COND,
+        } for pid, aid in keys]
+        codes = _transact(ensure) or _transact(updates)
+    if codes:
+        return failed(codes)
+    return [_result(p, 200, {"updatedAt": n}) for p, (_, _, n) in zip(items, enriched)]
+
+
+@router.post("/attach-batch")
+def attach_kiosk_batch(payload: AttachBatchReq = Body(...)):
+    """
+    Attach kiosk payloads to several appointments in one call.
+    - default: entries run concurrently (bounded pool); each gets its own result.
+    - allOrNothing=true: one DynamoDB transaction; 409 with per-item results if any entry fails.
+    Each entry is validated and merged exactly like /attach.
+    """
+    items = payload.items
+    if payload.allOrNothing:
+        if len({(p.patientId.strip(), p.appointmentId.strip()) for p in items}) != len(items):
+            raise HTTPException(status_code=422, detail="allOrNothing entries must target distinct appointments")
+        try:
+            results = _attach_all(items)
+        except ClientError as e:
+            log.exception("TransactWrite failed")
+            raise HTTPException(status_code=500, detail=e.response.get("Error", {}).get("Message", str(e)))
+        ok = all(r["ok"] for r in results)
+        if not ok:
+            return JSONResponse(status_code=409, content={"ok": False, "results": results})
+        return {"ok": True, "results": results}
+
+    results = list(_batch_pool.map(_attach_result, items))
+    return {"ok": all(r["ok"] for r in results), "results": results}
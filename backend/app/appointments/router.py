@@ -1,13 +1,17 @@
 import os
 import re
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
 import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Query
 
+from app.db import dynamo
+from app.auth.phone_lookup import phone_lookup
+from app.ratelimit import RateLimited, too_many_requests
+
 log = logging.getLogger("appt-list")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -16,21 +20,13 @@ AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 # DynamoDB Appointments table (same name your patient portal writes to)
 DDB_TABLE_APPOINTMENTS = os.getenv("DDB_TABLE_APPOINTMENTS", "medmitra_appointments")
 
-# Optional local DynamoDB endpoint for dev
-DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
-
 # Cognito (to resolve phone -> user sub/patientId)
 COGNITO_USER_POOL_ID = (os.getenv("COGNITO_USER_POOL_ID") or "").strip()
 if not COGNITO_USER_POOL_ID:
     raise RuntimeError("Missing COGNITO_USER_POOL_ID")
-cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
 
 def _ddb_table():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb.Table(DDB_TABLE_APPOINTMENTS)
+    return dynamo.table(DDB_TABLE_APPOINTMENTS)
 
 def _coerce_str(v: Optional[str]) -> str:
     return (v or "").strip()
@@ -51,46 +47,24 @@ def _normalize_phone(mobile: str, country_code: str = "+91") -> str:
             return f"+{digits}"
     return f"+{str(country_code).strip('+')}{digits}"
 
-def _cognito_sub_from_phone(e164: str) -> Optional[str]:
+def _patient_id_from_phone(e164: str) -> Optional[str]:
     try:
-        # exact match first
-        resp = cognito.list_users(
-            UserPoolId=COGNITO_USER_POOL_ID,
-            Filter=f'phone_number = "{e164}"',
-            Limit=2,
-        )
-        users = resp.get("Users", []) or []
-        if not users:
-            # prefix match (handles cases where + is missing in stored attr etc.)
-            digits = e164.lstrip("+")
-            try:
-                resp2 = cognito.list_users(
-                    UserPoolId=COGNITO_USER_POOL_ID,
-                    Filter=f'phone_number ^= "+{digits}"',
-                    Limit=5,
-                )
-                users = resp2.get("Users", []) or []
-            except ClientError:
-                users = []
-        if not users:
-            return None
-        user = users[0]
-        # pull "sub" from attributes
-        attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
-        return attrs.get("sub") or user.get("Username")
+        return phone_lookup.find_patient_id(e164)
+    except RateLimited as e:
+        raise too_many_requests(e)
     except ClientError as e:
         msg = e.response["Error"].get("Message", str(e))
         log.exception("Cognito list_users failed: %s", msg)
         raise HTTPException(status_code=500, detail=f"Cognito error: {msg}")
 
-def _normalize_item(it: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_item(it: Dict[str, Any], fields: Optional[List[str]] = None, raw: bool = False) -> Dict[str, Any]:
     # Decide kind and flatten common display fields (supports both FastAPI+Lambda writers)
     kind = it.get("recordType") or (
         "lab" if it.get("tests")
         else "doctor" if (it.get("doctorId") or it.get("doctorName") or (it.get("appointment_details") and (it["appointment_details"].get("doctorId") or it["appointment_details"].get("doctorName"))))
         else "appointment"
     )
-    return {
+    out = {
         "appointmentId": it.get("appointmentId"),
         "patientId": it.get("patientId"),
         "createdAt": it.get("createdAt"),
@@ -113,56 +87,107 @@ def _normalize_item(it: Dict[str, Any]) -> Dict[str, Any]:
         "collection": it.get("collection"),
         "appointment_details": it.get("appointment_details"),
         "payment": it.get("payment"),
-        "_raw": it,
     }
+    if fields is not None:
+        out = {f: out[f] for f in fields}
+    if raw:
+        out["_raw"] = it
+    return out
+
+# -----------------------------------
+# Listing views: output field -> item attributes it is built from. Each view becomes a
+# DynamoDB ProjectionExpression so only those attributes come back over the wire.
+# (Read units are charged on the full item either way; projection trims transfer,
+# deserialisation and response size.)
+# -----------------------------------
+_AD = "appointment_details"
+_FIELD_SOURCES: Dict[str, List[str]] = {
+    "appointmentId": ["appointmentId"],
+    "patientId": ["patientId"],
+    "createdAt": ["createdAt"],
+    "status": ["status", "payment.status"],
+    "recordType": ["recordType", "tests", "doctorId", "doctorName", f"{_AD}.doctorId", f"{_AD}.doctorName"],
+    "clinicName": ["clinicName", f"{_AD}.clinicName"],
+    "clinicAddress": ["clinicAddress"],
+    "doctorId": ["doctorId", f"{_AD}.doctorId"],
+    "doctorName": ["doctorName", f"{_AD}.doctorName"],
+    "specialty": ["specialty", f"{_AD}.specialty"],
+    "consultationType": ["consultationType", f"{_AD}.consultationType"],
+    "appointmentType": ["appointmentType", f"{_AD}.appointmentType"],
+    "dateISO": ["dateISO", f"{_AD}.dateISO", "collection.preferredDateISO"],
+    "timeSlot": ["timeSlot", f"{_AD}.timeSlot", "collection.preferredSlot"],
+    "fee": ["fee", f"{_AD}.fee"],
+    "s3Key": ["s3Key"],
+    "tests": ["tests"],
+    "collection": ["collection"],
+    "appointment_details": [_AD],
+    "payment": ["payment"],
+}
+LIST_FIELDS = list(_FIELD_SOURCES)
+# summary (opt-in, ?view=summary): flat list fields only; payment trimmed to status/total
+_SUMMARY_FIELDS = [f for f in LIST_FIELDS if f != "appointment_details"]
+_SUMMARY_SOURCES = {**_FIELD_SOURCES, "payment": ["payment.status", "payment.total"]}
+
+
+def _projection(paths: List[str]) -> Tuple[str, Dict[str, str]]:
+    """Document paths -> (ProjectionExpression, ExpressionAttributeNames). Overlapping paths
+    (a map and one of its members) are not allowed together, so members of a projected map are dropped."""
+    uniq = list(dict.fromkeys(paths))
+    top = {p for p in uniq if "." not in p}
+    uniq = [p for p in uniq if "." not in p or p.split(".", 1)[0] not in top]
+    names: Dict[str, str] = {}
+    alias: Dict[str, str] = {}
+    exprs = []
+    for p in uniq:
+        parts = []
+        for seg in p.split("."):
+            if seg not in alias:
+                alias[seg] = f"#f{len(alias)}"
+                names[alias[seg]] = seg
+            parts.append(alias[seg])
+        exprs.append(".".join(parts))
+    return ", ".join(exprs), names
+
 
-def _query_appointments(patient_id: str, limit: int, start_key: Optional[Dict[str, Any]] = None):
+def _parse_fields(view: str, fields: Optional[str]) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+    """-> (output fields or None for all, projected paths or None for the whole item)."""
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in _FIELD_SOURCES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}; allowed: {LIST_FIELDS}")
+        wanted = list(dict.fromkeys(["appointmentId", "patientId", *wanted]))
+        sources = _SUMMARY_SOURCES if view == "summary" else _FIELD_SOURCES
+        return wanted, [p for f in wanted for p in sources[f]]
+    if view == "summary":
+        return _SUMMARY_FIELDS, [p for f in _SUMMARY_FIELDS for p in _SUMMARY_SOURCES[f]]
+    return None, None
+
+
+def _query_appointments(patient_id: str, limit: int, start_key: Optional[Dict[str, Any]] = None,
+                        view: str = "full", fields: Optional[str] = None, raw: bool = False):
     tbl = _ddb_table()
+    out_fields, paths = _parse_fields(view, fields)
     kwargs: Dict[str, Any] = {
         "KeyConditionExpression": Key("patientId").eq(patient_id),
         "ScanIndexForward": False,  # newest first
         "Limit": limit,
     }
+    if paths is not None and not raw:
+        kwargs["ProjectionExpression"], kwargs["ExpressionAttributeNames"] = _projection(paths)
     if start_key:
         kwargs["ExclusiveStartKey"] = start_key
     resp = tbl.query(**kwargs)
     items: List[dict] = resp.get("Items", [])
-    normalized = [_normalize_item(it) for it in items]
+    normalized = [_normalize_item(it, out_fields, raw) for it in items]
     return {
         "items": normalized,
         "lastEvaluatedKey": resp.get("LastEvaluatedKey"),
     }
 
-# -----------------------------
-# GET /appointments/{patientId}
-# -----------------------------
-@router.get("/{patientId}")
-def list_appointments_for_patient(
-    patientId: str,
-    limit: int = Query(100, ge=1, le=500),
-    startKey_patientId: Optional[str] = Query(None, description="for pagination"),
-    startKey_appointmentId: Optional[str] = Query(None, description="for pagination"),
-):
-    """
-    Fetch all appointments for a given patient (newest first).
-    Kiosk has OTP-verified identity already; no JWT required.
-    Supports pagination with startKey_*.
-    """
-    try:
-        start_key = None
-        if startKey_patientId and startKey_appointmentId:
-            start_key = {"patientId": startKey_patientId, "appointmentId": startKey_appointmentId}
-        return _query_appointments(patientId, limit, start_key)
-    except ClientError as e:
-        msg = e.response["Error"].get("Message", str(e))
-        log.exception("DynamoDB query failed")
-        raise HTTPException(status_code=500, detail=f"DynamoDB error: {msg}")
-    except Exception as e:
-        log.exception("Unexpected error")
-        raise HTTPException(status_code=500, detail=str(e))
-
 # -----------------------------------
 # GET /appointments/by-phone?phone=…
+# (declared before /{patientId} so the catch-all does not swallow it)
 # -----------------------------------
 @router.get("/by-phone")
 def list_by_phone(
@@ -171,11 +196,14 @@ def list_by_phone(
     limit: int = Query(100, ge=1, le=500),
     startKey_patientId: Optional[str] = Query(None),
     startKey_appointmentId: Optional[str] = Query(None),
+    view: str = Query("full", regex="^(summary|full)$"),
+    fields: Optional[str] = Query(None, description="comma-separated subset of the item fields"),
+    raw: bool = Query(False, description="include the stored item under _raw"),
 ):
     """
     Convenience/backup endpoint:
     1) normalize phone
-    2) look up the Cognito user (sub == patientId)
+    2) look up the patient (mobile index, then Cognito user sub == patientId)
     3) return that patient's appointments
     Useful if FE doesn't have kioskPatientId in session for any reason.
     """
@@ -183,7 +211,7 @@ def list_by_phone(
     if not e164:
         raise HTTPException(status_code=400, detail="Invalid phone number")
 
-    patient_id = _cognito_sub_from_phone(e164)
+    patient_id = _patient_id_from_phone(e164)
     if not patient_id:
         return {"items": [], "patientId": None, "normalizedPhone": e164}
 
@@ -191,7 +219,43 @@ def list_by_phone(
     if startKey_patientId and startKey_appointmentId:
         start_key = {"patientId": startKey_patientId, "appointmentId": startKey_appointmentId}
 
-    data = _query_appointments(patient_id, limit, start_key)
+    data = _query_appointments(patient_id, limit, start_key, view, fields, raw)
     data["patientId"] = patient_id
     data["normalizedPhone"] = e164
     return data
+
+# -----------------------------
+# GET /appointments/{patientId}
+# -----------------------------
+@router.get("/{patientId}")
+def list_appointments_for_patient(
+    patientId: str,
+    limit: int = Query(100, ge=1, le=500),
+    startKey_patientId: Optional[str] = Query(None, description="for pagination"),
+    startKey_appointmentId: Optional[str] = Query(None, description="for pagination"),
+    view: str = Query("full", regex="^(summary|full)$", description="full: all fields; summary: list fields only"),
+    fields: Optional[str] = Query(None, description="comma-separated subset of the item fields"),
+    raw: bool = Query(False, description="include the stored item under _raw"),
+):
+    """
+    Fetch all appointments for a given patient (newest first).
+    Kiosk has OTP-verified identity already; no JWT required.
+    Supports pagination with startKey_*.
+    view=full (default) returns every field; view=summary reads only the list fields
+    (ProjectionExpression), drops appointment_details and trims payment to status/total.
+    fields= narrows further; raw=true adds the stored item as _raw.
+    """
+    try:
+        start_key = None
+        if startKey_patientId and startKey_appointmentId:
+            start_key = {"patientId": startKey_patientId, "appointmentId": startKey_appointmentId}
+        return _query_appointments(patientId, limit, start_key, view, fields, raw)
+    except HTTPException:
+        raise
+    except ClientError as e:
+        msg = e.response["Error"].get("Message", str(e))
+        log.exception("DynamoDB query failed")
+        raise HTTPException(status_code=500, detail=f"DynamoDB error: {msg}")
+    except Exception as e:
+        log.exception("Unexpected error")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,173 @@
+# backend/app/appointments/schedule.py
+"""
+Working-hour templates per doctor/lab resource and a free-slot engine.
+
+A day is an int bitmap: bit i = the i-th slot of the day (i * slotMinutes
+after 00:00). Free slots are `open_mask & ~booked_mask`, so a week for dozens
+of resources is a handful of integer ops per resource-day.
+
+Templates come from SCHEDULE_TEMPLATES_PATH (JSON file) or
+SCHEDULE_TEMPLATES_JSON (inline), keyed by resourceKey ("doctor#1") with an
+optional "default" entry:
+
+{
+  "default":  {"slotMinutes": 15,
+               "hours": {"mon": [["09:00", "17:00"]], "sat": [["09:00", "13:00"]]},
+               "breaks": [["13:00", "14:00"]],
+               "holidays": ["2025-01-26"]},
+  "doctor#7": {"slotMinutes": 20, "hours": {"tue": [["10:00", "16:00"]]}}
+}
+"""
+import os
+import json
+import logging
+from datetime import date as date_cls
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("appt-schedule")
+
+SCHEDULE_TEMPLATES_PATH = (os.getenv("SCHEDULE_TEMPLATES_PATH") or "").strip() or None
+SCHEDULE_TEMPLATES_JSON = (os.getenv("SCHEDULE_TEMPLATES_JSON") or "").strip() or None
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Used when no template file is configured: Mon-Sat 09:00-17:00, lunch 13:00-14:00.
+_BUILTIN_DEFAULT = {
+    "slotMinutes": 15,
+    "hours": {d: [["09:00", "17:00"]] for d in WEEKDAYS[:6]},
+    "breaks": [["13:00", "14:00"]],
+    "holidays": [],
+}
+
+
+def _minutes(hhmm: str) -> int:
+    h, m = hhmm.split(":", 1)
+    return int(h) * 60 + int(m)
+
+
+@lru_cache(maxsize=4096)
+def _weekday(day: str) -> int:
+    return date_cls.fromisoformat(day).weekday()
+
+
+def _range_mask(start: str, end: str, slot_minutes: int) -> int:
+    # slots whose start lies in [start, end); a slot must end by `end`
+    first = -(-_minutes(start) // slot_minutes)
+    last = (_minutes(end) // slot_minutes) - 1
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+class ScheduleTemplate:
+    __slots__ = ("slot_minutes", "week_masks", "holidays", "labels", "index", "_byte_labels")
+
+    def __init__(self, spec: dict):
+        self.slot_minutes = int(spec.get("slotMinutes", 15))
+        if self.slot_minutes <= 0 or 1440 % self.slot_minutes:
+            raise ValueError(f"slotMinutes must divide a day, got {self.slot_minutes}")
+        n = 1440 // self.slot_minutes
+        self.labels: Tuple[str, ...] = tuple(
+            f"{(i * self.slot_minutes) // 60:02d}:{(i * self.slot_minutes) % 60:02d}" for i in range(n)
+        )
+        self.index: Dict[str, int] = {label: i for i, label in enumerate(self.labels)}
+        # labels_for() decodes a mask a byte at a time: _byte_labels[k][b] are the
+        # labels of the set bits of byte value b at byte offset k.
+        self._byte_labels: Tuple[Tuple[Tuple[str, ...], ...], ...] = tuple(
+            tuple(
+                tuple(self.labels[k * 8 + j] for j in range(8) if b >> j & 1 and k * 8 + j < n)
+                for b in range(256)
+            )
+            for k in range((n + 7) // 8)
+        )
+
+        breaks = 0
+        for start, end in spec.get("breaks", []):
+            breaks |= _range_mask(start, end, self.slot_minutes)
+
+        hours = spec.get("hours", {})
+        masks = []
+        for day in WEEKDAYS:
+            m = 0
+            for start, end in hours.get(day, []):
+                m |= _range_mask(start, end, self.slot_minutes)
+            masks.append(m & ~breaks)
+        self.week_masks: Tuple[int, ...] = tuple(masks)
+        self.holidays = frozenset(spec.get("holidays", []))
+
+    def open_mask(self, day: str) -> int:
+        if day in self.holidays:
+            return 0
+        return self.week_masks[_weekday(day)]
+
+    def booked_mask(self, booked: Iterable[str]) -> int:
+        idx = self.index
+        m = 0
+        for t in booked:
+            i = idx.get(t)
+            if i is not None:
+                m |= 1 << i
+        return m
+
+    def free_mask(self, day: str, booked: Iterable[str]) -> int:
+        return self.open_mask(day) & ~self.booked_mask(booked)
+
+    def labels_for(self, mask: int, limit: Optional[int] = None) -> List[str]:
+        out: List[str] = []
+        for table in self._byte_labels:
+            if not mask:
+                break
+            b = mask & 0xFF
+            if b:
+                out.extend(table[b])
+            mask >>= 8
+        return out if limit is None else out[:limit]
+
+
+class ScheduleBook:
+    """All templates, resolved per resourceKey with fallback to "default"."""
+
+    def __init__(self, specs: Dict[str, dict]):
+        specs = dict(specs)
+        self.default = ScheduleTemplate(specs.pop("default", _BUILTIN_DEFAULT))
+        self.templates: Dict[str, ScheduleTemplate] = {k: ScheduleTemplate(v) for k, v in specs.items()}
+
+    def template_for(self, resource_key: str) -> ScheduleTemplate:
+        return self.templates.get(resource_key, self.default)
+
+    def free_slots(
+        self,
+        resource_key: str,
+        booked_by_date: Dict[str, Sequence[str]],
+        dates: Sequence[str],
+        next_n: int = 0,
+    ) -> Tuple[Dict[str, List[str]], List[Dict[str, str]]]:
+        """
+        -> ({date: [free HH:mm]}, [{"date", "time"} x next_n earliest free slots])
+        `dates` must be ascending; `next_n` = 0 skips the "next available" list.
+        """
+        tpl = self.template_for(resource_key)
+        free: Dict[str, List[str]] = {}
+        upcoming: List[Dict[str, str]] = []
+        for d in dates:
+            mask = tpl.free_mask(d, booked_by_date.get(d, ()))
+            free[d] = tpl.labels_for(mask)
+            if len(upcoming) < next_n:
+                upcoming.extend({"date": d, "time": t} for t in free[d][: next_n - len(upcoming)])
+        return free, upcoming
+
+
+def _load_specs() -> Dict[str, dict]:
+    try:
+        if SCHEDULE_TEMPLATES_PATH:
+            with open(SCHEDULE_TEMPLATES_PATH, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        if SCHEDULE_TEMPLATES_JSON:
+            return json.loads(SCHEDULE_TEMPLATES_JSON)
+    except Exception:
+        log.exception("Failed to load schedule templates; using built-in default")
+    return {}
+
+
+schedule_book = ScheduleBook(_load_specs())
@@ -0,0 +1,130 @@
+# backend/app/appointments/slot_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Short TTL: the cache only has to absorb kiosk polling; other workers' bookings
+# become visible within this window, this worker's bookings immediately.
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "10"))
+AVAILABILITY_CACHE_MAX = int(os.getenv("AVAILABILITY_CACHE_MAX", "4096"))
+
+_Key = Tuple[str, str]  # (resourceKey, "YYYY-MM-DD")
+
+
+class SlotCache:
+    """
+    Per-worker TTL + LRU cache of booked HH:mm slots per (resourceKey, date).
+    Booking paths call add_booked() after a successful slot lock so readers on
+    this worker never see a slot as free once it is taken.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[_Key, Tuple[float, frozenset]]" = OrderedDict()
+        # Write sequence per key, so a read that raced a booking cannot
+        # re-populate the cache with the pre-booking result.
+        self._seq = 0
+        self._writes: "OrderedDict[_Key, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.patches = 0
+        self.invalidations = 0
+
+    def token(self) -> int:
+        """Take before querying DynamoDB; pass to put()."""
+        with self._lock:
+            return self._seq
+
+    def _mark_written(self, key: _Key):
+        self._seq += 1
+        self._writes[key] = self._seq
+        self._writes.move_to_end(key)
+        while len(self._writes) > self.max_entries:
+            self._writes.popitem(last=False)
+
+    def get(self, resource_key: str, date: str) -> Optional[List[str]]:
+        if self.ttl <= 0:
+            return None
+        key = (resource_key, date)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            expires, booked = hit
+            if expires <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return sorted(booked)
+
+    def put(self, resource_key: str, date: str, booked: Iterable[str], token: Optional[int] = None):
+        if self.ttl <= 0:
+            return
+        key = (resource_key, date)
+        with self._lock:
+            if token is not None and self._writes.get(key, 0) > token:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, frozenset(booked))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add_booked(self, resource_key: str, date: str, slots: Iterable[str]):
+        """Patch a cached entry in place (keeps its TTL); no-op when not cached."""
+        key = (resource_key, date)
+        with self._lock:
+            self._mark_written(key)
+            hit = self._data.get(key)
+            if hit is None:
+                return
+            expires, booked = hit
+            self._data[key] = (expires, booked.union(slots))
+            self.patches += 1
+
+    def invalidate(self, resource_key: str, date: Optional[str] = None):
+        with self._lock:
+            if date is not None:
+                self._mark_written((resource_key, date))
+                if self._data.pop((resource_key, date), None) is not None:
+                    self.invalidations += 1
+                return
+            for key in [k for k in self._data if k[0] == resource_key]:
+                self._mark_written(key)
+                del self._data[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._writes.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "patches": self.patches,
+                "invalidations": self.invalidations,
+            }
+
+
+availability_cache = SlotCache(AVAILABILITY_CACHE_TTL, AVAILABILITY_CACHE_MAX)
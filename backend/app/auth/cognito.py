@@ -3,6 +3,8 @@ import logging
 import boto3
 from botocore.exceptions import ClientError
 
+from app.auth.phone_lookup import phone_lookup
+
 log = logging.getLogger("cognito")
 
 AWS_REGION     = os.getenv("AWS_REGION", "us-west-2")
@@ -17,13 +19,7 @@ cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
 
 def list_user_by_phone(e164: str):
     try:
-        resp = cognito.list_users(
-            UserPoolId=USER_POOL_ID,
-            Filter=f'phone_number = "{e164}"',
-            Limit=1,
-        )
-        users = resp.get("Users", [])
-        return users[0] if users else None
+        return phone_lookup.find_user(e164)
     except ClientError as e:
         log.warning("list_users failed: %s", e)
         return None
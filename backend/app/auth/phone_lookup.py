@@ -0,0 +1,219 @@
+# backend/app/auth/phone_lookup.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from app.db import dynamo
+from app.ratelimit import RateLimited, cognito_limiter, COGNITO_THROTTLE_RETRY_AFTER
+
+log = logging.getLogger("phone-lookup")
+
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+COGNITO_USER_POOL_ID = (os.getenv("COGNITO_USER_POOL_ID") or "").strip()
+if not COGNITO_USER_POOL_ID:
+    raise RuntimeError("Missing COGNITO_USER_POOL_ID")
+
+PHONE_LOOKUP_TTL = float(os.getenv("PHONE_LOOKUP_TTL", "300"))             # found users
+PHONE_LOOKUP_NEGATIVE_TTL = float(os.getenv("PHONE_LOOKUP_NEGATIVE_TTL", "30"))  # "not registered"
+PHONE_LOOKUP_MAX = int(os.getenv("PHONE_LOOKUP_MAX", "10000"))
+
+# GSI on medmitra_patients: mobile (HASH) -> patientId. Empty disables the index path.
+DDB_PATIENTS_MOBILE_INDEX = (os.getenv("DDB_PATIENTS_MOBILE_INDEX", "mobile-index") or "").strip()
+# after "no such index" (not created / still backfilling) skip the index path this long
+PHONE_INDEX_RETRY_SECONDS = float(os.getenv("PHONE_INDEX_RETRY_SECONDS", "600"))
+
+_MISSING_INDEX_CODES = {"ValidationException", "ResourceNotFoundException"}
+
+# Few botocore retries: a throttled lookup should surface as 429 quickly, not after backoff.
+COGNITO_MAX_ATTEMPTS = int(os.getenv("COGNITO_MAX_ATTEMPTS", "2"))
+
+_THROTTLE_CODES = {"TooManyRequestsException", "ThrottlingException", "LimitExceededException"}
+
+# One Cognito client for every phone -> user lookup in the process.
+cognito = boto3.client(
+    "cognito-idp",
+    region_name=AWS_REGION,
+    config=Config(max_pool_connections=20, retries={"mode": "standard", "total_max_attempts": COGNITO_MAX_ATTEMPTS}),
+)
+
+
+def _cognito_list_users(**kw) -> dict:
+    # global admission control in front of Cognito; upstream throttling maps to RateLimited too
+    cognito_limiter.acquire()
+    try:
+        return cognito.list_users(UserPoolId=COGNITO_USER_POOL_ID, **kw)
+    except ClientError as e:
+        if e.response["Error"].get("Code") in _THROTTLE_CODES:
+            cognito_limiter.note_throttled()
+            raise RateLimited("cognito", COGNITO_THROTTLE_RETRY_AFTER) from e
+        raise
+
+
+def _list_users(e164: str) -> Optional[dict]:
+    # exact match only: a prefix filter on e164 also matches longer numbers (other people)
+    resp = _cognito_list_users(Filter=f'phone_number = "{e164}"', Limit=2)
+    users = resp.get("Users", []) or []
+    return users[0] if users else None
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "stale")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stale = False  # invalidated while in flight -> do not cache
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+
+class PhoneLookup:
+    """
+    Cached phone (E.164) -> Cognito user lookup shared by kiosk identify, walk-ins and
+    appointments. Caches hits and misses with separate TTLs, never caches errors, and
+    coalesces concurrent lookups of the same number into one ListUsers sequence.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._inflight: Dict[str, _Call] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.index_hits = 0
+        self.index_misses = 0
+        self.index_errors = 0
+        self._index_off_until = 0.0
+
+    def patient_id_from_index(self, e164: str) -> Optional[str]:
+        """patientId from the patients-table mobile index, or None (miss / index unavailable)."""
+        if not DDB_PATIENTS_MOBILE_INDEX or time.monotonic() < self._index_off_until:
+            return None
+        try:
+            resp = dynamo.table(dynamo.DDB_TABLE_PATIENTS).query(
+                IndexName=DDB_PATIENTS_MOBILE_INDEX,
+                KeyConditionExpression=Key("mobile").eq(e164),
+                ProjectionExpression="patientId",
+                Limit=1,
+            )
+        except (ClientError, BotoCoreError) as e:
+            with self._lock:
+                self.index_errors += 1
+            if isinstance(e, ClientError) and e.response["Error"].get("Code") in _MISSING_INDEX_CODES:
+                # the GSI is not there (yet): stop paying a failed query per lookup
+                self._index_off_until = time.monotonic() + PHONE_INDEX_RETRY_SECONDS
+                log.warning("Patients mobile index %s unavailable (%s); using Cognito for %ds",
+                            DDB_PATIENTS_MOBILE_INDEX, e.response["Error"].get("Message", ""), PHONE_INDEX_RETRY_SECONDS)
+            else:
+                log.warning("Patients mobile index query failed: %s", e)
+            return None
+        items = resp.get("Items", [])
+        pid = items[0].get("patientId") if items else None
+        with self._lock:
+            if pid:
+                self.index_hits += 1
+            else:
+                self.index_misses += 1
+        return pid or None
+
+    def find_patient_id(self, e164: str) -> Optional[str]:
+        """Mobile index first; Cognito ListUsers (cached) only on a miss."""
+        pid = self.patient_id_from_index(e164)
+        if pid:
+            return pid
+        user = self.find_user(e164)
+        return user_sub(user) if user else None
+
+    def find_user(self, e164: str) -> Optional[dict]:
+        """Cognito user dict for `e164` or None. Raises ClientError / RateLimited on Cognito failures."""
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(e164)
+            if hit is not None and hit[0] > now:
+                self._data.move_to_end(e164)
+                if hit[1] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return hit[1]
+            call = self._inflight.get(e164)
+            leader = call is None
+            if leader:
+                call = self._inflight[e164] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = _list_users(e164)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(e164, None)
+                if call.error is None and not call.stale:
+                    ttl = self.ttl if call.result is not None else self.negative_ttl
+                    if ttl > 0:
+                        self._data[e164] = (time.monotonic() + ttl, call.result)
+                        self._data.move_to_end(e164)
+                        while len(self._data) > self.max_entries:
+                            self._data.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def invalidate(self, e164: str):
+        with self._lock:
+            self._data.pop(e164, None)
+            call = self._inflight.get(e164)
+            if call is not None:
+                call.stale = True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "negativeTtlSeconds": self.negative_ttl,
+                "hits": self.hits,
+                "negativeHits": self.negative_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "indexHits": self.index_hits,
+                "indexMisses": self.index_misses,
+                "indexErrors": self.index_errors,
+                "indexEnabled": bool(DDB_PATIENTS_MOBILE_INDEX) and time.monotonic() >= self._index_off_until,
+            }
+
+
+phone_lookup = PhoneLookup(PHONE_LOOKUP_TTL, PHONE_LOOKUP_NEGATIVE_TTL, PHONE_LOOKUP_MAX)
+
+
+def user_sub(user: dict) -> Optional[str]:
+    for a in user.get("Attributes", []):
+        if a.get("Name") == "sub":
+            return a.get("Value")
+    return user.get("Username") or None
@@ -1,25 +1,181 @@
 import os
+import threading
+from typing import Any, Dict, Optional
+
 import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.config import Config
 
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_PATIENTS = os.getenv("DDB_TABLE_PATIENTS", "medmitra_patients")
 
-ddb = boto3.resource("dynamodb", region_name=AWS_REGION)
-patients_table = ddb.Table(DDB_TABLE_PATIENTS)
-
 
 DDB_TABLE_APPOINTMENTS = (
-    os.getenv("DDB_TABLE_APPOINTMENTS") 
+    os.getenv("DDB_TABLE_APPOINTMENTS")
     or "medmitra-appointments"   # <- default to the Lambda writer table
 )
 
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
+# -------------------------
+# Pool tuning (per worker process)
+# -------------------------
+DDB_MAX_POOL_CONNECTIONS = int(os.getenv("DDB_MAX_POOL_CONNECTIONS", "50"))
+DDB_CONNECT_TIMEOUT = float(os.getenv("DDB_CONNECT_TIMEOUT", "2"))
+DDB_READ_TIMEOUT = float(os.getenv("DDB_READ_TIMEOUT", "5"))
+DDB_MAX_ATTEMPTS = int(os.getenv("DDB_MAX_ATTEMPTS", "3"))
+DDB_TCP_KEEPALIVE = (os.getenv("DDB_TCP_KEEPALIVE", "true").strip().lower() != "false")
+
+# -------------------------
+# Registry: one session/client/resource per worker, shared by every router.
+# Clients are thread-safe; the resource is only used for Table() handles.
+# -------------------------
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_client = None
+_resource = None
+_tables: Dict[str, Any] = {}
+
+
+class _PoolStats:
+    """In-flight HTTP attempts against the pool; saturated = every connection busy."""
+
+    def __init__(self, max_conns: int):
+        self.max_conns = max_conns
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.saturated = 0
+
+    def on_send(self, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            if self.in_flight > self.peak_in_flight:
+                self.peak_in_flight = self.in_flight
+            if self.in_flight > self.max_conns:
+                self.saturated += 1
+        return None  # a non-None return would replace the HTTP response
+
+    def on_response(self, exception=None, **kwargs):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if exception is not None:
+                self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "maxPoolConnections": self.max_conns,
+                "inFlight": self.in_flight,
+                "peakInFlight": self.peak_in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "saturatedRequests": self.saturated,
+            }
+
+
+pool_stats = _PoolStats(DDB_MAX_POOL_CONNECTIONS)
+
+
+def _config() -> Config:
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=DDB_MAX_POOL_CONNECTIONS,
+        connect_timeout=DDB_CONNECT_TIMEOUT,
+        read_timeout=DDB_READ_TIMEOUT,
+        tcp_keepalive=DDB_TCP_KEEPALIVE,
+        retries={"total_max_attempts": DDB_MAX_ATTEMPTS, "mode": "standard"},
+    )
+
+
+def _instrument(cl):
+    cl.meta.events.register("before-send.dynamodb", pool_stats.on_send)
+    cl.meta.events.register("response-received.dynamodb", pool_stats.on_response)
+    return cl
+
+
+def _build():
+    global _pid, _client, _resource
+    # Forked workers (gunicorn/uvicorn --workers) must not share sockets with the parent.
+    if _pid == os.getpid() and _resource is not None:
+        return
+    with _lock:
+        if _pid == os.getpid() and _resource is not None:
+            return
+        session = boto3.session.Session(region_name=AWS_REGION)
+        kw: Dict[str, Any] = {"config": _config()}
+        if DYNAMODB_ENDPOINT:
+            kw["endpoint_url"] = DYNAMODB_ENDPOINT
+        _client = _instrument(session.client("dynamodb", **kw))
+        _resource = session.resource("dynamodb", **kw)
+        _instrument(_resource.meta.client)
+        _tables.clear()
+        _pid = os.getpid()
+
+
+def client():
+    """Low-level DynamoDB client (TransactWriteItems, typed attribute APIs)."""
+    _build()
+    return _client
+
+
+def resource():
+    _build()
+    return _resource
+
+
+def table(name: str):
+    """Cached Table handle for `name`, bound to the shared resource."""
+    _build()
+    tbl = _tables.get(name)
+    if tbl is None:
+        with _lock:
+            tbl = _tables.get(name)
+            if tbl is None:
+                tbl = _resource.Table(name)
+                _tables[name] = tbl
+    return tbl
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "endpoint": DYNAMODB_ENDPOINT or "aws",
+        "connectTimeout": DDB_CONNECT_TIMEOUT,
+        "readTimeout": DDB_READ_TIMEOUT,
+        "tcpKeepalive": DDB_TCP_KEEPALIVE,
+        **pool_stats.snapshot(),
+    }
+
+
+_serializer = TypeSerializer()
+
+def to_attr(v: Any) -> Dict[str, Any]:
+    """Python value -> typed AttributeValue for the low-level client."""
+    # Fast path for what the pydantic models produce; TypeSerializer for the rest (numbers, sets).
+    if isinstance(v, str):
+        return {"S": v}
+    if v is None:
+        return {"NULL": True}
+    if isinstance(v, bool):
+        return {"BOOL": v}
+    if isinstance(v, dict):
+        return {"M": {k: to_attr(x) for k, x in v.items()}}
+    if isinstance(v, (list, tuple)):
+        return {"L": [to_attr(x) for x in v]}
+    return _serializer.serialize(v)
+
+def to_item(d: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {k: to_attr(v) for k, v in d.items()}
+
+
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return resource()
 
 def appointments_table():
-    return _ddb().Table(DDB_TABLE_APPOINTMENTS)
\ No newline at end of file
+    return table(DDB_TABLE_APPOINTMENTS)
+
+def patients_table():
+    return table(DDB_TABLE_PATIENTS)
@@ -0,0 +1,119 @@
+# backend/app/kiosk/backfill_mobile_index.py
+# Populate medmitra_patients.mobile (and optionally create its GSI) from the Cognito pool,
+# so identity lookups can hit the mobile index instead of Cognito ListUsers.
+#
+#   python -m app.kiosk.backfill_mobile_index [--create-index] [--dry-run] [--workers 8]
+import os
+import time
+import json
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from app.db import dynamo
+from app.auth.phone_lookup import cognito, COGNITO_USER_POOL_ID, DDB_PATIENTS_MOBILE_INDEX, user_sub
+
+log = logging.getLogger("backfill-mobile-index")
+
+
+def create_index(wait: bool = True):
+    """Add the mobile GSI (mobile HASH, KEYS_ONLY) to the patients table if it is missing."""
+    cl = dynamo.client()
+    desc = cl.describe_table(TableName=dynamo.DDB_TABLE_PATIENTS)["Table"]
+    if any(g["IndexName"] == DDB_PATIENTS_MOBILE_INDEX for g in desc.get("GlobalSecondaryIndexes", []) or []):
+        log.info("Index %s already exists", DDB_PATIENTS_MOBILE_INDEX)
+        return
+    update = {
+        "Create": {
+            "IndexName": DDB_PATIENTS_MOBILE_INDEX,
+            "KeySchema": [{"AttributeName": "mobile", "KeyType": "HASH"}],
+            "Projection": {"ProjectionType": "KEYS_ONLY"},
+        }
+    }
+    if (desc.get("BillingModeSummary") or {}).get("BillingMode") != "PAY_PER_REQUEST":
+        update["Create"]["ProvisionedThroughput"] = {"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
+    cl.update_table(
+        TableName=dynamo.DDB_TABLE_PATIENTS,
+        AttributeDefinitions=[{"AttributeName": "mobile", "AttributeType": "S"}],
+        GlobalSecondaryIndexUpdates=[update],
+    )
+    log.info("Creating index %s on %s", DDB_PATIENTS_MOBILE_INDEX, dynamo.DDB_TABLE_PATIENTS)
+    while wait:
+        time.sleep(10)
+        gsis = cl.describe_table(TableName=dynamo.DDB_TABLE_PATIENTS)["Table"].get("GlobalSecondaryIndexes", [])
+        status = next((g["IndexStatus"] for g in gsis if g["IndexName"] == DDB_PATIENTS_MOBILE_INDEX), None)
+        log.info("Index status: %s", status)
+        if status == "ACTIVE":
+            break
+
+
+def iter_pool_phones(page_sleep: float = 0.25) -> Iterator[Tuple[str, str]]:
+    """(patientId, phone_number) for every pool user with a phone; pages via PaginationToken."""
+    kwargs: Dict[str, object] = {"UserPoolId": COGNITO_USER_POOL_ID, "Limit": 60, "AttributesToGet": ["sub", "phone_number"]}
+    while True:
+        resp = cognito.list_users(**kwargs)
+        for user in resp.get("Users", []) or []:
+            attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
+            phone = attrs.get("phone_number")
+            pid = attrs.get("sub") or user_sub(user)
+            if phone and pid:
+                yield pid, phone
+        token = resp.get("PaginationToken")
+        if not token:
+            return
+        kwargs["PaginationToken"] = token
+        time.sleep(page_sleep)  # ListUsers is rate limited per pool
+
+
+def _upsert_mobile(pid: str, phone: str, now: str) -> str:
+    try:
+        # Only fills in what is missing: never clobbers an existing profile or a kiosk-entered mobile.
+        dynamo.table(dynamo.DDB_TABLE_PATIENTS).update_item(
+            Key={"patientId": pid},
+            UpdateExpression=(
+                "SET mobile = if_not_exists(mobile, :m), createdAt = if_not_exists(createdAt, :now), "
+                "#src = if_not_exists(#src, :src)"
+            ),
+            ExpressionAttributeNames={"#src": "source"},
+            ExpressionAttributeValues={":m": phone, ":now": now, ":src": "cognito-backfill"},
+        )
+        return "written"
+    except ClientError:
+        log.warning("Backfill failed for %s", pid, exc_info=True)
+        return "failed"
+
+
+def backfill(workers: int = 8, dry_run: bool = False, page_sleep: float = 0.25) -> Dict[str, int]:
+    now = datetime.now(timezone.utc).isoformat()
+    out = {"users": 0, "written": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for pid, phone in iter_pool_phones(page_sleep):
+            out["users"] += 1
+            if not dry_run:
+                futures.append(pool.submit(_upsert_mobile, pid, phone, now))
+        for f in futures:
+            out[f.result()] += 1
+    return out
+
+
+def _main(argv: Optional[list] = None):
+    ap = argparse.ArgumentParser(prog="python -m app.kiosk.backfill_mobile_index")
+    ap.add_argument("--create-index", action="store_true", help="add the mobile GSI first (waits until ACTIVE)")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--page-sleep", type=float, default=0.25)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.create_index and not args.dry_run:
+        create_index()
+    print(json.dumps(backfill(args.workers, args.dry_run, args.page_sleep)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    _main()
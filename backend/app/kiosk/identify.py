@@ -1,19 +1,21 @@
 import os
 import re
 import time
+import hmac
 import json
-import uuid
 import random
 import logging
 from typing import Optional
-from datetime import datetime, timezone
 
-import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Request
 from pydantic import BaseModel, Field, validator
 
+from app.auth.phone_lookup import phone_lookup
+from app.ratelimit import RateLimited, too_many_requests, client_ip, otp_phone_limiter, otp_kiosk_limiter
+from app.kiosk.sms import sms_dispatcher, SmsQueueFull
+from app.kiosk.otp_store import otp_store, OK, EXPIRED, LOCKED, INVALID
+
 log = logging.getLogger("kiosk-identify")
 router = APIRouter(prefix="/kiosk/identify", tags=["kiosk-identify"])
 
@@ -26,41 +28,15 @@ COGNITO_USER_POOL_ID = (os.getenv("COGNITO_USER_POOL_ID") or "").strip()
 if not COGNITO_USER_POOL_ID:
     raise RuntimeError("Missing COGNITO_USER_POOL_ID")
 
-DDB_TABLE_OTP = os.getenv("DDB_TABLE_KIOSK_OTP", "kiosk_otp")
 OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
 OTP_LENGTH = int(os.getenv("OTP_LENGTH", "6"))
 OTP_RESEND_COOLDOWN = int(os.getenv("OTP_RESEND_COOLDOWN", "45"))
 
 KIOSK_REQUIRE_VERIFIED = (os.getenv("KIOSK_REQUIRE_VERIFIED", "false").strip().lower() == "true")
 
-# Twilio (preferred)
-try:
-    from twilio.rest import Client as TwilioClient  # type: ignore
-except Exception:
-    TwilioClient = None  # if not installed
-
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
-TWILIO_AUTH_TOKEN  = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
-TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "").strip()
-TWILIO_ENABLED = bool(TwilioClient and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER)
-
-# SNS (fallback)
-SMS_PROVIDER = "twilio" if TWILIO_ENABLED else "sns"
-SNS_REGION = os.getenv("SNS_REGION") or AWS_REGION
-SNS_SENDER_ID = os.getenv("SNS_SENDER_ID", "").strip()
-SNS_ENTITY_ID = os.getenv("SNS_ENTITY_ID", "").strip()
-SNS_TEMPLATE_ID = os.getenv("SNS_TEMPLATE_ID", "").strip()
-SNS_ORIGINATION_NUMBER = os.getenv("SNS_ORIGINATION_NUMBER", "").strip()
-SNS_DEFAULT_SMS_TYPE = os.getenv("SNS_DEFAULT_SMS_TYPE", "Transactional")
+OTP_SMS_RETRY_AFTER = int(os.getenv("OTP_SMS_RETRY_AFTER", "5"))  # seconds, when the SMS queue is full
 
-# -----------------------------------------------------------------------------#
-# AWS Clients                                                                  #
-# -----------------------------------------------------------------------------#
-cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-otp_table = dynamodb.Table(DDB_TABLE_OTP)
-sns = boto3.client("sns", region_name=SNS_REGION)
-twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ENABLED else None
+KIOSK_SHARED_SECRET = (os.getenv("KIOSK_SHARED_SECRET") or "").strip()
 
 # -----------------------------------------------------------------------------#
 # Helpers                                                                      #
@@ -80,6 +56,11 @@ def normalize_phone(mobile: str, country_code: str) -> str:
             return f"+{digits}"
     return f"+{country_code.strip('+')}{digits}"
 
+def _is_kiosk(x_kiosk_key: Optional[str]) -> bool:
+    if not (KIOSK_SHARED_SECRET and x_kiosk_key):
+        return False
+    return hmac.compare_digest(x_kiosk_key.encode(), KIOSK_SHARED_SECRET.encode())
+
 def _gen_code(n: int) -> str:
     lo = 10 ** (n - 1)
     hi = (10 ** n) - 1
@@ -90,18 +71,9 @@ def _attrs_map(user: dict) -> dict:
 
 def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
     try:
-        resp = cognito.list_users(UserPoolId=COGNITO_USER_POOL_ID, Filter=f'phone_number = "{e164}"', Limit=2)
-        users = resp.get("Users", []) or []
-        if not users:
-            digits = e164.lstrip("+")
-            try:
-                resp2 = cognito.list_users(UserPoolId=COGNITO_USER_POOL_ID, Filter=f'phone_number ^= "+{digits}"', Limit=5)
-                users = resp2.get("Users", []) or []
-            except ClientError:
-                pass
-        if not users:
+        user = phone_lookup.find_user(e164)
+        if not user:
             return None
-        user = users[0]
         attrs = _attrs_map(user)
         if KIOSK_REQUIRE_VERIFIED:
             verified = str(attrs.get("phone_number_verified", "")).lower() == "true"
@@ -109,26 +81,14 @@ def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
                 log.info("User found but phone_number_verified=false: %s", e164)
                 return None
         return user
+    except RateLimited as e:
+        raise too_many_requests(e)
     except ClientError as e:
         log.exception("Cognito list_users failed")
         raise HTTPException(status_code=500, detail=f"Cognito error: {e.response['Error'].get('Message', 'unknown')}")
 
 def _put_otp_session(phone: str, user_sub: str, code: str) -> str:
-    now_epoch = int(time.time())
-    ttl_epoch = now_epoch + OTP_TTL_SECONDS
-    session_id = str(uuid.uuid4())
-    item = {
-        "phone": phone,
-        "sessionId": session_id,
-        "code": code,  # plaintext for MVP; hash in prod if needed
-        "userSub": user_sub,
-        "createdAt": datetime.now(timezone.utc).isoformat(),
-        "ttl": ttl_epoch,
-        "attempts": 0,
-        "lastSendAt": now_epoch,
-    }
-    otp_table.put_item(Item=item)
-    return session_id
+    return otp_store.put_session(phone, user_sub, code)
 
 def _can_resend(existing: Optional[dict]) -> bool:
     if not existing:
@@ -137,53 +97,49 @@ def _can_resend(existing: Optional[dict]) -> bool:
     return (int(time.time()) - last) >= OTP_RESEND_COOLDOWN
 
 def _update_resend(existing: dict, new_code: str):
-    now_epoch = int(time.time())
-    ttl_epoch = now_epoch + OTP_TTL_SECONDS
-    otp_table.update_item(
-        Key={"phone": existing["phone"], "sessionId": existing["sessionId"]},
-        UpdateExpression="SET #c=:c, #ls=:ls, #ttl=:ttl, attempts=:z",
-        ExpressionAttributeNames={"#c": "code", "#ls": "lastSendAt", "#ttl": "ttl"},
-        ExpressionAttributeValues={":c": new_code, ":ls": now_epoch, ":ttl": ttl_epoch, ":z": 0},
-        ConditionExpression="attribute_exists(phone) AND attribute_exists(sessionId)",
-    )
+    otp_store.update_resend(existing, new_code)
 
 def _latest_session_for_phone(phone: str) -> Optional[dict]:
+    return otp_store.latest_for_phone(phone)
+
+def _consume_otp(phone: str, session_id: str, code: str) -> dict:
     try:
-        resp = otp_table.query(IndexName="GSI1", KeyConditionExpression=Key("phone").eq(phone), ScanIndexForward=False, Limit=1)
-        items = resp.get("Items", [])
-        return items[0] if items else None
+        outcome, item = otp_store.consume(phone, session_id, code)
     except Exception:
-        return None
+        log.exception("OTP verify failed")
+        raise HTTPException(status_code=500, detail="OTP verification failed")
+    if outcome == OK:
+        return item or {}
+    if outcome == EXPIRED:
+        raise HTTPException(status_code=400, detail="OTP expired")
+    if outcome == LOCKED:
+        raise HTTPException(status_code=429, detail="Too many attempts")
+    if outcome == INVALID:
+        raise HTTPException(status_code=400, detail="Invalid code")
+    raise HTTPException(status_code=400, detail="OTP session not found or expired")
 
-def _send_sms_twilio(e164: str, text: str):
-    if not twilio_client or not TWILIO_FROM_NUMBER:
-        raise HTTPException(status_code=500, detail="Twilio not configured")
-    try:
-        twilio_client.messages.create(body=text, from_=TWILIO_FROM_NUMBER, to=e164)
-    except Exception as e:
-        log.exception("Twilio send failed to %s", e164)
-        raise HTTPException(status_code=500, detail=f"Failed to send OTP via Twilio: {str(e)}")
-
-def _send_sms_sns(e164: str, text: str):
-    attrs = { "AWS.SNS.SMS.SMSType": {"DataType": "String", "StringValue": SNS_DEFAULT_SMS_TYPE} }
-    if SNS_SENDER_ID:
-        attrs["AWS.SNS.SMS.SenderID"] = {"DataType": "String", "StringValue": SNS_SENDER_ID}
-    if SNS_ORIGINATION_NUMBER:
-        attrs["AWS.SNS.SMS.OriginationNumber"] = {"DataType": "String", "StringValue": SNS_ORIGINATION_NUMBER}
-    if SNS_ENTITY_ID:
-        attrs["AWS.MM.SMS.EntityId"] = {"DataType": "String", "StringValue": SNS_ENTITY_ID}
-    if SNS_TEMPLATE_ID:
-        attrs["AWS.MM.SMS.TemplateId"] = {"DataType": "String", "StringValue": SNS_TEMPLATE_ID}
+def _sms_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="SMS service busy, please retry",
+        headers={"Retry-After": str(OTP_SMS_RETRY_AFTER)},
+    )
+
+def _reserve_sms(e164: str):
+    """Claim SMS queue room before the code is saved, so a full queue leaves no cooldown behind."""
     try:
-        sns.publish(PhoneNumber=e164, Message=text, MessageAttributes=attrs)
-    except Exception as e:
-        log.exception("SNS publish failed to %s", e164)
-        raise HTTPException(status_code=500, detail=f"Failed to send OTP via SNS: {str(e)}")
+        sms_dispatcher.reserve()
+    except SmsQueueFull:
+        log.warning("SMS queue full; rejecting send-otp for %s", e164)
+        raise _sms_busy()
 
-def _send_sms(e164: str, text: str):
-    if SMS_PROVIDER == "twilio":
-        return _send_sms_twilio(e164, text)
-    return _send_sms_sns(e164, text)
+def _send_sms(session_id: str, e164: str, text: str):
+    """Hand the message (queue room already reserved) to the SMS workers; delivery state is tracked per OTP session."""
+    try:
+        sms_dispatcher.enqueue(session_id, e164, text, reserved=True)
+    except SmsQueueFull:
+        log.warning("SMS queue full; rejecting send-otp for %s", e164)
+        raise _sms_busy()
 
 # -----------------------------------------------------------------------------#
 # Schemas                                                                       #
@@ -203,6 +159,13 @@ class SendOTPResp(BaseModel):
     otpSessionId: str
     normalizedPhone: str
 
+class OTPStatusResp(BaseModel):
+    otpSessionId: str
+    status: str                      # queued | sending | sent | failed | unknown
+    provider: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
 class VerifyOTPReq(BaseModel):
     mobile: str
     countryCode: str = "+91"
@@ -217,22 +180,40 @@ class VerifyOTPResp(BaseModel):
 # Routes                                                                        #
 # -----------------------------------------------------------------------------#
 @router.post("/send-otp", response_model=SendOTPResp)
-def send_otp(req: SendOTPReq, x_kiosk_key: Optional[str] = Header(None)):
+def send_otp(
+    req: SendOTPReq,
+    request: Request,
+    x_kiosk_key: Optional[str] = Header(None),
+    x_kiosk_id: Optional[str] = Header(None),
+):
     phone = normalize_phone(req.mobile, req.countryCode)
     if not phone:
         raise HTTPException(status_code=400, detail="Invalid phone")
 
-    log.info("Kiosk send-otp: normalized=%s pool=%s region=%s provider=%s",
-             phone, COGNITO_USER_POOL_ID, AWS_REGION, SMS_PROVIDER)
+    # Admission control before any Cognito / DynamoDB / SMS work.
+    try:
+        # per device: X-Kiosk-Id from a kiosk holding the shared key, else the caller's IP
+        # (an unauthenticated id could be rotated for a fresh bucket per request)
+        device = (x_kiosk_id or "").strip()[:64] if _is_kiosk(x_kiosk_key) else ""
+        otp_kiosk_limiter.check(f"id:{device}" if device else f"ip:{client_ip(request)}")
+        otp_phone_limiter.check(phone)
+    except RateLimited as e:
+        raise too_many_requests(e)
 
-    user = _find_cognito_user_by_phone(phone)
-    if not user:
-        raise HTTPException(status_code=404, detail="Mobile number not registered")
+    log.info("Kiosk send-otp: normalized=%s pool=%s region=%s provider=%s",
+             phone, COGNITO_USER_POOL_ID, AWS_REGION, sms_dispatcher.provider_name)
 
-    attrs = _attrs_map(user)
-    user_sub = attrs.get("sub") or user.get("Username")
+    # Patients mobile index first; Cognito only on a miss (or when verification state is required).
+    user_sub = None if KIOSK_REQUIRE_VERIFIED else phone_lookup.patient_id_from_index(phone)
     if not user_sub:
-        raise HTTPException(status_code=500, detail="Cognito user missing sub")
+        user = _find_cognito_user_by_phone(phone)
+        if not user:
+            raise HTTPException(status_code=404, detail="Mobile number not registered")
+
+        attrs = _attrs_map(user)
+        user_sub = attrs.get("sub") or user.get("Username")
+        if not user_sub:
+            raise HTTPException(status_code=500, detail="Cognito user missing sub")
 
     existing = _latest_session_for_phone(phone)
     if existing and not _can_resend(existing):
@@ -240,56 +221,49 @@ def send_otp(req: SendOTPReq, x_kiosk_key: Optional[str] = Header(None)):
 
     code = _gen_code(OTP_LENGTH)
 
-    if existing and _can_resend(existing):
-        _update_resend(existing, code)
-        session_id = existing["sessionId"]
-    else:
-        session_id = _put_otp_session(phone, user_sub, code)
+    _reserve_sms(phone)
+    try:
+        if existing and _can_resend(existing):
+            _update_resend(existing, code)
+            session_id = existing["sessionId"]
+        else:
+            session_id = _put_otp_session(phone, user_sub, code)
+    except BaseException:
+        sms_dispatcher.release()
+        raise
 
-    _send_sms(phone, f"{code} is your MedMitra verification code. It expires in {OTP_TTL_SECONDS // 60} min.")
+    _send_sms(session_id, phone, f"{code} is your MedMitra verification code. It expires in {OTP_TTL_SECONDS // 60} min.")
 
     return SendOTPResp(otpSessionId=session_id, normalizedPhone=phone)
 
+@router.get("/otp-status/{otpSessionId}", response_model=OTPStatusResp)
+def otp_status(otpSessionId: str, x_kiosk_key: Optional[str] = Header(None)):
+    st = sms_dispatcher.status(otpSessionId)
+    if not st:
+        # unknown to this process (expired, or sent by another worker)
+        return OTPStatusResp(otpSessionId=otpSessionId, status="unknown")
+    return OTPStatusResp(
+        otpSessionId=otpSessionId,
+        status=st.get("status") or "unknown",
+        provider=st.get("provider"),
+        attempts=int(st.get("attempts") or 0),
+        error=st.get("error"),
+    )
+
 @router.post("/verify-otp", response_model=VerifyOTPResp)
 def verify_otp(req: VerifyOTPReq, x_kiosk_key: Optional[str] = Header(None)):
     phone = normalize_phone(req.mobile, req.countryCode)
     if not phone:
         raise HTTPException(status_code=400, detail="Invalid phone")
 
-    item = None
-    if req.otpSessionId:
-        try:
-            resp = otp_table.get_item(Key={"phone": phone, "sessionId": req.otpSessionId})
-            item = resp.get("Item")
-        except Exception:
-            item = None
-    if not item:
-        item = _latest_session_for_phone(phone)
-    if not item:
-        raise HTTPException(status_code=400, detail="OTP session not found or expired")
-
-    if int(time.time()) >= int(item.get("ttl", 0)):
-        raise HTTPException(status_code=400, detail="OTP expired")
-
-    attempts = int(item.get("attempts", 0))
-    if attempts >= 5:
-        raise HTTPException(status_code=429, detail="Too many attempts")
+    session_id = req.otpSessionId
+    if not session_id:
+        latest = _latest_session_for_phone(phone)
+        if not latest:
+            raise HTTPException(status_code=400, detail="OTP session not found or expired")
+        session_id = latest["sessionId"]
 
-    if req.code != str(item.get("code")):
-        try:
-            otp_table.update_item(
-                Key={"phone": item["phone"], "sessionId": item["sessionId"]},
-                UpdateExpression="SET attempts = if_not_exists(attempts, :z) + :one",
-                ExpressionAttributeValues={":z": 0, ":one": 1},
-            )
-        except Exception:
-            pass
-        raise HTTPException(status_code=400, detail="Invalid code")
-
-    try:
-        otp_table.delete_item(Key={"phone": item["phone"], "sessionId": item["sessionId"]})
-    except Exception:
-        pass
+    item = _consume_otp(phone, session_id, req.code)
 
     patient_id = str(item.get("userSub") or "")
     if not patient_id:
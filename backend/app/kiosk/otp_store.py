@@ -0,0 +1,234 @@
+# backend/app/kiosk/otp_store.py
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+
+from app.db import dynamo
+
+log = logging.getLogger("kiosk-otp-store")
+
+# -----------------------------------------------------------------------------#
+# Env / Config                                                                 #
+# -----------------------------------------------------------------------------#
+# "dynamodb" (shared across workers/hosts) | "memory" (single process: one-node kiosks, tests)
+OTP_STORE = os.getenv("OTP_STORE", "dynamodb").strip().lower()
+DDB_TABLE_OTP = os.getenv("DDB_TABLE_KIOSK_OTP", "kiosk_otp")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_MEMORY_MAX = int(os.getenv("OTP_MEMORY_MAX", "100000"))
+
+# consume() outcomes
+OK = "ok"
+MISSING = "missing"      # no such session (never existed, consumed, or expired and swept)
+EXPIRED = "expired"
+LOCKED = "locked"        # attempts exhausted
+INVALID = "invalid"      # wrong code; attempt recorded
+
+
+def _new_item(phone: str, user_sub: str, code: str, ttl_seconds: int) -> Dict[str, Any]:
+    now_epoch = int(time.time())
+    return {
+        "phone": phone,
+        "sessionId": str(uuid.uuid4()),
+        "code": code,  # plaintext for MVP; hash in prod if needed
+        "userSub": user_sub,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "ttl": now_epoch + ttl_seconds,
+        "attempts": 0,
+        "lastSendAt": now_epoch,
+    }
+
+
+# -----------------------------------------------------------------------------#
+# DynamoDB                                                                     #
+# -----------------------------------------------------------------------------#
+class DynamoOtpStore:
+    """kiosk_otp table (phone, sessionId); verification is one conditional delete."""
+    name = "dynamodb"
+
+    def __init__(self, table_name: str, ttl_seconds: int, max_attempts: int):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self._deser = TypeDeserializer()
+
+    def _table(self):
+        # looked up per call: the handle is rebuilt per process after a fork
+        return dynamo.table(self.table_name)
+
+    def put_session(self, phone: str, user_sub: str, code: str) -> str:
+        item = _new_item(phone, user_sub, code, self.ttl_seconds)
+        self._table().put_item(Item=item)
+        return item["sessionId"]
+
+    def latest_for_phone(self, phone: str) -> Optional[dict]:
+        try:
+            resp = self._table().query(IndexName="GSI1", KeyConditionExpression=Key("phone").eq(phone), ScanIndexForward=False, Limit=1)
+            items = resp.get("Items", [])
+            return items[0] if items else None
+        except Exception:
+            return None
+
+    def update_resend(self, existing: dict, new_code: str):
+        now_epoch = int(time.time())
+        self._table().update_item(
+            Key={"phone": existing["phone"], "sessionId": existing["sessionId"]},
+            UpdateExpression="SET #c=:c, #ls=:ls, #ttl=:ttl, attempts=:z",
+            ExpressionAttributeNames={"#c": "code", "#ls": "lastSendAt", "#ttl": "ttl"},
+            ExpressionAttributeValues={":c": new_code, ":ls": now_epoch, ":ttl": now_epoch + self.ttl_seconds, ":z": 0},
+            ConditionExpression="attribute_exists(phone) AND attribute_exists(sessionId)",
+        )
+
+    def consume(self, phone: str, session_id: str, code: str) -> Tuple[str, Optional[dict]]:
+        """
+        Check-and-delete in one conditional write (code, TTL and attempts are in the
+        condition), so concurrent guesses cannot race on the attempt counter.
+        On a failed check the old row tells us why; a wrong code bumps attempts
+        with a second conditional write.
+        """
+        key = {"phone": phone, "sessionId": session_id}
+        now_epoch = int(time.time())
+        try:
+            resp = self._table().delete_item(
+                Key=key,
+                ConditionExpression="#c = :c AND #ttl > :now AND (attribute_not_exists(attempts) OR attempts < :max)",
+                ExpressionAttributeNames={"#c": "code", "#ttl": "ttl"},
+                ExpressionAttributeValues={":c": code, ":now": now_epoch, ":max": self.max_attempts},
+                ReturnValues="ALL_OLD",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return OK, resp.get("Attributes") or {}
+        except ClientError as e:
+            if e.response["Error"].get("Code") != "ConditionalCheckFailedException":
+                raise
+            raw = e.response.get("Item")
+
+        # error responses are not run through the resource layer's deserializer
+        old = {k: self._deser.deserialize(v) for k, v in raw.items()} if raw else None
+        if not old:
+            return MISSING, None
+        if now_epoch >= int(old.get("ttl", 0)):
+            return EXPIRED, old
+        if int(old.get("attempts", 0)) >= self.max_attempts:
+            return LOCKED, old
+
+        try:
+            self._table().update_item(
+                Key=key,
+                UpdateExpression="SET attempts = if_not_exists(attempts, :z) + :one",
+                ConditionExpression="attribute_exists(sessionId) AND (attribute_not_exists(attempts) OR attempts < :max)",
+                ExpressionAttributeValues={":z": 0, ":one": 1, ":max": self.max_attempts},
+            )
+        except ClientError as e:
+            if e.response["Error"].get("Code") == "ConditionalCheckFailedException":
+                # a concurrent guess used the last attempt (or consumed the session)
+                return LOCKED, old
+            log.warning("OTP attempt increment failed: %s", e)
+        return INVALID, old
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "table": self.table_name}
+
+
+# -----------------------------------------------------------------------------#
+# In-memory                                                                    #
+# -----------------------------------------------------------------------------#
+class MemoryOtpStore:
+    """
+    Process-local sessions behind one lock; expired rows are dropped on access and
+    swept when the store grows past `max_entries`. Only correct with a single worker
+    process, since send and verify must land on the same one.
+    """
+    name = "memory"
+
+    def __init__(self, ttl_seconds: int, max_attempts: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._latest: Dict[str, str] = {}  # phone -> newest sessionId
+        self.expired = 0
+
+    def _drop(self, k: Tuple[str, str]):
+        # caller holds self._lock
+        self._items.pop(k, None)
+        if self._latest.get(k[0]) == k[1]:
+            del self._latest[k[0]]
+
+    def _sweep(self, now_epoch: int):
+        # caller holds self._lock
+        for k in [k for k, it in self._items.items() if it["ttl"] <= now_epoch]:
+            self._drop(k)
+            self.expired += 1
+        # still full of live sessions: evict the ones closest to expiry
+        if len(self._items) > self.max_entries:
+            for k in sorted(self._items, key=lambda k: self._items[k]["ttl"])[: len(self._items) - self.max_entries]:
+                self._drop(k)
+
+    def put_session(self, phone: str, user_sub: str, code: str) -> str:
+        item = _new_item(phone, user_sub, code, self.ttl_seconds)
+        with self._lock:
+            if len(self._items) >= self.max_entries:
+                self._sweep(item["lastSendAt"])
+            self._items[(phone, item["sessionId"])] = item
+            self._latest[phone] = item["sessionId"]
+        return item["sessionId"]
+
+    def latest_for_phone(self, phone: str) -> Optional[dict]:
+        with self._lock:
+            sid = self._latest.get(phone)
+            it = self._items.get((phone, sid)) if sid else None
+            if it is None or it["ttl"] <= int(time.time()):
+                return None
+            return dict(it)
+
+    def update_resend(self, existing: dict, new_code: str):
+        now_epoch = int(time.time())
+        with self._lock:
+            it = self._items.get((existing["phone"], existing["sessionId"]))
+            if it is None:
+                raise KeyError("OTP session not found")
+            it.update(code=new_code, lastSendAt=now_epoch, ttl=now_epoch + self.ttl_seconds, attempts=0)
+
+    def consume(self, phone: str, session_id: str, code: str) -> Tuple[str, Optional[dict]]:
+        k = (phone, session_id)
+        now_epoch = int(time.time())
+        with self._lock:
+            it = self._items.get(k)
+            if it is None:
+                return MISSING, None
+            if now_epoch >= it["ttl"]:
+                self._drop(k)
+                self.expired += 1
+                return EXPIRED, dict(it)
+            if it["attempts"] >= self.max_attempts:
+                return LOCKED, dict(it)
+            if it["code"] != code:
+                it["attempts"] += 1
+                return INVALID, dict(it)
+            self._drop(k)
+            return OK, it
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, "size": len(self._items), "maxEntries": self.max_entries, "expired": self.expired}
+
+
+def _build_store():
+    if OTP_STORE == "memory":
+        return MemoryOtpStore(OTP_TTL_SECONDS, OTP_MAX_ATTEMPTS, OTP_MEMORY_MAX)
+    if OTP_STORE not in ("dynamodb", "ddb"):
+        log.warning("Unknown OTP_STORE=%r; using dynamodb", OTP_STORE)
+    return DynamoOtpStore(DDB_TABLE_OTP, OTP_TTL_SECONDS, OTP_MAX_ATTEMPTS)
+
+
+otp_store = _build_store()
@@ -0,0 +1,317 @@
+# backend/app/kiosk/sms.py
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import boto3
+from botocore.config import Config
+
+log = logging.getLogger("kiosk-sms")
+
+# -----------------------------------------------------------------------------#
+# Env / Config                                                                 #
+# -----------------------------------------------------------------------------#
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+
+# Twilio (preferred)
+try:
+    from twilio.rest import Client as TwilioClient  # type: ignore
+    from twilio.http.http_client import TwilioHttpClient  # type: ignore
+except Exception:
+    TwilioClient = None  # if not installed
+    TwilioHttpClient = None
+
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
+TWILIO_AUTH_TOKEN  = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "").strip()
+TWILIO_ENABLED = bool(TwilioClient and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER)
+
+# SNS (fallback)
+SNS_REGION = os.getenv("SNS_REGION") or AWS_REGION
+SNS_SENDER_ID = os.getenv("SNS_SENDER_ID", "").strip()
+SNS_ENTITY_ID = os.getenv("SNS_ENTITY_ID", "").strip()
+SNS_TEMPLATE_ID = os.getenv("SNS_TEMPLATE_ID", "").strip()
+SNS_ORIGINATION_NUMBER = os.getenv("SNS_ORIGINATION_NUMBER", "").strip()
+SNS_DEFAULT_SMS_TYPE = os.getenv("SNS_DEFAULT_SMS_TYPE", "Transactional")
+
+# "twilio" | "sns" | "fake" (offline: records messages, never calls out)
+SMS_PROVIDER = (os.getenv("SMS_PROVIDER") or ("twilio" if TWILIO_ENABLED else "sns")).strip().lower()
+SMS_FAILOVER = (os.getenv("SMS_FAILOVER", "true").strip().lower() != "false")  # twilio -> sns
+
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", "4"))
+SMS_QUEUE_MAX = int(os.getenv("SMS_QUEUE_MAX", "1000"))
+SMS_MAX_ATTEMPTS = int(os.getenv("SMS_MAX_ATTEMPTS", "3"))       # per provider
+SMS_BACKOFF_BASE = float(os.getenv("SMS_BACKOFF_BASE", "0.5"))   # seconds
+SMS_BACKOFF_MAX = float(os.getenv("SMS_BACKOFF_MAX", "5"))
+SMS_TIMEOUT = float(os.getenv("SMS_TIMEOUT", "10"))
+SMS_STATUS_TTL = int(os.getenv("SMS_STATUS_TTL", os.getenv("OTP_TTL_SECONDS", "300")))
+SMS_STATUS_MAX = int(os.getenv("SMS_STATUS_MAX", "20000"))
+
+# Fake provider knobs (tests / load runs)
+SMS_FAKE_LATENCY = float(os.getenv("SMS_FAKE_LATENCY", "0"))
+SMS_FAKE_FAIL_RATE = float(os.getenv("SMS_FAKE_FAIL_RATE", "0"))
+
+
+# -----------------------------------------------------------------------------#
+# Providers                                                                    #
+# -----------------------------------------------------------------------------#
+class TwilioProvider:
+    name = "twilio"
+
+    def __init__(self):
+        # pooled keep-alive HTTP session shared by all workers
+        http = TwilioHttpClient(pool_connections=True, timeout=SMS_TIMEOUT) if TwilioHttpClient else None
+        self.client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http)
+
+    def send(self, e164: str, text: str):
+        self.client.messages.create(body=text, from_=TWILIO_FROM_NUMBER, to=e164)
+
+
+class SnsProvider:
+    name = "sns"
+
+    def __init__(self):
+        self.client = boto3.client(
+            "sns",
+            region_name=SNS_REGION,
+            config=Config(
+                max_pool_connections=max(10, SMS_WORKERS),
+                connect_timeout=SMS_TIMEOUT,
+                read_timeout=SMS_TIMEOUT,
+                retries={"total_max_attempts": 1},  # retries are ours (jittered, with failover)
+            ),
+        )
+        attrs = {"AWS.SNS.SMS.SMSType": {"DataType": "String", "StringValue": SNS_DEFAULT_SMS_TYPE}}
+        if SNS_SENDER_ID:
+            attrs["AWS.SNS.SMS.SenderID"] = {"DataType": "String", "StringValue": SNS_SENDER_ID}
+        if SNS_ORIGINATION_NUMBER:
+            attrs["AWS.SNS.SMS.OriginationNumber"] = {"DataType": "String", "StringValue": SNS_ORIGINATION_NUMBER}
+        if SNS_ENTITY_ID:
+            attrs["AWS.MM.SMS.EntityId"] = {"DataType": "String", "StringValue": SNS_ENTITY_ID}
+        if SNS_TEMPLATE_ID:
+            attrs["AWS.MM.SMS.TemplateId"] = {"DataType": "String", "StringValue": SNS_TEMPLATE_ID}
+        self.attrs = attrs
+
+    def send(self, e164: str, text: str):
+        self.client.publish(PhoneNumber=e164, Message=text, MessageAttributes=self.attrs)
+
+
+class FakeProvider:
+    """Offline provider: keeps the last messages in memory; latency/failures via env."""
+    name = "fake"
+
+    def __init__(self, latency: float = SMS_FAKE_LATENCY, fail_rate: float = SMS_FAKE_FAIL_RATE):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.sent: "OrderedDict[str, str]" = OrderedDict()  # e164 -> last text
+        self._lock = threading.Lock()
+
+    def send(self, e164: str, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise RuntimeError("fake provider failure")
+        with self._lock:
+            self.sent[e164] = text
+            self.sent.move_to_end(e164)
+            while len(self.sent) > 1000:
+                self.sent.popitem(last=False)
+
+
+def _build_providers() -> List[Any]:
+    if SMS_PROVIDER == "fake":
+        return [FakeProvider()]
+    chain: List[Any] = []
+    if SMS_PROVIDER == "twilio" and TWILIO_ENABLED:
+        chain.append(TwilioProvider())
+        if SMS_FAILOVER:
+            chain.append(SnsProvider())
+    else:
+        chain.append(SnsProvider())
+    return chain
+
+
+# -----------------------------------------------------------------------------#
+# Dispatcher                                                                   #
+# -----------------------------------------------------------------------------#
+class SmsQueueFull(Exception):
+    pass
+
+
+class SmsDispatcher:
+    """
+    Outbound SMS off the request thread. Messages are keyed by OTP session: a resend
+    that arrives while the previous text is still queued replaces it instead of
+    sending twice. Each message walks the provider chain (Twilio -> SNS) with
+    jittered exponential backoff per provider. Delivery state per session is kept
+    for SMS_STATUS_TTL seconds.
+    """
+
+    def __init__(self, providers: List[Any], workers: int, maxsize: int):
+        self.providers = providers
+        self.workers = max(1, workers)
+        self._q: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=maxsize)
+        self._pending: Dict[str, Dict[str, str]] = {}   # sessionId -> {"to", "text"}
+        self._status: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._reserved = 0   # queue slots claimed by reserve() but not yet enqueued
+        self.enqueued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.failovers = 0
+
+    @property
+    def provider_name(self) -> str:
+        return "+".join(p.name for p in self.providers)
+
+    def _start(self):
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"kiosk-sms-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _set_status(self, session_id: str, **fields):
+        # caller holds self._lock
+        st = self._status.get(session_id) or {"sessionId": session_id, "attempts": 0}
+        st.update(fields, updatedAt=time.time())
+        self._status[session_id] = st
+        self._status.move_to_end(session_id)
+        cutoff = time.time() - SMS_STATUS_TTL
+        while self._status and (
+            len(self._status) > SMS_STATUS_MAX or next(iter(self._status.values()))["updatedAt"] < cutoff
+        ):
+            self._status.popitem(last=False)
+
+    def _full(self) -> bool:
+        # caller holds self._lock
+        return self._q.maxsize > 0 and self._q.qsize() + self._reserved >= self._q.maxsize
+
+    def reserve(self):
+        """
+        Claim room for one message ahead of enqueue(..., reserved=True), so the caller can
+        persist state in between without it outliving a rejected send. Raises SmsQueueFull.
+        """
+        with self._lock:
+            if self._full():
+                raise SmsQueueFull()
+            self._reserved += 1
+
+    def release(self):
+        """Give back a reserve() that will not be enqueued."""
+        with self._lock:
+            self._reserved = max(0, self._reserved - 1)
+
+    def enqueue(self, session_id: str, e164: str, text: str, reserved: bool = False):
+        """Queue an SMS for `session_id`; raises SmsQueueFull when the queue is saturated."""
+        self._start()
+        with self._lock:
+            if reserved:
+                self._reserved = max(0, self._reserved - 1)
+            if session_id in self._pending:
+                self._pending[session_id] = {"to": e164, "text": text}
+                self.coalesced += 1
+                return
+            if self._full():
+                raise SmsQueueFull()
+            self._pending[session_id] = {"to": e164, "text": text}
+            try:
+                self._q.put_nowait(session_id)
+            except queue.Full:
+                self._pending.pop(session_id, None)
+                raise SmsQueueFull()
+            self.enqueued += 1
+            self._set_status(session_id, status="queued", provider=None, error=None)
+
+    def _run(self):
+        while True:
+            session_id = self._q.get()
+            try:
+                if session_id is None:
+                    return
+                with self._lock:
+                    msg = self._pending.pop(session_id, None)
+                    if msg:
+                        self._set_status(session_id, status="sending")
+                if msg:
+                    self._deliver(session_id, msg["to"], msg["text"])
+            finally:
+                self._q.task_done()
+
+    def _deliver(self, session_id: str, e164: str, text: str):
+        last_err: Optional[BaseException] = None
+        for n, provider in enumerate(self.providers):
+            if n:
+                with self._lock:
+                    self.failovers += 1
+            for attempt in range(SMS_MAX_ATTEMPTS):
+                with self._lock:
+                    st = self._status.get(session_id)
+                    if st is not None:
+                        st["attempts"] = st.get("attempts", 0) + 1
+                try:
+                    provider.send(e164, text)
+                    with self._lock:
+                        self.sent += 1
+                        self._set_status(session_id, status="sent", provider=provider.name, error=None)
+                    return
+                except Exception as e:
+                    last_err = e
+                    log.warning("SMS via %s failed (attempt %d) to %s: %s", provider.name, attempt + 1, e164, e)
+                    if attempt + 1 < SMS_MAX_ATTEMPTS:
+                        with self._lock:
+                            self.retries += 1
+                        delay = min(SMS_BACKOFF_MAX, SMS_BACKOFF_BASE * (2 ** attempt))
+                        time.sleep(random.uniform(0, delay))  # full jitter
+        with self._lock:
+            self.failed += 1
+            self._set_status(session_id, status="failed", error=str(last_err)[:200] if last_err else "no provider")
+        log.error("SMS delivery failed for session %s to %s", session_id, e164)
+
+    def status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            st = self._status.get(session_id)
+            return dict(st) if st else None
+
+    def shutdown(self, timeout: float = 10.0):
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        deadline = time.monotonic() + timeout
+        for _ in threads:
+            try:
+                self._q.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "providers": self.provider_name,
+                "queueDepth": self._q.qsize(),
+                "queueMax": self._q.maxsize,
+                "reserved": self._reserved,
+                "workers": len(self._threads),
+                "enqueued": self.enqueued,
+                "coalesced": self.coalesced,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "failovers": self.failovers,
+            }
+
+
+sms_dispatcher = SmsDispatcher(_build_providers(), SMS_WORKERS, SMS_QUEUE_MAX)
@@ -9,6 +9,8 @@ from fastapi import APIRouter, Body, Header, HTTPException
 from botocore.exceptions import ClientError
 
 from app.auth import cognito as cg
+from app.auth.phone_lookup import phone_lookup
+from app.ratelimit import RateLimited, too_many_requests
 from app.db.dynamo import patients_table
 from app.models.patients import WalkinRegisterRequest, WalkinRegisterResponse
 
@@ -57,7 +59,7 @@ def _upsert_patient(patient_id: str, e164: str, req: WalkinRegisterRequest):
         "updatedAt": now,
         "createdAt": now,
     }
-    patients_table.put_item(Item=item)
+    patients_table().put_item(Item=item)
 
 @router.post("/walkins/register", response_model=WalkinRegisterResponse, status_code=201)
 def walkin_register(
@@ -71,10 +73,16 @@ def walkin_register(
     if not e164 or len(re.sub(r"\D", "", e164)) < 10:
         raise HTTPException(status_code=400, detail="Invalid mobile number")
 
-    user = cg.list_user_by_phone(e164)
+    # Already registered via the patients mobile index -> no Cognito round trip at all.
+    patient_id = phone_lookup.patient_id_from_index(e164)
+    try:
+        user = None if patient_id else cg.list_user_by_phone(e164)
+    except RateLimited as e:
+        # never fall through to create-user when the lookup was throttled
+        raise too_many_requests(e)
     created = False
 
-    if not user:
+    if not patient_id and not user:
         # Pool expects email as username -> use a placeholder email as the username.
         # Keep the real phone in phone_number (and verify later via OTP flow).
         local_part = re.sub(r"\D", "", e164)  # e.g. "+9198..." -> "9198..."
@@ -97,11 +105,13 @@ def walkin_register(
             cg.ensure_group(username)
             user = cg.admin_get_user(username)
             created = True
+            # drop the cached "not registered" answer so send-otp sees the new user
+            phone_lookup.invalidate(e164)
         except ClientError as e:
             msg = e.response["Error"].get("Message", str(e))
             raise HTTPException(status_code=400, detail=f"Cognito create failed: {msg}")
 
-    patient_id = _user_sub(user) or ""
+    patient_id = patient_id or _user_sub(user) or ""
     if not patient_id:
         raise HTTPException(status_code=500, detail="Could not determine patientId (sub)")
 
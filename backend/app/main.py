@@ -121,6 +121,7 @@ import os
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -167,6 +168,13 @@ else:
     )
     log.warning("CORS permissive (demo mode): allow_origin_regex='.*', credentials=FALSE")
 
+# -------------------------
+# Compression: JSON listings shrink ~5-10x; small bodies are not worth the CPU
+# -------------------------
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+if GZIP_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
 # -------------------------
 # Health & root
 # -------------------------
@@ -182,6 +190,39 @@ def health():
 def healthz():
     return {"status": "ok"}
 
+@app.get("/stats")
+def stats():
+    # Per-worker counters; each uvicorn worker reports its own process.
+    from app.db import dynamo
+    from app.appointments.slot_cache import availability_cache
+    from app.appointments.archiver import archiver
+    from app.auth.phone_lookup import phone_lookup
+    from app.kiosk.sms import sms_dispatcher
+    from app.kiosk.otp_store import otp_store
+    from app import ratelimit
+    from app.voice.stt import stt_client
+    from app.voice.streaming import stream_stats
+    from app.voice.assembly import assemblies
+    from app.voice.transcript_cache import transcript_cache
+    from app.voice.preprocess import preprocess_stats
+    from app.voice.realtime import stream_stats as realtime_stats
+    return {
+        "pid": os.getpid(),
+        "dynamodb": dynamo.stats(),
+        "availabilityCache": availability_cache.stats(),
+        "archiver": archiver.stats(),
+        "phoneLookup": phone_lookup.stats(),
+        "sms": sms_dispatcher.stats(),
+        "otpStore": otp_store.stats(),
+        "rateLimits": ratelimit.stats(),
+        "stt": stt_client.stats(),
+        "voiceUploads": stream_stats.snapshot(),
+        "audioAssembly": assemblies.stats(),
+        "transcriptCache": transcript_cache.stats(),
+        "sttPreprocess": preprocess_stats.snapshot(),
+        "sttStream": realtime_stats.snapshot(),
+    }
+
 # -------------------------
 # Routers
 # -------------------------
@@ -201,10 +242,12 @@ _mount("app.kiosk.identify:router", "/api", "kiosk identify")
 _mount("app.kiosk.session:router", "/api", "kiosk session")
 
 # appointments
-_mount("app.appointments.router:router", "/api", "appointments core")
+# NOTE: fixed paths first; "appointments core" has the GET /appointments/{patientId} catch-all.
 _mount("app.appointments.availability:router", "/api", "appointments availability")
 _mount("app.appointments.book:router", "/api", "appointments booking")
+_mount("app.appointments.book_batch:router", "/api", "appointments batch booking")
 _mount("app.appointments.kiosk_attach:router", "/api", "appointments kiosk attach")
+_mount("app.appointments.router:router", "/api", "appointments core")
 
 # voice + billing
 _mount("app.voice.router:router", "/api", "voice")
@@ -220,6 +263,21 @@ def _log_routes():
         path = getattr(r, "path", "")
         log.info("ROUTE %-12s %s", methods, path)
 
+@app.on_event("shutdown")
+def _flush_background_work():
+    # Drain queued S3 archive uploads and OTP texts before the worker exits.
+    from app.appointments.archiver import archiver
+    from app.kiosk.sms import sms_dispatcher
+    archiver.shutdown()
+    sms_dispatcher.shutdown()
+
+@app.on_event("shutdown")
+async def _close_http_clients():
+    from app.voice.stt import stt_client
+    from app.voice.assembly import assemblies
+    await assemblies.close()
+    await stt_client.close()
+
 # -------------------------
 # Entrypoint
 # -------------------------
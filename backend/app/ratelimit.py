@@ -0,0 +1,190 @@
+# backend/app/ratelimit.py
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from fastapi import HTTPException
+
+log = logging.getLogger("ratelimit")
+
+# -----------------------------------------------------------------------------#
+# Env / Config  (rate 0 disables a limiter)                                    #
+# -----------------------------------------------------------------------------#
+OTP_PHONE_RATE_PER_MIN = float(os.getenv("OTP_PHONE_RATE_PER_MIN", "3"))
+OTP_PHONE_BURST = int(os.getenv("OTP_PHONE_BURST", "3"))
+OTP_KIOSK_RATE_PER_MIN = float(os.getenv("OTP_KIOSK_RATE_PER_MIN", "60"))
+OTP_KIOSK_BURST = int(os.getenv("OTP_KIOSK_BURST", "20"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+# proxies in front of the app that append to X-Forwarded-For (0 = use the socket peer,
+# the only safe choice without a proxy: the header is otherwise client-controlled)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+COGNITO_RPS = float(os.getenv("COGNITO_RPS", "20"))            # per worker process
+COGNITO_BURST = int(os.getenv("COGNITO_BURST", "20"))
+COGNITO_MAX_WAIT = float(os.getenv("COGNITO_MAX_WAIT", "0.5"))  # queue this long, then 429
+COGNITO_THROTTLE_RETRY_AFTER = int(os.getenv("COGNITO_THROTTLE_RETRY_AFTER", "2"))
+
+
+class RateLimited(Exception):
+    def __init__(self, what: str, retry_after: float):
+        super().__init__(f"{what} rate limit exceeded")
+        self.what = what
+        self.retry_after = retry_after
+
+
+def too_many_requests(e: RateLimited) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Too many requests ({e.what}), please retry",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+def client_ip(request) -> str:
+    """
+    Caller IP as seen by the outermost trusted proxy: the TRUSTED_PROXY_HOPS-th entry from
+    the right of X-Forwarded-For (entries further left are client-supplied and spoofable).
+    """
+    peer = request.client.host if request.client else ""
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    hops = [h.strip() for h in (request.headers.get("x-forwarded-for") or "").split(",") if h.strip()]
+    if not hops:
+        return peer
+    return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+
+
+class _Bucket:
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, tokens: float, ts: float):
+        self.tokens = tokens
+        self.ts = ts
+
+
+def _reserve(b: _Bucket, rate: float, burst: int, now: float, max_wait: float) -> Tuple[bool, float]:
+    """Take one token, borrowing against the refill for up to `max_wait` seconds.
+    Returns (admitted, wait): the wait before proceeding, or the retry-after on rejection."""
+    b.tokens = min(burst, b.tokens + (now - b.ts) * rate)
+    b.ts = now
+    if b.tokens >= 1:
+        b.tokens -= 1
+        return True, 0.0
+    wait = (1 - b.tokens) / rate
+    if wait <= max_wait:
+        b.tokens -= 1
+        return True, wait
+    return False, wait
+
+
+class TokenBucket:
+    """
+    One shared bucket (e.g. Cognito calls for the whole process). Callers queue
+    for up to `max_wait` seconds for a token, otherwise RateLimited is raised.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_wait: float = 0.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self._b = _Bucket(self.burst, time.monotonic())
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.throttled = 0  # upstream throttling seen despite the limiter
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            ok, wait = _reserve(self._b, self.rate, self.burst, time.monotonic(), self.max_wait)
+            if not ok:
+                self.rejected += 1
+            else:
+                self.admitted += 1
+                if wait:
+                    self.queued += 1
+        if not ok:
+            raise RateLimited(self.name, wait)
+        if wait:
+            time.sleep(wait)
+
+    def note_throttled(self):
+        with self._lock:
+            self.throttled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ratePerSecond": self.rate,
+                "burst": self.burst,
+                "maxWaitSeconds": self.max_wait,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+            }
+
+
+class KeyedLimiter:
+    """Per-key buckets (phone, kiosk) that fail fast; least recently used keys are evicted."""
+
+    def __init__(self, name: str, rate_per_min: float, burst: int, max_keys: int):
+        self.name = name
+        self.rate = rate_per_min / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+
+    def check(self, key: str):
+        """Admit one request for `key` or raise RateLimited."""
+        if self.rate <= 0 or not key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = _Bucket(self.burst, now)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            ok, wait = _reserve(b, self.rate, self.burst, now, 0.0)
+            if ok:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        if not ok:
+            raise RateLimited(self.name, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ratePerMinute": self.rate * 60,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+otp_phone_limiter = KeyedLimiter("phone", OTP_PHONE_RATE_PER_MIN, OTP_PHONE_BURST, RATE_LIMIT_MAX_KEYS)
+otp_kiosk_limiter = KeyedLimiter("kiosk", OTP_KIOSK_RATE_PER_MIN, OTP_KIOSK_BURST, RATE_LIMIT_MAX_KEYS)
+cognito_limiter = TokenBucket("cognito", COGNITO_RPS, COGNITO_BURST, COGNITO_MAX_WAIT)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "otpPhone": otp_phone_limiter.stats(),
+        "otpKiosk": otp_kiosk_limiter.stats(),
+        "cognito": cognito_limiter.stats(),
+    }
@@ -0,0 +1,220 @@
+# backend/app/voice/assembly.py
+# Incremental session audio (AUDIO_ASSEMBLY=incremental): every /audio-upload segment is
+# appended to an open S3 multipart upload for <session_id>.wav as it arrives, so
+# /audio-finalize only has to write the header part and complete the upload.
+# State is per worker process: a session's uploads must reach the same worker
+# (single worker, or sticky routing on session_id).
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.voice import wav
+from app.voice.stitch import WavPartWriter
+from app.voice.streaming import S3_MIN_PART
+
+log = logging.getLogger("clinic-os.voice.assembly")
+
+AUDIO_ASSEMBLY = os.getenv("AUDIO_ASSEMBLY", "segments").strip().lower()   # segments | incremental
+AUDIO_ASSEMBLY_PART_SIZE = max(S3_MIN_PART, int(os.getenv("AUDIO_ASSEMBLY_PART_SIZE", str(S3_MIN_PART))))
+AUDIO_ASSEMBLY_IDLE_SECONDS = float(os.getenv("AUDIO_ASSEMBLY_IDLE_SECONDS", "1800"))
+AUDIO_REORDER_MAX_BYTES = int(os.getenv("AUDIO_REORDER_MAX_BYTES", str(32 * 1024 * 1024)))            # per session
+AUDIO_REORDER_MAX_TOTAL_BYTES = int(os.getenv("AUDIO_REORDER_MAX_TOTAL_BYTES", str(256 * 1024 * 1024)))  # per worker
+AUDIO_REORDER_RETRY_AFTER = int(os.getenv("AUDIO_REORDER_RETRY_AFTER", "2"))
+
+
+class AssemblyError(Exception):
+    def __init__(self, status: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class SessionAssembly:
+    """
+    One recording. Segments are appended strictly in seq order starting at 0;
+    early arrivals wait in `pending` (bounded by AUDIO_REORDER_MAX_BYTES per session and
+    AUDIO_REORDER_MAX_TOTAL_BYTES across the registry) until the gap is filled.
+    Finalize appends whatever is still pending (reporting the gaps).
+    """
+
+    def __init__(self, s3, bucket: str, session_id: str, registry: Optional["AssemblyRegistry"] = None):
+        self.session_id = session_id
+        self.registry = registry
+        self.key = f"{session_id}.wav"
+        self.writer = WavPartWriter(s3, bucket, self.key, AUDIO_ASSEMBLY_PART_SIZE)
+        self.lock = asyncio.Lock()
+        self.info: Optional[wav.WavInfo] = None
+        self.next_seq = 0
+        self.pending: Dict[int, memoryview] = {}
+        self.pending_bytes = 0
+        self.appended = 0
+        self.missing: List[int] = []
+        self.closed = False
+        self.touched = time.monotonic()
+
+    def _check(self, seq: int, info: wav.WavInfo):
+        if self.info is None:
+            self.info = info
+        elif not info.same_format(self.info):
+            raise AssemblyError(
+                422,
+                f"seq {seq}: format {info.channels}ch/{info.sample_rate}Hz/{info.bits_per_sample}bit "
+                f"differs from {self.info.channels}ch/{self.info.sample_rate}Hz/{self.info.bits_per_sample}bit",
+            )
+
+    async def _append(self, pcm: memoryview):
+        await asyncio.to_thread(self.writer.write, pcm)
+        self.appended += 1
+
+    async def add(self, seq: int, body) -> Dict[str, Any]:
+        """`body` is any bytes-like WAV; its PCM is kept as a view, never copied."""
+        info = wav.parse(body, f"seq {seq}")
+        pcm = memoryview(body)[info.data_offset:info.data_offset + info.data_size]
+        async with self.lock:
+            if self.closed:
+                raise AssemblyError(409, "Session audio already finalized")
+            self.touched = time.monotonic()
+            if seq < self.next_seq or seq in self.pending:
+                return self.status(duplicate=True)
+            self._check(seq, info)
+            if seq != self.next_seq:
+                if self.pending_bytes + len(pcm) > AUDIO_REORDER_MAX_BYTES:
+                    raise AssemblyError(409, f"seq {seq} too far ahead (waiting for seq {self.next_seq})")
+                if self.registry is not None and self.registry.pending_bytes() + len(pcm) > AUDIO_REORDER_MAX_TOTAL_BYTES:
+                    raise AssemblyError(503, "Audio reorder buffer full, please retry", AUDIO_REORDER_RETRY_AFTER)
+                self.pending[seq] = pcm
+                self.pending_bytes += len(pcm)
+                return self.status()
+            await self._append(pcm)
+            self.next_seq += 1
+            while self.next_seq in self.pending:
+                nxt = self.pending.pop(self.next_seq)
+                self.pending_bytes -= len(nxt)
+                await self._append(nxt)
+                self.next_seq += 1
+            return self.status()
+
+    async def finalize(self) -> Dict[str, Any]:
+        async with self.lock:
+            if self.closed:
+                raise AssemblyError(409, "Session audio already finalized")
+            if self.info is None:
+                raise AssemblyError(404, "No audio received for this session")
+            self.closed = True
+            for seq in sorted(self.pending):
+                self.missing.extend(range(self.next_seq, seq))
+                await self._append(self.pending.pop(seq))
+                self.next_seq = seq + 1
+            self.pending_bytes = 0
+            size = await asyncio.to_thread(self.writer.finish, self.info)
+            return {
+                "key": self.key,
+                "segments": self.appended,
+                "bytes": size,
+                "durationSeconds": round(self.writer.data_size / self.info.byte_rate, 3) if self.info.byte_rate else None,
+                "missingSeqs": self.missing,
+            }
+
+    async def abort(self):
+        async with self.lock:
+            self.closed = True
+            self.pending.clear()
+            self.pending_bytes = 0
+            await asyncio.to_thread(self.writer.abort)
+
+    def status(self, duplicate: bool = False) -> Dict[str, Any]:
+        return {
+            "nextSeq": self.next_seq,
+            "appended": self.appended,
+            "pendingSeqs": sorted(self.pending),
+            "bytes": self.writer.data_size,
+            "duplicate": duplicate,
+        }
+
+
+class AssemblyRegistry:
+    def __init__(self, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self._sessions: Dict[str, SessionAssembly] = {}
+        self.finalized = 0
+        self.expired = 0
+
+    async def _reap(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for sid, a in list(self._sessions.items()):
+            if a.touched < cutoff and not a.lock.locked():
+                self._sessions.pop(sid, None)
+                self.expired += 1
+                log.warning("AUDIO: abandoning idle assembly %s (%d segments)", sid, a.appended)
+                await a.abort()
+
+    def pending_bytes(self) -> int:
+        return sum(a.pending_bytes for a in self._sessions.values())
+
+    async def add(self, s3, bucket: str, session_id: str, seq: int, body) -> Dict[str, Any]:
+        await self._reap()
+        a = self._sessions.get(session_id)
+        if a is None:
+            a = self._sessions[session_id] = SessionAssembly(s3, bucket, session_id, self)
+        try:
+            return await a.add(seq, body)
+        except wav.WavError as e:
+            if a.info is None:
+                self._sessions.pop(session_id, None)  # nothing valid received yet
+            raise AssemblyError(422, str(e))
+        except AssemblyError:
+            raise
+        except Exception:
+            # S3 failure mid-append: the open upload can no longer be trusted
+            self._sessions.pop(session_id, None)
+            await a.abort()
+            raise
+
+    def has(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    async def finalize(self, session_id: str) -> Dict[str, Any]:
+        a = self._sessions.get(session_id)
+        if a is None:
+            raise AssemblyError(404, "No open audio assembly for this session")
+        try:
+            out = await a.finalize()
+        except wav.WavError as e:
+            raise AssemblyError(422, str(e))
+        except AssemblyError:
+            raise
+        except Exception:
+            self._sessions.pop(session_id, None)
+            await a.abort()
+            raise
+        self._sessions.pop(session_id, None)
+        self.finalized += 1
+        return out
+
+    async def close(self):
+        """Worker shutdown: keep what was recorded rather than dropping open uploads."""
+        for sid in list(self._sessions):
+            try:
+                out = await self.finalize(sid)
+                log.info("AUDIO: finalized %s at shutdown (%d segments)", sid, out["segments"])
+            except Exception:
+                log.warning("AUDIO: could not finalize %s at shutdown", sid, exc_info=True)
+                a = self._sessions.pop(sid, None)
+                if a is not None:
+                    await a.abort()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": AUDIO_ASSEMBLY,
+            "open": len(self._sessions),
+            "pendingBytes": self.pending_bytes(),
+            "pendingMaxBytes": AUDIO_REORDER_MAX_TOTAL_BYTES,
+            "finalized": self.finalized,
+            "expired": self.expired,
+        }
+
+
+assemblies = AssemblyRegistry(AUDIO_ASSEMBLY_IDLE_SECONDS)
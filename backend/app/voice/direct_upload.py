@@ -0,0 +1,179 @@
+# backend/app/voice/direct_upload.py
+# Kiosk -> S3 uploads that never pass through the worker: the API hands out presigned
+# PUT (small clips) or presigned upload_part URLs (multipart), the kiosk sends the bytes
+# to storage itself, then calls back so the object can be checked and recorded.
+# Every URL is SigV4-signed over Content-Length, so storage rejects a body of any other
+# size than the one declared. Multipart uploads the kiosk never completes or aborts keep
+# their parts (and are billed) until removed: give the bucket a lifecycle rule such as
+#   {"ID": "abort-stale-mpu", "Status": "Enabled", "Filter": {},
+#    "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 1}}
+import os
+import json
+import math
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.voice import wav
+from app.voice.streaming import AUDIO_PART_SIZE, S3_MIN_PART, VOICE_MAX_UPLOAD_BYTES
+
+log = logging.getLogger("clinic-os.voice.direct")
+
+# ---------- ENV ----------
+DIRECT_UPLOAD_EXPIRES = int(os.getenv("DIRECT_UPLOAD_EXPIRES", "900"))   # seconds a presigned URL stays valid
+S3_MAX_PARTS = 10000
+HEADER_PROBE_BYTES = 4096
+
+
+class DirectUploadError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def segment_key(session_id: str, seq: Optional[int]) -> str:
+    """Same layout as /audio-upload, so /audio-stitch picks direct uploads up unchanged."""
+    return f"audio/{session_id}/seg_{int(seq):04d}.wav" if seq is not None else f"{session_id}.wav"
+
+
+def meta_key(key: str) -> str:
+    # kept outside the seg_ prefix that stitching lists
+    head, _, name = key.rpartition("/")
+    return f"{head + '/' if head else ''}meta/{name.rsplit('.', 1)[0]}.json"
+
+
+def plan(s3, bucket: str, key: str, size: int, content_type: str = "audio/wav",
+         expires: int = DIRECT_UPLOAD_EXPIRES) -> Dict[str, Any]:
+    """
+    Presigned PUT for bodies up to one part, else a multipart upload with one URL per part.
+    Each URL only accepts exactly its declared number of bytes (signed Content-Length).
+    """
+    if size < 1:
+        raise DirectUploadError(400, "size must be at least 1 byte")
+    if size > VOICE_MAX_UPLOAD_BYTES:
+        raise DirectUploadError(413, f"Audio exceeds {VOICE_MAX_UPLOAD_BYTES} bytes")
+    if size <= AUDIO_PART_SIZE:
+        url = s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": bucket, "Key": key, "ContentType": content_type, "ContentLength": size},
+            ExpiresIn=expires,
+        )
+        return {
+            "mode": "put", "key": key, "url": url, "size": size,
+            "headers": {"Content-Type": content_type, "Content-Length": str(size)}, "expiresIn": expires,
+        }
+
+    part_size = max(AUDIO_PART_SIZE, S3_MIN_PART, math.ceil(size / S3_MAX_PARTS))
+    count = math.ceil(size / part_size)
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type, ACL="private")["UploadId"]
+    parts = []
+    for n in range(1, count + 1):
+        length = min(part_size, size - (n - 1) * part_size)
+        parts.append({
+            "partNumber": n,
+            "size": length,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n, "ContentLength": length},
+                ExpiresIn=expires,
+            ),
+        })
+    return {
+        "mode": "multipart", "key": key, "uploadId": upload_id, "size": size, "partSize": part_size,
+        "parts": parts, "expiresIn": expires,
+    }
+
+
+def _list_parts(s3, bucket: str, key: str, upload_id: str) -> List[Dict[str, Any]]:
+    parts: List[Dict[str, Any]] = []
+    marker = 0
+    while True:
+        resp = s3.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        parts.extend(resp.get("Parts", []) or [])
+        if not resp.get("IsTruncated"):
+            return parts
+        marker = resp["NextPartNumberMarker"]
+
+
+def _complete_multipart(s3, bucket: str, key: str, upload_id: str, claimed: Optional[List[Dict[str, Any]]]):
+    try:
+        stored = _list_parts(s3, bucket, key, upload_id)
+    except s3.exceptions.NoSuchUpload:
+        raise DirectUploadError(404, "Unknown or already completed uploadId")
+    if not stored:
+        raise DirectUploadError(400, "No parts uploaded")
+    stored.sort(key=lambda p: p["PartNumber"])
+    numbers = [p["PartNumber"] for p in stored]
+    if numbers != list(range(1, len(numbers) + 1)):
+        missing = sorted(set(range(1, numbers[-1] + 1)) - set(numbers))
+        raise DirectUploadError(400, f"Missing parts {missing}")
+    if claimed is not None:
+        # the kiosk's ETags must match what storage actually holds
+        want = {int(p["partNumber"]): str(p["etag"]).strip('"') for p in claimed}
+        have = {p["PartNumber"]: p["ETag"].strip('"') for p in stored}
+        if want != have:
+            bad = sorted(n for n in set(want) | set(have) if want.get(n) != have.get(n))
+            raise DirectUploadError(400, f"Part mismatch for parts {bad}")
+    s3.complete_multipart_upload(
+        Bucket=bucket, Key=key, UploadId=upload_id,
+        MultipartUpload={"Parts": [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in stored]},
+    )
+
+
+def complete(s3, bucket: str, key: str, upload_id: Optional[str] = None,
+             parts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Finish a multipart upload (when `upload_id` is given), then check the object: it must
+    exist, fit the size cap and start with a readable WAV header. Bad objects are deleted.
+    Writes a small JSON record next to the segment and returns it.
+    """
+    if upload_id:
+        try:
+            _complete_multipart(s3, bucket, key, upload_id, parts)
+        except DirectUploadError as e:
+            if e.status != 404:
+                raise
+            # retried after a completion whose response was lost: verify the object as it stands
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except s3.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise DirectUploadError(404, "Object not found; upload it before completing")
+        raise
+    size = int(head["ContentLength"])
+    if size > VOICE_MAX_UPLOAD_BYTES:
+        s3.delete_object(Bucket=bucket, Key=key)
+        raise DirectUploadError(413, f"Audio exceeds {VOICE_MAX_UPLOAD_BYTES} bytes")
+    probe = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER_PROBE_BYTES - 1}")["Body"].read()
+    try:
+        info = wav.parse(probe, key)
+    except wav.WavError as e:
+        log.warning("AUDIO: rejecting direct upload %s: %s", key, e)
+        s3.delete_object(Bucket=bucket, Key=key)
+        raise DirectUploadError(422, str(e))
+
+    data_size = size - info.data_offset
+    meta = {
+        "key": key,
+        "bytes": size,
+        "etag": head.get("ETag", "").strip('"'),
+        "mode": "multipart" if upload_id else "put",
+        "sampleRate": info.sample_rate,
+        "channels": info.channels,
+        "bitsPerSample": info.bits_per_sample,
+        "durationSeconds": round(data_size / info.byte_rate, 3) if info.byte_rate else None,
+        "uploadedAt": int(time.time()),
+    }
+    s3.put_object(
+        Bucket=bucket, Key=meta_key(key), Body=json.dumps(meta).encode(),
+        ContentType="application/json", ACL="private",
+    )
+    return meta
+
+
+def abort(s3, bucket: str, key: str, upload_id: str):
+    try:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+    except s3.exceptions.NoSuchUpload:
+        raise DirectUploadError(404, "Unknown or already completed uploadId")
@@ -0,0 +1,219 @@
+# backend/app/voice/preprocess.py
+# Pre-STT audio conditioning: decode WAV -> mono float32 (in chunks), trim leading/trailing
+# silence by frame energy, resample down to 16 kHz, re-encode as 16-bit PCM. Whisper resamples to 16 kHz
+# mono internally, so this only removes bytes the upstream would have discarded anyway.
+import os
+import math
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from app.voice import wav
+
+try:
+    import numpy as np  # optional; preprocessing is skipped without it
+except ImportError:  # pragma: no cover
+    np = None
+
+log = logging.getLogger("clinic-os.voice.preprocess")
+
+# ---------- ENV ----------
+STT_PREPROCESS = (os.getenv("STT_PREPROCESS", "true").strip().lower() != "false")
+PREPROCESS_TARGET_RATE = int(os.getenv("PREPROCESS_TARGET_RATE", "16000"))
+PREPROCESS_FRAME_MS = int(os.getenv("PREPROCESS_FRAME_MS", "20"))
+PREPROCESS_SILENCE_DBFS = float(os.getenv("PREPROCESS_SILENCE_DBFS", "-45"))   # absolute floor
+PREPROCESS_RELATIVE_DB = float(os.getenv("PREPROCESS_RELATIVE_DB", "-35"))     # below loudest frame
+PREPROCESS_PAD_MS = int(os.getenv("PREPROCESS_PAD_MS", "250"))
+PREPROCESS_CHUNK_FRAMES = int(os.getenv("PREPROCESS_CHUNK_FRAMES", "65536"))   # decoded per step
+PREPROCESS_CONCURRENCY = int(os.getenv("PREPROCESS_CONCURRENCY", str(os.cpu_count() or 2)))
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class _Stats:
+    def __init__(self):
+        self.clips = 0
+        self.silent = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.ms = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": STT_PREPROCESS and available(),
+            "concurrency": PREPROCESS_CONCURRENCY,
+            "clips": self.clips,
+            "silent": self.silent,
+            "skipped": self.skipped,
+            "bytesIn": self.bytes_in,
+            "bytesOut": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "avgMs": round(self.ms / self.clips, 2) if self.clips else 0.0,
+        }
+
+
+preprocess_stats = _Stats()
+# bounds how many clips are decoded at once (each holds its input plus ~1/3 of it in float32)
+preprocess_slots = asyncio.Semaphore(max(1, PREPROCESS_CONCURRENCY))
+
+
+def available() -> bool:
+    return np is not None
+
+
+_DECODABLE = {(WAVE_FORMAT_PCM, 8), (WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 24),
+              (WAVE_FORMAT_PCM, 32), (WAVE_FORMAT_FLOAT, 32)}
+
+
+def _encoding(info: wav.WavInfo) -> Tuple[int, int]:
+    fmt = info.audio_format
+    if fmt == WAVE_FORMAT_EXTENSIBLE and len(info.fmt_chunk) >= 26:
+        fmt = int.from_bytes(info.fmt_chunk[24:26], "little")  # SubFormat GUID starts with the format tag
+    if (fmt, info.bits_per_sample) not in _DECODABLE:
+        raise wav.WavError(f"unsupported WAV encoding (format {fmt}, {info.bits_per_sample} bit)")
+    bits = info.bits_per_sample
+    if bits % 8 or info.block_align != info.channels * bits // 8:
+        # frames would be sliced on the header's word and decoded on the format's
+        raise wav.WavError(
+            f"inconsistent WAV header (block align {info.block_align} for {info.channels}ch/{bits}bit)"
+        )
+    return fmt, bits
+
+
+def _decode(raw, fmt: int, bits: int):
+    """One chunk of interleaved samples as float32 in [-1, 1]."""
+    if fmt == WAVE_FORMAT_FLOAT:
+        return np.frombuffer(raw, dtype="<f4").astype(np.float32)
+    if bits == 16:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32)
+        x *= 1.0 / 32768
+    elif bits == 8:
+        x = np.frombuffer(raw, dtype=np.uint8).astype(np.float32)
+        x -= 128.0
+        x *= 1.0 / 128
+    elif bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        x = np.where(v >= 1 << 23, v - (1 << 24), v).astype(np.float32)
+        x *= 1.0 / (1 << 23)
+    else:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32)
+        x *= 1.0 / (1 << 31)
+    return x
+
+
+def _decimated_mono(buf, info: wav.WavInfo, step: int):
+    """
+    Decode, downmix and average every `step` frames, PREPROCESS_CHUNK_FRAMES at a time, so
+    only the (smaller) decimated float32 signal is ever held whole.
+    """
+    fmt, bits = _encoding(info)
+    align, ch = info.block_align, info.channels
+    frames = info.data_size // align
+    out = np.empty(frames // step, dtype=np.float32)
+    chunk = max(1, PREPROCESS_CHUNK_FRAMES // step) * step
+    raw = memoryview(buf)[info.data_offset:info.data_offset + frames * align]
+    pos = 0
+    for f0 in range(0, frames - frames % step, chunk):
+        n = min(chunk, frames - f0) // step * step
+        x = _decode(raw[f0 * align:(f0 + n) * align], fmt, bits)
+        if ch > 1 or step > 1:
+            # box filter over one output period doubles as a (crude) anti-alias before decimating
+            x = x.reshape(-1, ch * step).mean(axis=1, dtype=np.float32)
+        out[pos:pos + len(x)] = x
+        pos += len(x)
+    return out
+
+
+def _trim_bounds(mono, rate: float) -> Tuple[int, int]:
+    """[start, end) sample range holding speech (frame RMS above the threshold), padded."""
+    frame = max(1, int(rate * PREPROCESS_FRAME_MS / 1000))
+    n = len(mono) // frame
+    if n == 0:
+        return 0, len(mono)
+    f = mono[: n * frame].reshape(n, frame)
+    ms = np.einsum("ij,ij->i", f, f) / frame
+    db = 10 * np.log10(np.maximum(ms, 1e-20))
+    thresh = max(PREPROCESS_SILENCE_DBFS, float(db.max()) + PREPROCESS_RELATIVE_DB)
+    voiced = np.flatnonzero(db > thresh)
+    if voiced.size == 0:
+        return 0, 0
+    pad = int(rate * PREPROCESS_PAD_MS / 1000)
+    return max(0, int(voiced[0]) * frame - pad), min(len(mono), (int(voiced[-1]) + 1) * frame + pad)
+
+
+def _encode(mono, up: int, down: int, info: wav.WavInfo) -> bytearray:
+    """
+    WAV bytes for `mono` resampled by up/down (linear interpolation at exact rational
+    positions; up == down copies), quantised to 16 bit straight into the output buffer.
+    """
+    n = len(mono)
+    n_out = n if up == down else (n - 1) * up // down + 1
+    size = wav.header_size(info)
+    out = bytearray(size + n_out * 2)
+    out[:size] = wav.header(info, n_out * 2)
+    pcm = np.frombuffer(out, dtype="<i2", offset=size)
+    for j0 in range(0, n_out, PREPROCESS_CHUNK_FRAMES):
+        j1 = min(n_out, j0 + PREPROCESS_CHUNK_FRAMES)
+        if up == down:
+            y = mono[j0:j1].copy()
+        else:
+            num = np.arange(j0, j1, dtype=np.int64) * down
+            i = num // up
+            frac = (num - i * up).astype(np.float32)
+            frac *= 1.0 / up
+            y = mono[i]
+            y += (mono[np.minimum(i + 1, n - 1)] - y) * frac
+        np.clip(y, -1.0, 1.0, out=y)
+        y *= 32767.0
+        pcm[j0:j1] = y
+    return out
+
+
+def preprocess(buf, target_rate: int = PREPROCESS_TARGET_RATE) -> Tuple[Optional[bytearray], Dict[str, Any]]:
+    """
+    Returns (wav_bytes, report). wav_bytes is None when the clip holds no speech
+    (the caller can skip STT). Raises wav.WavError for input it cannot decode.
+    Clips below `target_rate` keep their own rate (never upsampled).
+    """
+    t0 = time.perf_counter()
+    info = wav.parse(buf, "upload")
+    rate_in = info.sample_rate
+    rate_out = min(rate_in, target_rate)
+    step = max(1, rate_in // rate_out)                      # integer decimation first...
+    g = math.gcd(rate_in, step * rate_out)
+    up, down = step * rate_out // g, rate_in // g           # ...then the remaining rational step
+    mono = _decimated_mono(buf, info, step)
+    start, end = _trim_bounds(mono, rate_in / step)
+    seconds_in = len(mono) * step / rate_in
+    out_info = wav.pcm_info(rate_out, 1, 16)
+    data: Optional[bytearray] = None
+    if end > start:
+        data = _encode(mono[start:end], up, down, out_info)
+    del mono
+    bytes_out = len(data) if data else 0
+    samples_out = (bytes_out - wav.header_size(out_info)) // 2 if data else 0
+    ms = (time.perf_counter() - t0) * 1000
+    report: Dict[str, Any] = {
+        "bytesIn": len(buf),
+        "secondsIn": round(seconds_in, 3),
+        "secondsOut": round(samples_out / rate_out, 3),
+        "rateIn": rate_in,
+        "rateOut": rate_out,
+        "channelsIn": info.channels,
+        "bytesOut": bytes_out,
+        "speech": data is not None,
+        "ms": round(ms, 2),
+    }
+
+    st = preprocess_stats
+    st.clips += 1
+    st.silent += data is None
+    st.bytes_in += len(buf)
+    st.bytes_out += bytes_out
+    st.ms += ms
+    return data, report
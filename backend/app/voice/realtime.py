@@ -0,0 +1,275 @@
+# backend/app/voice/realtime.py
+# Streaming transcription over a WebSocket: the kiosk sends raw PCM (s16le) frames while
+# the patient speaks, the stream is cut into utterances on silence, and each utterance is
+# transcribed as soon as it ends (several may be in flight). Results are pushed back as
+# they arrive, so the transcript is ready moments after the patient stops talking.
+#
+# Protocol (ws /api/transcribe-stream?lang=hi&sample_rate=16000&channels=1):
+#   client -> binary frames of interleaved 16-bit little-endian PCM, any size
+#   client -> {"type": "end"}  (text) when recording stops; closing the socket discards results
+#   server -> {"type": "ready", ...}
+#   server -> {"type": "partial", "segment": i, "text": ..., "start": s, "end": s, "transcript": ...}
+#   server -> {"type": "error", "segment": i, "detail": ...}   (that segment is skipped)
+#   server -> {"type": "final", "transcript": ..., "segments": n, "audioSeconds": s}
+# "transcript" is always the in-order text of every segment finished so far.
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from array import array
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.voice import wav
+from app.voice.stt import SttError
+
+try:
+    import numpy as np  # optional; frame energy falls back to array/math
+except ImportError:  # pragma: no cover
+    np = None
+
+log = logging.getLogger("clinic-os.voice.realtime")
+
+# ---------- ENV ----------
+STREAM_FRAME_MS = int(os.getenv("STREAM_FRAME_MS", "20"))
+STREAM_SILENCE_DBFS = float(os.getenv("STREAM_SILENCE_DBFS", "-40"))        # frames below are silence
+STREAM_SILENCE_MS = int(os.getenv("STREAM_SILENCE_MS", "600"))              # pause that ends an utterance
+STREAM_PAD_MS = int(os.getenv("STREAM_PAD_MS", "200"))                      # kept around each utterance
+STREAM_MIN_SPEECH_MS = int(os.getenv("STREAM_MIN_SPEECH_MS", "200"))        # shorter blips are dropped
+STREAM_MAX_UTTERANCE_SECONDS = float(os.getenv("STREAM_MAX_UTTERANCE_SECONDS", "15"))
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))          # per connection
+STREAM_MAX_INFLIGHT = int(os.getenv("STREAM_MAX_INFLIGHT", "4"))            # segments in flight per connection
+
+
+def frame_dbfs(pcm: bytes) -> float:
+    """RMS level of 16-bit PCM in dBFS (all channels pooled)."""
+    if np is not None:
+        x = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+        ms = float(np.mean(x * x)) if x.size else 0.0
+    else:
+        a = array("h")
+        a.frombytes(pcm)
+        ms = sum(v * v for v in a) / len(a) if a else 0.0
+    return 20 * math.log10(max(math.sqrt(ms) / 32768.0, 1e-10))
+
+
+class Utterance(NamedTuple):
+    pcm: bytes
+    start: float   # seconds from stream start
+    end: float
+
+
+class Segmenter:
+    """
+    Energy-based utterance cutter. An utterance opens on the first voiced frame (with
+    STREAM_PAD_MS of lead-in), closes after STREAM_SILENCE_MS of silence (keeping
+    STREAM_PAD_MS of tail) or at STREAM_MAX_UTTERANCE_SECONDS.
+    """
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.frame_bytes = max(1, sample_rate * STREAM_FRAME_MS // 1000) * channels * 2
+        self.bytes_per_second = sample_rate * channels * 2
+        self.block_align = channels * 2
+        self.pad_frames = STREAM_PAD_MS // STREAM_FRAME_MS
+        self.end_frames = max(1, STREAM_SILENCE_MS // STREAM_FRAME_MS)
+        self.min_voiced = STREAM_MIN_SPEECH_MS // STREAM_FRAME_MS
+        self.max_frames = int(STREAM_MAX_UTTERANCE_SECONDS * 1000 // STREAM_FRAME_MS)
+        self._carry = bytearray()
+        self._preroll: deque = deque(maxlen=self.pad_frames or 1)
+        self._frames: List[bytes] = []
+        self._start = 0          # frame index where the open utterance starts
+        self._voiced = 0
+        self._silent_run = 0
+        self.position = 0        # frames consumed
+        self.received = 0        # bytes fed
+
+    @property
+    def seconds(self) -> float:
+        return self.received / self.bytes_per_second
+
+    def feed(self, pcm: bytes) -> List[Utterance]:
+        self.received += len(pcm)
+        self._carry += pcm
+        out: List[Utterance] = []
+        fb = self.frame_bytes
+        n = len(self._carry) // fb
+        for i in range(n):
+            u = self._frame(bytes(self._carry[i * fb:(i + 1) * fb]))
+            if u is not None:
+                out.append(u)
+        del self._carry[: n * fb]
+        return out
+
+    def _frame(self, frame: bytes) -> Optional[Utterance]:
+        voiced = frame_dbfs(frame) > STREAM_SILENCE_DBFS
+        self.position += 1
+        if not self._frames:
+            if not voiced:
+                if self.pad_frames:
+                    self._preroll.append(frame)
+                return None
+            self._frames = list(self._preroll) + [frame]
+            self._preroll.clear()
+            self._start = self.position - len(self._frames)
+            self._voiced, self._silent_run = 1, 0
+            return None
+        self._frames.append(frame)
+        if voiced:
+            self._voiced += 1
+            self._silent_run = 0
+        else:
+            self._silent_run += 1
+        if self._silent_run >= self.end_frames or len(self._frames) >= self.max_frames:
+            return self._cut()
+        return None
+
+    def _cut(self) -> Optional[Utterance]:
+        frames, voiced = self._frames, self._voiced
+        drop = max(0, self._silent_run - self.pad_frames)  # trailing silence past the pad
+        if drop:
+            frames = frames[:-drop]
+        start = self._start
+        self._frames, self._voiced, self._silent_run = [], 0, 0
+        if voiced < self.min_voiced:
+            return None
+        spf = self.frame_bytes / self.bytes_per_second
+        return Utterance(b"".join(frames), round(start * spf, 3), round((start + len(frames)) * spf, 3))
+
+    def flush(self) -> Optional[Utterance]:
+        whole = len(self._carry) - len(self._carry) % self.block_align
+        if whole and self._frames:
+            self._frames.append(bytes(self._carry[:whole]))
+        self._carry = bytearray()
+        return self._cut() if self._frames else None
+
+
+class _Stats:
+    def __init__(self):
+        self.sessions = 0
+        self.active = 0
+        self.segments = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+        self.final_lag = 0.0   # seconds from "end" to the final message, summed
+        self.finals = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "active": self.active,
+            "segments": self.segments,
+            "errors": self.errors,
+            "audioSeconds": round(self.audio_seconds, 1),
+            "avgFinalLagMs": round(self.final_lag / self.finals * 1000, 1) if self.finals else 0.0,
+        }
+
+
+stream_stats = _Stats()
+
+
+class StreamSession:
+    """One WebSocket connection: segmenter + concurrent per-utterance STT + ordered results."""
+
+    def __init__(self, ws: WebSocket, stt, lang: Optional[str], sample_rate: int, channels: int):
+        self.ws = ws
+        self.stt = stt
+        self.lang = lang
+        self.info = wav.pcm_info(sample_rate, channels, 16)
+        self.segmenter = Segmenter(sample_rate, channels)
+        self.texts: List[Optional[str]] = []
+        self.tasks: List[asyncio.Task] = []
+        self._sem = asyncio.Semaphore(max(1, STREAM_MAX_INFLIGHT))
+        self._send_lock = asyncio.Lock()
+
+    async def _send(self, msg: Dict[str, Any]):
+        async with self._send_lock:
+            await self.ws.send_text(json.dumps(msg, ensure_ascii=False))
+
+    def transcript(self) -> str:
+        done = []
+        for t in self.texts:
+            if t is None:
+                break
+            if t:
+                done.append(t)
+        return " ".join(done)
+
+    def _submit(self, u: Utterance):
+        i = len(self.texts)
+        self.texts.append(None)
+        self.tasks.append(asyncio.create_task(self._transcribe(i, u)))
+
+    async def _transcribe(self, i: int, u: Utterance):
+        stream_stats.segments += 1
+        body = wav.header(self.info, len(u.pcm)) + u.pcm
+        try:
+            async with self._sem:
+                text = await self.stt.transcribe(body, f"utt_{i:04d}.wav", "audio/wav", self.lang)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stream_stats.errors += 1
+            self.texts[i] = ""
+            log.warning("STREAM: segment %d failed: %r", i, e)
+            detail = f"STT error {e.status}" if isinstance(e, SttError) else "STT unavailable"
+            await self._send({"type": "error", "segment": i, "detail": detail})
+            return
+        self.texts[i] = text
+        await self._send({
+            "type": "partial", "segment": i, "text": text,
+            "start": u.start, "end": u.end, "transcript": self.transcript(),
+        })
+
+    async def run(self):
+        await self.ws.accept()
+        stream_stats.sessions += 1
+        stream_stats.active += 1
+        ended = False
+        try:
+            await self._send({
+                "type": "ready", "sampleRate": self.info.sample_rate, "channels": self.info.channels,
+                "silenceMs": STREAM_SILENCE_MS,
+            })
+            while True:
+                msg = await self.ws.receive()
+                if msg["type"] == "websocket.disconnect":
+                    break
+                if msg.get("bytes"):
+                    for u in self.segmenter.feed(msg["bytes"]):
+                        self._submit(u)
+                    if self.segmenter.seconds > STREAM_MAX_SECONDS:
+                        await self._send({"type": "error", "detail": f"Stream exceeds {STREAM_MAX_SECONDS:g}s"})
+                        await self.ws.close(code=1009)
+                        break
+                elif msg.get("text"):
+                    try:
+                        ctl = json.loads(msg["text"])
+                    except ValueError:
+                        ctl = {}
+                    if isinstance(ctl, dict) and ctl.get("type") == "end":
+                        ended = True
+                        break
+            if ended:
+                t0 = time.perf_counter()
+                u = self.segmenter.flush()
+                if u is not None:
+                    self._submit(u)
+                await asyncio.gather(*self.tasks)
+                await self._send({
+                    "type": "final", "transcript": self.transcript(), "segments": len(self.texts),
+                    "audioSeconds": round(self.segmenter.seconds, 3),
+                })
+                stream_stats.final_lag += time.perf_counter() - t0
+                stream_stats.finals += 1
+                await self.ws.close()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for t in self.tasks:
+                t.cancel()  # client went away: stop paying for upstream calls
+            stream_stats.active -= 1
+            stream_stats.audio_seconds += self.segmenter.seconds
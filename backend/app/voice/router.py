@@ -1,13 +1,25 @@
 # backend/app/voice/router.py
 import os
-import tempfile
-import subprocess
+import asyncio
 import logging
-from typing import Optional
+from typing import List, Optional
 
+import aiohttp
 import boto3
-import requests
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from botocore.config import Config
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from pydantic import BaseModel, Field
+
+from app.voice.stt import stt_client, SttError
+from app.voice.transcript_cache import transcript_cache, cache_key, sha256_hex, TRANSCRIPT_CACHE_MAX_AUDIO
+from app.voice import wav
+from app.voice.preprocess import preprocess as preprocess_wav, preprocess_stats, preprocess_slots, available as preprocess_available, STT_PREPROCESS
+from app.voice.realtime import StreamSession
+from app.voice.assembly import assemblies, AssemblyError, AUDIO_ASSEMBLY
+from app.voice.stitch import list_keys, stitch
+from app.voice import direct_upload
+from app.voice.direct_upload import DirectUploadError, segment_key
+from app.voice.streaming import UploadStream, S3StreamUpload, multipart_file_body
 
 log = logging.getLogger("clinic-os.voice")
 router = APIRouter()
@@ -16,6 +28,7 @@ router = APIRouter()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 AWS_REGION = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION", "us-west-2")
 AUDIO_BUCKET_NAME = os.getenv("AUDIO_BUCKET_NAME", "medmitra-audio-bucket")
+S3_ENDPOINT_URL = (os.getenv("S3_ENDPOINT_URL") or "").strip() or None   # local stand-in (moto/minio)
 
 # ---------- AWS S3 ----------
 s3_client = boto3.client(
@@ -23,6 +36,8 @@ s3_client = boto3.client(
     region_name=AWS_REGION,
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    endpoint_url=S3_ENDPOINT_URL,
+    config=Config(signature_version="s3v4"),   # presigned uploads sign Content-Length
 )
 
 def presign_s3(key: str, expires: int = 3600) -> Optional[str]:
@@ -40,127 +55,278 @@ def presign_s3(key: str, expires: int = 3600) -> Optional[str]:
 # =========================================================
 # 1) TRANSCRIBE (Whisper: /v1/audio/transcriptions)
 # =========================================================
-@router.post("/transcribe-audio")
-async def transcribe_audio(file: UploadFile = File(...), lang: Optional[str] = Query(None)):
+async def _stt(audio, filename: str, content_type: str, lang: Optional[str]) -> str:
+    try:
+        return await stt_client.transcribe(audio, filename, content_type, lang)
+    except SttError as e:
+        log.error("Whisper error %s: %s", e.status, e.body[:500])
+        raise HTTPException(status_code=500, detail=f"Whisper API error: {e.body}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if isinstance(e.__cause__, HTTPException):
+            raise e.__cause__  # e.g. 413 raised while the body was streaming out
+        log.exception("Whisper request failed")
+        raise HTTPException(status_code=502, detail=f"Whisper API unreachable: {e!r}")
+
+
+@router.post("/transcribe-audio", openapi_extra=multipart_file_body("file"))
+async def transcribe_audio(
+    request: Request,
+    lang: Optional[str] = Query(None),
+    preprocess: bool = Query(True, description="Trim silence and downsample to 16 kHz mono before STT"),
+):
     """
     POST /api/transcribe-audio  (mounted with prefix in main.py)
-    Form: file=<audio/wav>, optional ?lang=hi|en|bn|...
+    Form: file=<audio/wav> (or a raw audio/* body), optional ?lang=hi|en|bn|...&preprocess=false
+    WAV clips up to TRANSCRIPT_CACHE_MAX_AUDIO are trimmed of leading/trailing silence and
+    sent as 16 kHz mono (see preprocess.py), and answered from the transcript cache
+    (sha256 of the original audio + lang) when possible; larger ones stream through to STT_URL.
     """
-    if not OPENAI_API_KEY:
+    if stt_client.needs_api_key and not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="Missing OPENAI_API_KEY")
-    log.info("STT: received %s (%s), lang=%s", file.filename, file.content_type, lang)
+    upload = await UploadStream(request, "file").open()
+    log.info("STT: received %s (%s), lang=%s", upload.filename, upload.content_type, lang)
 
-    # persist to a temp file
-    suffix = os.path.splitext(file.filename or "")[1].lower() or ".wav"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
+    suffix = os.path.splitext(upload.filename or "")[1].lower() or ".wav"
+    filename, ctype = f"audio{suffix}", upload.content_type or "audio/wav"
+    use_pp = preprocess and STT_PREPROCESS and preprocess_available()
 
-    try:
-        url = "https://api.openai.com/v1/audio/transcriptions"
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
-
-        with open(tmp_path, "rb") as fh:
-            files = {
-                "file": (os.path.basename(tmp_path), fh, file.content_type or "audio/wav"),
-                "model": (None, "whisper-1"),
-                "temperature": (None, "0"),
-            }
-            if lang:
-                files["language"] = (None, lang)
-
-            resp = requests.post(url, headers=headers, files=files, timeout=60)
-
-        if resp.status_code != 200:
-            log.error("Whisper error %s: %s", resp.status_code, resp.text[:500])
-            raise HTTPException(status_code=500, detail=f"Whisper API error: {resp.text}")
-
-        data = resp.json()
-        text = (data.get("text") or "").strip()
-        log.info("STT: %d chars", len(text))
-        return {"transcript": text}
-
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+    # read up to the cache limit; past it, switch to streaming the rest
+    chunks = upload.__aiter__()
+    head = bytearray()
+    complete = True
+    if transcript_cache.enabled or use_pp:
+        async for chunk in chunks:
+            head += chunk
+            if len(head) > TRANSCRIPT_CACHE_MAX_AUDIO:
+                complete = False
+                break
+    else:
+        complete = False
+
+    pp_report: Optional[dict] = None
+    if complete:
+        data = memoryview(head)  # hashed, preprocessed and sent as is: no copy of the upload
+
+        async def compute() -> str:
+            nonlocal pp_report
+            audio, name, kind = data, filename, ctype
+            if use_pp:
+                try:
+                    async with preprocess_slots:
+                        audio, pp_report = await asyncio.to_thread(preprocess_wav, data)
+                except wav.WavError as e:
+                    # not a WAV we can decode (e.g. webm): send it as recorded
+                    preprocess_stats.skipped += 1
+                    pp_report = {"applied": False, "reason": str(e)}
+                    audio = data
+                else:
+                    pp_report["applied"] = True
+                    if audio is None:
+                        return ""  # no speech: skip the upstream call
+                    name, kind = "audio.wav", "audio/wav"
+            return await _stt(audio, name, kind, lang)
+
+        variant = stt_client.model + (":pp" if use_pp else "")
+        key = cache_key(sha256_hex(data), lang, variant)
+        if transcript_cache.enabled:
+            text, source = await transcript_cache.get_or_compute(key, compute)
+        else:
+            text, source = await compute(), "bypass"
+    else:
+        async def rest():
+            if head:
+                yield bytes(head)
+            async for c in chunks:
+                yield c
+
+        text, source = await _stt(rest(), filename, ctype, lang), "bypass"
+
+    log.info("STT: %d chars (%d bytes, cache=%s, preprocess=%s)", len(text), upload.size, source,
+             pp_report and pp_report.get("bytesOut"))
+    return {"transcript": text, "cache": source, "preprocess": pp_report}
+
+
+@router.websocket("/transcribe-stream")
+async def transcribe_stream(
+    websocket: WebSocket,
+    lang: Optional[str] = Query(None),
+    sample_rate: int = Query(16000, ge=8000, le=48000),
+    channels: int = Query(1, ge=1, le=2),
+):
+    """
+    WS /api/transcribe-stream?lang=hi&sample_rate=16000&channels=1
+    Binary s16le PCM frames in, partial/final transcript JSON out (protocol in realtime.py).
+    """
+    if stt_client.needs_api_key and not OPENAI_API_KEY:
+        await websocket.close(code=1011, reason="Missing OPENAI_API_KEY")
+        return
+    await StreamSession(websocket, stt_client, lang, sample_rate, channels).run()
 
 
 # =========================================================
 # 2) AUDIO UPLOAD (optional archival)
 # =========================================================
-@router.post("/audio-upload")
+@router.post("/audio-upload", openapi_extra=multipart_file_body("audio"))
 async def upload_audio_chunk(
+    request: Request,
     session_id: str = Query(..., min_length=8),
-    audio: UploadFile = File(...),
     seq: Optional[int] = Query(None),
 ):
     """
     POST /api/audio-upload?session_id=...&seq=N
     Stores chunk at audio/<session_id>/seg_N.wav or <session_id>.wav (no seq).
+    The body is streamed to S3 (multipart above AUDIO_PART_SIZE). With
+    AUDIO_ASSEMBLY=incremental, seq chunks are appended to <session_id>.wav instead.
     """
+    upload = await UploadStream(request, "audio").open()
+    if AUDIO_ASSEMBLY == "incremental" and seq is not None:
+        # append to the session's open multipart upload; no per-segment object
+        body = bytearray()
+        async for chunk in upload:
+            body += chunk
+        try:
+            status = await assemblies.add(s3_client, AUDIO_BUCKET_NAME, session_id, int(seq), memoryview(body))
+        except AssemblyError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            raise HTTPException(status_code=e.status, detail=e.detail, headers=headers)
+        except Exception as e:
+            log.exception("audio append failed: %s", e)
+            raise HTTPException(status_code=500, detail=f"Error saving audio: {e}")
+        return {"audio_url": None, "assembly": status}
+
+    key = segment_key(session_id, seq)
+    dest = S3StreamUpload(s3_client, AUDIO_BUCKET_NAME, key, "audio/wav")
     try:
-        data = await audio.read()
-        key = f"audio/{session_id}/seg_{int(seq):04d}.wav" if seq is not None else f"{session_id}.wav"
-        s3_client.put_object(
-            Bucket=AUDIO_BUCKET_NAME,
-            Key=key,
-            Body=data,
-            ContentType="audio/wav",
-            ACL="private",
-        )
-        url = presign_s3(key)
-        log.info("AUDIO: saved %s", key)
-        return {"audio_url": url}
+        async for chunk in upload:
+            await dest.write(chunk)
+        await dest.complete()
+    except HTTPException:
+        await dest.abort()
+        raise
     except Exception as e:
+        await dest.abort()
         log.exception("audio upload failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Error saving audio: {e}")
+    url = presign_s3(key)
+    log.info("AUDIO: saved %s (%d bytes)", key, dest.size)
+    return {"audio_url": url}
+
+
+# =========================================================
+# 2b) DIRECT UPLOAD (kiosk -> S3 via presigned URLs)
+# =========================================================
+class PartETag(BaseModel):
+    partNumber: int = Field(..., ge=1, le=direct_upload.S3_MAX_PARTS)
+    etag: str
+
+
+class CompleteUploadReq(BaseModel):
+    session_id: str = Field(..., min_length=8)
+    seq: Optional[int] = Field(None, ge=0)
+    uploadId: Optional[str] = None
+    parts: Optional[List[PartETag]] = None   # optional cross-check of the ETags the kiosk got back
+
+
+@router.post("/audio-upload-url")
+async def create_audio_upload_url(
+    session_id: str = Query(..., min_length=8),
+    seq: Optional[int] = Query(None, ge=0),
+    size: int = Query(..., ge=1, description="Exact body size (signed); above AUDIO_PART_SIZE a multipart upload is planned"),
+):
+    """
+    POST /api/audio-upload-url?session_id=...&seq=N&size=BYTES
+    Returns a presigned PUT (mode=put) or one presigned URL per part (mode=multipart) for
+    audio/<session_id>/seg_N.wav; each accepts exactly `size` (or its part's size) bytes.
+    Upload there, then call /audio-upload-complete.
+    """
+    key = segment_key(session_id, seq)
+    try:
+        return await asyncio.to_thread(direct_upload.plan, s3_client, AUDIO_BUCKET_NAME, key, size)
+    except DirectUploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    except Exception as e:
+        log.exception("presign upload failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"Could not prepare upload: {e}")
+
+
+@router.post("/audio-upload-complete")
+async def complete_audio_upload(body: CompleteUploadReq):
+    """
+    POST /api/audio-upload-complete
+    Completes the multipart upload (uploadId) after checking every part is present, then
+    verifies the object (size cap, WAV header) and records its metadata. Same response
+    shape as /audio-upload, plus the recorded metadata.
+    """
+    key = segment_key(body.session_id, body.seq)
+    parts = [p.dict() for p in body.parts] if body.parts is not None else None
+    try:
+        meta = await asyncio.to_thread(direct_upload.complete, s3_client, AUDIO_BUCKET_NAME, key, body.uploadId, parts)
+    except DirectUploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    except Exception as e:
+        log.exception("complete upload failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error completing upload: {e}")
+    log.info("AUDIO: direct upload %s (%d bytes, %s)", key, meta["bytes"], meta["mode"])
+    return {"audio_url": presign_s3(key), "metadata": meta}
+
+
+@router.post("/audio-upload-abort")
+async def abort_audio_upload(
+    session_id: str = Query(..., min_length=8),
+    uploadId: str = Query(...),
+    seq: Optional[int] = Query(None, ge=0),
+):
+    """POST /api/audio-upload-abort?session_id=...&seq=N&uploadId=... — drop an unfinished multipart upload."""
+    try:
+        await asyncio.to_thread(direct_upload.abort, s3_client, AUDIO_BUCKET_NAME, segment_key(session_id, seq), uploadId)
+    except DirectUploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    return {"ok": True}
 
 
 # =========================================================
 # 3) (Optional) STITCH: concat seg_* into one WAV
 # =========================================================
+@router.post("/audio-finalize")
+async def finalize_session_audio(session_id: str = Query(..., min_length=8)):
+    """
+    POST /api/audio-finalize?session_id=...
+    Incremental mode: write the WAV header part and complete <session_id>.wav.
+    """
+    try:
+        out = await assemblies.finalize(session_id)
+    except AssemblyError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    log.info("AUDIO: finalized %s (%d segments, %d bytes)", out["key"], out["segments"], out["bytes"])
+    return {
+        "audio_url": presign_s3(out["key"]),
+        "segments": out["segments"],
+        "durationSeconds": out["durationSeconds"],
+        "missingSeqs": out["missingSeqs"],
+    }
+
+
 @router.post("/audio-stitch")
-def stitch_session_audio(session_id: str = Query(..., min_length=8)):
+async def stitch_session_audio(session_id: str = Query(..., min_length=8)):
     """
     POST /api/audio-stitch?session_id=...
     Concatenate s3://<bucket>/audio/<session_id>/seg_*.wav into <session_id>.wav
-    Requires ffmpeg.
+    (in-process WAV concat; segments fetched in parallel, output uploaded as it is built).
     """
-    resp = s3_client.list_objects_v2(Bucket=AUDIO_BUCKET_NAME, Prefix=f"audio/{session_id}/seg_")
-    parts = sorted([o["Key"] for o in resp.get("Contents", [])]) if resp.get("Contents") else []
+    if assemblies.has(session_id):
+        # incremental mode already holds the audio; finishing it is O(1)
+        out = await finalize_session_audio(session_id)
+        return {k: out[k] for k in ("audio_url", "segments", "durationSeconds")}
+
+    parts = await asyncio.to_thread(list_keys, s3_client, AUDIO_BUCKET_NAME, f"audio/{session_id}/seg_")
     if not parts:
         raise HTTPException(status_code=404, detail="No segments found for this session")
 
-    with tempfile.TemporaryDirectory() as td:
-        list_txt = os.path.join(td, "concat.txt")
-        local_files = []
-        for k in parts:
-            local = os.path.join(td, os.path.basename(k))
-            body = s3_client.get_object(Bucket=AUDIO_BUCKET_NAME, Key=k)["Body"].read()
-            with open(local, "wb") as f:
-                f.write(body)
-            local_files.append(local)
-        with open(list_txt, "w") as f:
-            for p in local_files:
-                f.write(f"file '{p}'\n")
-
-        out_path = os.path.join(td, f"{session_id}.wav")
-        try:
-            subprocess.check_call(["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_txt, "-c", "copy", out_path])
-        except FileNotFoundError:
-            raise HTTPException(status_code=500, detail="ffmpeg not found on server")
-
-        with open(out_path, "rb") as fh:
-            final_key = f"{session_id}.wav"
-            s3_client.put_object(
-                Bucket=AUDIO_BUCKET_NAME,
-                Key=final_key,
-                Body=fh.read(),
-                ContentType="audio/wav",
-                ACL="private",
-            )
-
-    log.info("AUDIO: stitched %d segments -> %s", len(parts), final_key)
-    return {"audio_url": presign_s3(final_key), "segments": len(parts)}
+    final_key = f"{session_id}.wav"
+    try:
+        out = await asyncio.to_thread(stitch, s3_client, AUDIO_BUCKET_NAME, parts, final_key)
+    except wav.WavError as e:
+        raise HTTPException(status_code=422, detail=f"Cannot stitch segments: {e}")
+
+    log.info("AUDIO: stitched %d segments -> %s (%d bytes)", len(parts), final_key, out["bytes"])
+    return {"audio_url": presign_s3(final_key), "segments": len(parts), "durationSeconds": out["durationSeconds"]}
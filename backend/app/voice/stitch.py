@@ -0,0 +1,142 @@
+# backend/app/voice/stitch.py
+# Concatenate audio/<session_id>/seg_*.wav into one WAV in S3: segments are fetched
+# in parallel (bounded window, consumed in order) and the output is written as an S3
+# multipart upload while it is assembled. Part 1 (WAV header + first part of PCM) is
+# held back and uploaded last, once the total data size is known.
+import os
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.voice import wav
+from app.voice.streaming import AUDIO_PART_SIZE, S3_MIN_PART, stream_stats
+
+log = logging.getLogger("clinic-os.voice.stitch")
+
+STITCH_FETCH_CONCURRENCY = int(os.getenv("STITCH_FETCH_CONCURRENCY", "8"))
+
+
+def list_keys(s3, bucket: str, prefix: str) -> List[str]:
+    keys: List[str] = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(o["Key"] for o in page.get("Contents", []) or [])
+    return sorted(keys)
+
+
+def fetch_ordered(s3, bucket: str, keys: List[str], concurrency: int) -> Iterator[Tuple[str, bytes]]:
+    """Yield (key, body) in `keys` order with at most `concurrency` GETs in flight / buffered."""
+    def get(k: str) -> bytes:
+        return s3.get_object(Bucket=bucket, Key=k)["Body"].read()
+
+    with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="audio-fetch") as ex:
+        it = iter(keys)
+        window = deque()
+        for k in it:
+            window.append((k, ex.submit(get, k)))
+            if len(window) >= concurrency:
+                break
+        while window:
+            k, fut = window.popleft()
+            body = fut.result()
+            nxt = next(it, None)
+            if nxt is not None:
+                window.append((nxt, ex.submit(get, nxt)))
+            yield k, body
+
+
+class WavPartWriter:
+    """
+    Streams PCM into an S3 multipart upload. Bytes for part 1 (after the header) are
+    kept until finish(), when the header with the final sizes is prepended and part 1
+    goes up last; parts 2..n are uploaded as soon as they fill. Outputs smaller than
+    one part end up as a single put_object.
+    """
+
+    def __init__(self, s3, bucket: str, key: str, part_size: int = AUDIO_PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(S3_MIN_PART, part_size)
+        self.data_size = 0
+        self._head = bytearray()
+        self._buf = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+
+    def write(self, pcm: bytes):
+        self.data_size += len(pcm)
+        room = self.part_size - len(self._head)
+        if room > 0:
+            self._head += pcm[:room]
+            pcm = pcm[room:]
+        self._buf += pcm
+        stream_stats.buffered(len(self._head) + len(self._buf))
+        while len(self._buf) >= self.part_size:
+            self._upload_part(len(self._parts) + 2, bytes(self._buf[: self.part_size]))
+            del self._buf[: self.part_size]
+
+    def _upload_part(self, n: int, body: bytes):
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType="audio/wav", ACL="private",
+            )["UploadId"]
+        resp = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=n, Body=body)
+        self._parts.append({"PartNumber": n, "ETag": resp["ETag"]})
+
+    def finish(self, info: wav.WavInfo) -> int:
+        hdr = wav.header(info, self.data_size)
+        if self._upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket, Key=self.key, Body=hdr + bytes(self._head) + bytes(self._buf),
+                ContentType="audio/wav", ACL="private",
+            )
+        else:
+            if self._buf:
+                self._upload_part(len(self._parts) + 2, bytes(self._buf))
+            self._upload_part(1, hdr + bytes(self._head))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": sorted(self._parts, key=lambda p: p["PartNumber"])},
+            )
+        self._head = bytearray()
+        self._buf = bytearray()
+        return len(hdr) + self.data_size
+
+    def abort(self):
+        self._head = bytearray()
+        self._buf = bytearray()
+        if self._upload_id is not None:
+            try:
+                self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception:
+                log.warning("abort_multipart_upload failed for %s", self.key, exc_info=True)
+            self._upload_id = None
+
+
+def stitch(s3, bucket: str, keys: List[str], dest_key: str, concurrency: int = STITCH_FETCH_CONCURRENCY) -> Dict[str, Any]:
+    """Concatenate WAV objects `keys` (same fmt) into `dest_key`. Raises wav.WavError on bad input."""
+    writer = WavPartWriter(s3, bucket, dest_key)
+    first: Optional[wav.WavInfo] = None
+    try:
+        for k, body in fetch_ordered(s3, bucket, keys, concurrency):
+            info = wav.parse(body, k)
+            if first is None:
+                first = info
+            elif not info.same_format(first):
+                raise wav.WavError(
+                    f"{k}: format {info.channels}ch/{info.sample_rate}Hz/{info.bits_per_sample}bit "
+                    f"differs from {first.channels}ch/{first.sample_rate}Hz/{first.bits_per_sample}bit"
+                )
+            writer.write(memoryview(body)[info.data_offset:info.data_offset + info.data_size])
+        if first is None:
+            raise wav.WavError("no segments")
+        size = writer.finish(first)
+    except BaseException:
+        writer.abort()
+        raise
+    return {
+        "segments": len(keys),
+        "bytes": size,
+        "durationSeconds": round(writer.data_size / first.byte_rate, 3) if first.byte_rate else None,
+    }
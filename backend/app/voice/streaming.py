@@ -0,0 +1,280 @@
+# backend/app/voice/streaming.py
+# Request-body streaming for voice uploads: a multipart/form-data file field (or a raw
+# audio body) is read chunk by chunk from the ASGI stream and handed to the destination
+# (STT request body or an S3 multipart upload) without spooling to memory or disk.
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+log = logging.getLogger("clinic-os.voice.streaming")
+
+# ---------- ENV ----------
+VOICE_MAX_UPLOAD_BYTES = int(os.getenv("VOICE_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+AUDIO_PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("AUDIO_PART_SIZE", str(8 * 1024 * 1024))))  # S3 minimum 5 MB
+
+S3_MIN_PART = 5 * 1024 * 1024
+
+# OpenAPI body for routes that parse multipart themselves
+def multipart_file_body(field: str) -> Dict[str, Any]:
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": [field],
+                        "properties": {field: {"type": "string", "format": "binary"}},
+                    }
+                },
+                "audio/wav": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
+
+
+class _Stats:
+    """Per-worker counters; `peakBufferBytes` is the largest body buffer any request held."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.rejected_too_large = 0
+        self.peak_buffer = 0
+
+    def buffered(self, n: int):
+        if n > self.peak_buffer:
+            with self._lock:
+                self.peak_buffer = max(self.peak_buffer, n)
+
+    def add(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "bytes": self.bytes,
+                "rejectedTooLarge": self.rejected_too_large,
+                "peakBufferBytes": self.peak_buffer,
+                "maxUploadBytes": VOICE_MAX_UPLOAD_BYTES,
+                "partSize": AUDIO_PART_SIZE,
+            }
+
+
+stream_stats = _Stats()
+
+
+class UploadStream:
+    """
+    Streams one file field out of a multipart/form-data request (or the whole body
+    for audio/* requests). `await open()` parses up to the file part's headers;
+    iterating yields its bytes as they arrive. Form fields before the file are kept
+    in `fields`; anything after it is ignored.
+    """
+
+    def __init__(self, request: Request, field: str, max_bytes: int = VOICE_MAX_UPLOAD_BYTES):
+        self.request = request
+        self.field = field
+        self.max_bytes = max_bytes
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.fields: Dict[str, str] = {}
+        self.size = 0
+        self._body = request.stream()
+        self._parser: Optional[MultipartParser] = None
+        self._pending: List[bytes] = []
+        self._raw = False
+        self._eof = False
+        self._found = False
+        self._done = False  # target part finished
+
+        # per-part parser state
+        self._hname = b""
+        self._hval = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._in_target = False
+        self._other_name: Optional[str] = None
+        self._other_val: List[bytes] = []
+
+    # ---- multipart callbacks ----
+    def _on_part_begin(self):
+        self._headers = {}
+        self._in_target = False
+        self._other_name = None
+        self._other_val = []
+
+    def _on_header_field(self, data, start, end):
+        self._hname += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._hval += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._hname.lower()] = self._hval
+        self._hname = b""
+        self._hval = b""
+
+    def _on_headers_finished(self):
+        _, opts = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = opts.get(b"name", b"").decode("latin-1")
+        if name == self.field and not self._found:
+            self._found = self._in_target = True
+            self.filename = opts.get(b"filename", b"").decode("utf-8", "replace") or None
+            self.content_type = self._headers.get(b"content-type", b"").decode("latin-1") or None
+        else:
+            self._other_name = name
+
+    def _on_part_data(self, data, start, end):
+        if self._in_target:
+            self._pending.append(bytes(data[start:end]))
+        elif self._other_name is not None and sum(map(len, self._other_val)) < 4096:
+            self._other_val.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_target:
+            self._in_target = False
+            self._done = True
+        elif self._other_name:
+            self.fields[self._other_name] = b"".join(self._other_val).decode("utf-8", "replace")
+
+    # ---- reading ----
+    async def open(self) -> "UploadStream":
+        ctype, opts = parse_options_header(self.request.headers.get("content-type", ""))
+        stream_stats.add(requests=1)
+        if ctype == b"multipart/form-data":
+            boundary = opts.get(b"boundary")
+            if not boundary:
+                raise HTTPException(status_code=400, detail="Missing multipart boundary")
+            self._parser = MultipartParser(boundary, {
+                "on_part_begin": self._on_part_begin,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+            })
+            while not self._found and not self._eof:
+                await self._feed()
+            if not self._found:
+                raise HTTPException(status_code=422, detail=f"Missing form field '{self.field}'")
+        elif ctype.startswith(b"audio/") or ctype == b"application/octet-stream":
+            self._raw = self._found = True
+            self.content_type = ctype.decode("latin-1")
+        else:
+            raise HTTPException(status_code=415, detail="Expected multipart/form-data or an audio/* body")
+        return self
+
+    async def _feed(self):
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            if self._parser is not None:
+                self._parser.finalize()
+            return
+        if not chunk:
+            return
+        if self._raw:
+            self._pending.append(chunk)
+        else:
+            self._parser.write(chunk)
+
+    def _take(self) -> bytes:
+        data = b"".join(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending = []
+        self.size += len(data)
+        stream_stats.buffered(len(data))
+        if self.size > self.max_bytes:
+            stream_stats.add(rejected_too_large=1)
+            raise HTTPException(status_code=413, detail=f"Audio exceeds {self.max_bytes} bytes")
+        return data
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            if self._pending:
+                yield self._take()
+                continue
+            if self._eof or (self._done and not self._raw):
+                break
+            await self._feed()
+        stream_stats.add(bytes=self.size)
+
+
+class S3StreamUpload:
+    """
+    Streams bytes to one S3 object: bodies below `part_size` become a single
+    put_object, larger ones a multipart upload with one part in flight, so a
+    request never holds more than ~`part_size` + one chunk. boto3 calls run in
+    worker threads to keep the event loop free.
+    """
+
+    def __init__(self, s3, bucket: str, key: str, content_type: str = "audio/wav", part_size: int = AUDIO_PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(S3_MIN_PART, part_size)
+        self.size = 0
+        self._buf = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+
+    async def write(self, data: bytes):
+        self._buf += data
+        self.size += len(data)
+        stream_stats.buffered(len(self._buf))
+        while len(self._buf) >= self.part_size:
+            part = bytes(self._buf[: self.part_size])
+            del self._buf[: self.part_size]
+            await self._upload_part(part)
+
+    async def _upload_part(self, body: bytes):
+        if self._upload_id is None:
+            resp = await asyncio.to_thread(
+                self.s3.create_multipart_upload,
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type, ACL="private",
+            )
+            self._upload_id = resp["UploadId"]
+        n = len(self._parts) + 1
+        resp = await asyncio.to_thread(
+            self.s3.upload_part,
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=n, Body=body,
+        )
+        self._parts.append({"PartNumber": n, "ETag": resp["ETag"]})
+
+    async def complete(self) -> int:
+        if self._upload_id is None:
+            await asyncio.to_thread(
+                self.s3.put_object,
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buf), ContentType=self.content_type, ACL="private",
+            )
+        else:
+            if self._buf:
+                await self._upload_part(bytes(self._buf))
+            await asyncio.to_thread(
+                self.s3.complete_multipart_upload,
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts},
+            )
+        self._buf = bytearray()
+        return self.size
+
+    async def abort(self):
+        self._buf = bytearray()
+        if self._upload_id is not None:
+            try:
+                await asyncio.to_thread(
+                    self.s3.abort_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                )
+            except Exception:
+                log.warning("abort_multipart_upload failed for %s", self.key, exc_info=True)
+            self._upload_id = None
@@ -0,0 +1,171 @@
+# backend/app/voice/stt.py
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+log = logging.getLogger("clinic-os.voice.stt")
+
+# ---------- ENV ----------
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_STT_URL = "https://api.openai.com/v1/audio/transcriptions"
+# Any Whisper-compatible /audio/transcriptions endpoint (e.g. bench/stt_stub.py locally)
+STT_URL = os.getenv("STT_URL", OPENAI_STT_URL).strip()
+STT_MODEL = os.getenv("STT_MODEL", "whisper-1")
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "60"))
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "8"))   # in-flight upstream calls per worker
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "16"))              # keep-alive connections per worker
+STT_BACKEND = os.getenv("STT_BACKEND", "whisper").strip().lower()  # whisper | stub
+STT_STUB_LATENCY = float(os.getenv("STT_STUB_LATENCY", "0"))
+
+
+class SttError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"STT upstream error {status}")
+        self.status = status
+        self.body = body
+
+
+async def _close_elsewhere(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]):
+    """Close a session created on another event loop; its sockets can only be closed there."""
+    if loop is None or loop.is_closed():
+        # nothing can run on a closed loop: release the pool without touching its
+        # transports (they are reclaimed with the loop's sockets)
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            await connector.close()
+    elif loop.is_running():
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+    else:
+        await asyncio.to_thread(loop.run_until_complete, session.close())
+
+
+class SttClient:
+    """
+    Whisper-style transcription over one shared aiohttp session (pooled keep-alive
+    connections). A semaphore caps in-flight upstream requests; callers beyond the
+    cap wait on the event loop instead of blocking it.
+    """
+
+    def __init__(self, url: str, api_key: str, model: str, timeout: float, max_concurrency: int, pool_size: int):
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.pool_size = max(1, pool_size)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests = 0
+        self.errors = 0
+        self.inflight = 0
+        self.waiting = 0
+
+    @property
+    def needs_api_key(self) -> bool:
+        return self.url == OPENAI_STT_URL
+
+    async def _ensure(self):
+        # session + semaphore belong to the running loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            old, old_loop = self._session, self._loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            if old is not None and not old.closed:
+                await _close_elsewhere(old, old_loop)
+        return self._session, self._sem
+
+    async def transcribe(self, audio: Any, filename: str, content_type: str, lang: Optional[str] = None) -> str:
+        """`audio` may be bytes, a file object or an async iterator of bytes (sent chunked)."""
+        session, sem = await self._ensure()
+        form = aiohttp.FormData()
+        form.add_field("file", audio, filename=filename or "audio.wav", content_type=content_type or "audio/wav")
+        form.add_field("model", self.model)
+        form.add_field("temperature", "0")
+        if lang:
+            form.add_field("language", lang)
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        self.requests += 1
+        try:
+            async with session.post(self.url, data=form, headers=headers) as resp:
+                if resp.status != 200:
+                    raise SttError(resp.status, await resp.text())
+                data = await resp.json(content_type=None)
+        except (SttError, aiohttp.ClientError, asyncio.TimeoutError):
+            self.errors += 1
+            raise
+        finally:
+            self.inflight -= 1
+            sem.release()
+        return (data.get("text") or "").strip()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "maxConcurrency": self.max_concurrency,
+            "poolSize": self.pool_size,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class StubStt:
+    """
+    In-process stand-in (STT_BACKEND=stub): no network, same interface as SttClient.
+    The text is derived from the audio bytes, so identical input gives identical output.
+    """
+
+    needs_api_key = False
+    model = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    async def transcribe(self, audio: Any, filename: str, content_type: str, lang: Optional[str] = None) -> str:
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            data = bytes(audio)
+        elif hasattr(audio, "read"):
+            data = audio.read()
+        else:
+            data = b"".join([c async for c in audio])
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return f"[{lang or 'auto'} {len(data)}b {hashlib.sha256(data).hexdigest()[:8]}]"
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "stub", "latency": self.latency, "requests": self.requests}
+
+
+if STT_BACKEND == "stub":
+    stt_client = StubStt(STT_STUB_LATENCY)
+else:
+    stt_client = SttClient(STT_URL, OPENAI_API_KEY, STT_MODEL, STT_TIMEOUT, STT_MAX_CONCURRENCY, STT_POOL_SIZE)
@@ -0,0 +1,199 @@
+# backend/app/voice/transcript_cache.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("clinic-os.voice.cache")
+
+# ---------- ENV ----------
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", "86400"))       # 0 disables the cache
+TRANSCRIPT_CACHE_MAX = int(os.getenv("TRANSCRIPT_CACHE_MAX", "2048"))          # memory entries
+TRANSCRIPT_CACHE_DIR = (os.getenv("TRANSCRIPT_CACHE_DIR") or "").strip()       # optional disk tier
+TRANSCRIPT_CACHE_DISK_MAX = int(os.getenv("TRANSCRIPT_CACHE_DISK_MAX", "50000"))
+# Bodies up to this size are buffered and hashed before the STT call (lookup + coalescing);
+# larger ones stream straight through to STT and bypass the cache.
+TRANSCRIPT_CACHE_MAX_AUDIO = int(os.getenv("TRANSCRIPT_CACHE_MAX_AUDIO", str(10 * 1024 * 1024)))
+
+
+def cache_key(digest: str, lang: Optional[str], variant: str = "") -> str:
+    """`variant` distinguishes anything else that changes the transcript (model, preprocessing)."""
+    return f"{digest}:{(lang or 'auto').lower()}:{variant}"
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class _Flight:
+    """One upstream computation and the number of requests currently waiting on it."""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[str]"):
+        self.task = task
+        self.waiters = 0
+
+
+class TranscriptCache:
+    """
+    Transcripts keyed by sha256(audio) + lang. Memory LRU with TTL in front of an
+    optional on-disk tier (one JSON file per key, oldest evicted past the cap).
+    Identical concurrent misses share one upstream call. Entries remember how long
+    the STT call took so hits can report the upstream time saved.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, disk_dir: str = "", disk_max: int = 0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max = disk_max
+        self._mem: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()  # key -> (expires, text, cost)
+        self._inflight: Dict[str, _Flight] = {}
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.saved_seconds = 0.0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    # ---- disk tier ----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str, float]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as fh:
+                rec = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if rec.get("key") != key or rec.get("expires", 0) <= time.time():
+            return None
+        # disk stores wall-clock expiry; memory uses monotonic
+        return time.monotonic() + (rec["expires"] - time.time()), rec["text"], rec.get("cost", 0.0)
+
+    def _disk_put(self, key: str, text: str, cost: float):
+        tmp = self._path(key) + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"key": key, "text": text, "cost": cost, "expires": time.time() + self.ttl}, fh, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            log.warning("transcript cache disk write failed", exc_info=True)
+            return
+        self._disk_writes += 1
+        if self.disk_max and self._disk_writes % 100 == 0:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        try:
+            entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith(".json")]
+        except OSError:
+            return
+        now = time.time()
+        # expired first, then oldest beyond the cap
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        over = len(entries) - self.disk_max
+        for i, e in enumerate(entries):
+            if i < over or e.stat().st_mtime + self.ttl < now:
+                try:
+                    os.remove(e.path)
+                except OSError:
+                    pass
+
+    # ---- memory tier ----
+    def _mem_put(self, key: str, rec: Tuple[float, str, float]):
+        self._mem[key] = rec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    async def lookup(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        rec = self._mem.get(key)
+        if rec is not None and rec[0] > time.monotonic():
+            self._mem.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += rec[2]
+            return rec[1]
+        if self.disk_dir:
+            rec = await asyncio.to_thread(self._disk_get, key)
+            if rec is not None:
+                self._mem_put(key, rec)
+                self.disk_hits += 1
+                self.saved_seconds += rec[2]
+                return rec[1]
+        return None
+
+    async def store(self, key: str, text: str, cost: float):
+        if not self.enabled:
+            return
+        self._mem_put(key, (time.monotonic() + self.ttl, text, cost))
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, text, cost)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> Tuple[str, str]:
+        """Returns (text, source) with source in hit | coalesced | miss."""
+        hit = await self.lookup(key)
+        if hit is not None:
+            return hit, "hit"
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            source = "coalesced"
+        else:
+            # the upstream call runs as its own task: any one caller going away (the first
+            # included) leaves it running for the others; it is cancelled with the last one
+            flight = self._inflight[key] = _Flight(asyncio.create_task(self._compute(key, compute)))
+            self.misses += 1
+            source = "miss"
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), source
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        t0 = time.perf_counter()
+        try:
+            text = await compute()
+            await self.store(key, text, time.perf_counter() - t0)
+            return text
+        except BaseException:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.disk_hits + self.coalesced
+        total = served + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._mem),
+            "maxEntries": self.max_entries,
+            "disk": bool(self.disk_dir),
+            "hits": self.hits,
+            "diskHits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hitRate": round(served / total, 4) if total else 0.0,
+            "savedUpstreamSeconds": round(self.saved_seconds, 3),
+        }
+
+
+transcript_cache = TranscriptCache(TRANSCRIPT_CACHE_TTL, TRANSCRIPT_CACHE_MAX, TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_DISK_MAX)
@@ -0,0 +1,77 @@
+# backend/app/voice/wav.py
+# Minimal RIFF/WAVE support for concatenating recorder segments without ffmpeg.
+import struct
+from typing import NamedTuple, Optional
+
+MAX_DATA_SIZE = 0xFFFFFFFF - 36  # RIFF sizes are 32-bit
+
+
+class WavError(ValueError):
+    pass
+
+
+class WavInfo(NamedTuple):
+    audio_format: int
+    channels: int
+    sample_rate: int
+    byte_rate: int
+    block_align: int
+    bits_per_sample: int
+    fmt_chunk: bytes      # raw fmt body, copied verbatim into stitched output
+    data_offset: int      # first PCM byte
+    data_size: int        # PCM bytes available in this buffer (whole frames only)
+
+    def same_format(self, other: "WavInfo") -> bool:
+        return self.fmt_chunk == other.fmt_chunk
+
+
+def parse(buf: bytes, name: str = "wav") -> WavInfo:
+    """Parse and validate a WAV buffer. Chunks before `data` (LIST, fact, ...) are skipped;
+    a data size of 0 / 0xFFFFFFFF (streamed recorders) means "to end of buffer"."""
+    if len(buf) < 12 or buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+        raise WavError(f"{name}: not a RIFF/WAVE file")
+    pos = 12
+    fmt: Optional[bytes] = None
+    while pos + 8 <= len(buf):
+        cid, size = buf[pos:pos + 4], struct.unpack_from("<I", buf, pos + 4)[0]
+        body = pos + 8
+        if cid == b"fmt ":
+            if size < 16 or body + size > len(buf):
+                raise WavError(f"{name}: truncated fmt chunk")
+            fmt = bytes(buf[body:body + size])
+        elif cid == b"data":
+            if fmt is None:
+                raise WavError(f"{name}: data chunk before fmt chunk")
+            audio_format, channels, rate, byte_rate, align, bits = struct.unpack_from("<HHIIHH", fmt)
+            if channels < 1 or align < 1 or rate < 1:
+                raise WavError(f"{name}: invalid fmt chunk")
+            avail = len(buf) - body
+            n = avail if size in (0, 0xFFFFFFFF) or size > avail else size
+            n -= n % align  # drop a trailing partial frame
+            return WavInfo(audio_format, channels, rate, byte_rate, align, bits, fmt, body, n)
+        pos = body + size + (size & 1)  # chunks are word aligned
+    raise WavError(f"{name}: no data chunk")
+
+
+def header(info: WavInfo, data_size: int) -> bytes:
+    """RIFF header (RIFF + fmt + data chunk header) for `data_size` PCM bytes in `info`'s format."""
+    if data_size > MAX_DATA_SIZE - len(info.fmt_chunk):
+        raise WavError("stitched audio exceeds the 4 GB WAV limit")
+    fmt = info.fmt_chunk + (b"\0" if len(info.fmt_chunk) & 1 else b"")
+    riff_size = 4 + (8 + len(fmt)) + (8 + data_size)
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(info.fmt_chunk)) + fmt
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def header_size(info: WavInfo) -> int:
+    return 12 + 8 + len(info.fmt_chunk) + (len(info.fmt_chunk) & 1) + 8
+
+
+def pcm_info(sample_rate: int, channels: int = 1, bits: int = 16) -> WavInfo:
+    """WavInfo for plain integer PCM (format 1), e.g. to write freshly encoded audio."""
+    align = channels * bits // 8
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * align, align, bits)
+    return WavInfo(1, channels, sample_rate, sample_rate * align, align, bits, fmt, 0, 0)
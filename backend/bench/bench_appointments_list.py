@@ -0,0 +1,114 @@
+# backend/bench/bench_appointments_list.py
+# GET /appointments/{patientId} for a 500-item page against DynamoDB Local: response
+# bytes (plain and gzip), read units and query + serialisation time per view.
+#   docker run -p 8001:8000 amazon/dynamodb-local
+#   DYNAMODB_LOCAL_URL=http://localhost:8001 python bench/bench_appointments_list.py [items]
+import os
+import sys
+import gzip
+import json
+import time
+import uuid
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not (os.getenv("DYNAMODB_LOCAL_URL") or "").strip():
+    sys.exit("Set DYNAMODB_LOCAL_URL to a DynamoDB Local endpoint")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+os.environ.setdefault("DDB_TABLE_APPOINTMENTS", "bench_appointments")
+os.environ.setdefault("COGNITO_USER_POOL_ID", "bench")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from boto3.dynamodb.conditions import Key  # noqa: E402
+
+from app.db import dynamo  # noqa: E402
+from app.appointments import router as appts  # noqa: E402
+
+VIEWS = [
+    ("before (full + _raw)", {"view": "full", "raw": True}),
+    ("view=full (default)", {"view": "full"}),
+    ("view=summary", {"view": "summary"}),
+    ("fields=dateISO,timeSlot,status", {"view": "summary", "fields": "dateISO,timeSlot,status"}),
+]
+
+
+def _ensure_table():
+    cl = dynamo.client()
+    if appts.DDB_TABLE_APPOINTMENTS in cl.list_tables()["TableNames"]:
+        return
+    cl.create_table(
+        TableName=appts.DDB_TABLE_APPOINTMENTS,
+        KeySchema=[{"AttributeName": "patientId", "KeyType": "HASH"}, {"AttributeName": "appointmentId", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "patientId", "AttributeType": "S"}, {"AttributeName": "appointmentId", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def _seed(pid: str, n: int):
+    with dynamo.table(appts.DDB_TABLE_APPOINTMENTS).batch_writer() as bw:
+        for i in range(n):
+            bw.put_item(Item={
+                "patientId": pid,
+                "appointmentId": f"{i:05d}-{uuid.uuid4()}",
+                "createdAt": f"2030-01-01T09:{i % 60:02d}:00+00:00",
+                "recordType": "doctor",
+                "status": "BOOKED",
+                "source": "kiosk",
+                "doctorId": "doc-42",
+                "dateKey": f"2030-01-{1 + i % 28:02d}#10:{i % 60:02d}",
+                "contact": {"name": "Bench Patient", "phone": "+910000000000", "email": "bench@example.com"},
+                "appointment_details": {
+                    "dateISO": f"2030-01-{1 + i % 28:02d}", "timeSlot": f"10:{i % 60:02d}", "doctorId": "doc-42",
+                    "doctorName": "Dr Bench", "clinicName": "MedMitra Clinic", "specialty": "General Medicine",
+                    "consultationType": "in-person", "appointmentType": "walkin", "fee": "500",
+                    "symptoms": "fever, cough " * 8, "languages": ["en", "hi"],
+                },
+                "payment": {
+                    "status": "success", "total": 500, "provider": "razorpay", "method": "upi",
+                    "orderId": f"order_{uuid.uuid4().hex}", "paymentId": f"pay_{uuid.uuid4().hex}",
+                    "signature": uuid.uuid4().hex * 2, "verifiedAt": "2030-01-01T09:00:00+00:00",
+                },
+                "kiosk": {
+                    "source": "kiosk", "createdAt": "2030-01-01T09:00:00+00:00",
+                    "reason": {"selected": ["fever", "cough"], "custom": "since two days " * 6},
+                    "device": {"id": "kiosk-01", "ua": "Mozilla/5.0 (Linux; Android 12) kiosk " * 3},
+                },
+            })
+
+
+def _rcu(pid: str, limit: int, params) -> float:
+    out_fields, paths = appts._parse_fields(params.get("view", "full"), params.get("fields"))
+    kw = {"KeyConditionExpression": Key("patientId").eq(pid), "Limit": limit, "ReturnConsumedCapacity": "TOTAL"}
+    if paths is not None and not params.get("raw"):
+        kw["ProjectionExpression"], kw["ExpressionAttributeNames"] = appts._projection(paths)
+    return (dynamo.table(appts.DDB_TABLE_APPOINTMENTS).query(**kw).get("ConsumedCapacity") or {}).get("CapacityUnits", float("nan"))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    _ensure_table()
+    pid = f"bench-{uuid.uuid4().hex[:8]}"
+    _seed(pid, n)
+    print(f"{n} items, one page (limit={n})\n")
+    print(f"{'view':<32} {'bytes':>9} {'gzip':>8} {'RCU':>6} {'query ms':>9} {'encode ms':>10}")
+    for label, params in VIEWS:
+        q_ms, e_ms = [], []
+        for _ in range(3):
+            t0 = time.perf_counter()
+            data = appts._query_appointments(pid, n, None, params.get("view", "full"), params.get("fields"), params.get("raw", False))
+            t1 = time.perf_counter()
+            body = json.dumps(jsonable_encoder(data)).encode()  # what the route's response encoding does
+            t2 = time.perf_counter()
+            q_ms.append((t1 - t0) * 1000)
+            e_ms.append((t2 - t1) * 1000)
+        print(
+            f"{label:<32} {len(body):>9} {len(gzip.compress(body, 9)):>8} {_rcu(pid, n, params):>6} "
+            f"{statistics.median(q_ms):>9.1f} {statistics.median(e_ms):>10.1f}"
+        )
+    print("\nRCU: DynamoDB charges reads on item size before projection, so views only change bytes and time.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# backend/bench/bench_book_latency.py
+# Booking latency against DynamoDB Local: old 2x put_item vs one TransactWriteItems.
+#   docker run -p 8001:8000 amazon/dynamodb-local
+#   DYNAMODB_LOCAL_URL=http://localhost:8001 python bench/bench_book_latency.py [n]
+import os
+import sys
+import time
+import uuid
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not (os.getenv("DYNAMODB_LOCAL_URL") or "").strip():
+    sys.exit("Set DYNAMODB_LOCAL_URL to a DynamoDB Local endpoint")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+os.environ.setdefault("DDB_TABLE_APPOINTMENTS", "bench_appointments")
+os.environ.setdefault("DDB_TABLE_SLOTS", "bench_appointment_slots")
+
+from app.db import dynamo  # noqa: E402
+from app.appointments import book  # noqa: E402
+
+
+def _ensure_tables():
+    cl = dynamo.client()
+    existing = set(cl.list_tables()["TableNames"])
+    for name, hk, rk in (
+        (book.DDB_TABLE_APPTS, "patientId", "appointmentId"),
+        (book.DDB_TABLE_SLOTS, "resourceKey", "slotKey"),
+    ):
+        if name in existing:
+            continue
+        cl.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": hk, "KeyType": "HASH"}, {"AttributeName": rk, "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": hk, "AttributeType": "S"}, {"AttributeName": rk, "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def _payload(i: int, run: str) -> book.BookRequest:
+    return book.BookRequest(
+        patientId="bench-patient",
+        contact={"name": "Bench", "phone": "+910000000000"},
+        appointment_details={
+            "dateISO": "2030-01-01",
+            "timeSlot": f"{run}-{i:05d}",
+            "doctorId": "bench",
+            "doctorName": "Dr Bench",
+        },
+    )
+
+
+def _old_two_puts(payload: book.BookRequest):
+    # pre-transaction flow: conditional slot put, then appointment put
+    appt = payload.appointment_details
+    aid = str(uuid.uuid4())
+    slot_key = book._slot_key(appt.dateISO, appt.timeSlot)
+    now = book._now_iso()
+    dynamo.table(book.DDB_TABLE_SLOTS).put_item(
+        Item={"resourceKey": f"doctor#{appt.doctorId}", "slotKey": slot_key, "patientId": payload.patientId,
+              "appointmentId": aid, "createdAt": now},
+        ConditionExpression="attribute_not_exists(slotKey)",
+    )
+    dynamo.table(book.DDB_TABLE_APPTS).put_item(
+        Item={"patientId": payload.patientId, "appointmentId": aid, "createdAt": now, "recordType": "doctor",
+              "status": "BOOKED", "source": "kiosk", "contact": payload.contact.dict(),
+              "appointment_details": appt.dict(), "doctorId": appt.doctorId, "dateKey": slot_key},
+        ConditionExpression="attribute_not_exists(patientId) AND attribute_not_exists(appointmentId)",
+    )
+
+
+def _measure(label: str, fn, n: int):
+    run = uuid.uuid4().hex[:6]
+    fn(_payload(-1, run))  # warm the connection
+    samples = []
+    for i in range(n):
+        p = _payload(i, run)
+        t0 = time.perf_counter()
+        fn(p)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<22} p50={statistics.median(samples):6.2f} ms  p95={p95:6.2f} ms  (n={n})")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    book.s3 = None  # measure the DynamoDB path only
+    _ensure_tables()
+    _measure("before: 2x put_item", _old_two_puts, n)
+    _measure("after: transact_write", book.book_appointment, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# backend/bench/bench_direct_upload.py
+# Worker cost of kiosk audio uploads: proxied /audio-upload vs presigned direct-to-S3
+# (/audio-upload-url + PUT + /audio-upload-complete), against a local moto S3 server.
+#   pip install "moto[server]" requests httpx && python bench/bench_direct_upload.py [clips] [size_mb]
+import os
+import sys
+import time
+
+import requests
+from moto.server import ThreadedMotoServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLIPS = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+SIZE_MB = float(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+server = ThreadedMotoServer(port=0, verbose=False)
+server.start()
+host, port = server.get_host_and_port()
+os.environ.update(
+    S3_ENDPOINT_URL=f"http://{host}:{port}", AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench",
+    AWS_REGION="us-east-1", AUDIO_BUCKET_NAME="bench-audio", STT_BACKEND="stub",
+)
+
+from fastapi import FastAPI  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+from app.voice import router as voice, wav  # noqa: E402
+from app.voice.streaming import stream_stats  # noqa: E402
+
+
+def clip(size: int) -> bytes:
+    pcm = os.urandom(size - 44)
+    return wav.header(wav.pcm_info(16000, 1, 16), len(pcm)) + pcm
+
+
+def proxied(c: TestClient, body: bytes, seq: int):
+    r = c.post("/api/audio-upload", params={"session_id": "bench-proxy", "seq": seq},
+               files={"audio": ("a.wav", body, "audio/wav")})
+    r.raise_for_status()
+
+
+def direct(c: TestClient, body: bytes, seq: int):
+    plan = c.post("/api/audio-upload-url", params={"session_id": "bench-direct", "seq": seq, "size": len(body)}).json()
+    req = {"session_id": "bench-direct", "seq": seq}
+    if plan["mode"] == "put":
+        requests.put(plan["url"], data=body, headers=plan["headers"]).raise_for_status()
+    else:
+        ps, parts = plan["partSize"], []
+        for p in plan["parts"]:
+            i = p["partNumber"] - 1
+            resp = requests.put(p["url"], data=body[i * ps:(i + 1) * ps])
+            resp.raise_for_status()
+            parts.append({"partNumber": p["partNumber"], "etag": resp.headers["ETag"]})
+        req.update(uploadId=plan["uploadId"], parts=parts)
+    c.post("/api/audio-upload-complete", json=req).raise_for_status()
+
+
+def main():
+    voice.s3_client.create_bucket(Bucket="bench-audio")
+    app = FastAPI()
+    app.include_router(voice.router, prefix="/api")
+    body = clip(int(SIZE_MB * 1024 * 1024))
+    print(f"{CLIPS} clips x {SIZE_MB:g} MB against moto S3 at {host}:{port}\n")
+    # moto runs in this process, so heap numbers would include the stored objects;
+    # the request-body byte counter is what the API worker actually handled
+    print(f"{'flow':<8} {'bytes through API':>18} {'wall s':>8}")
+    with TestClient(app) as c:
+        for name, fn in (("proxied", proxied), ("direct", direct)):
+            before = stream_stats.snapshot()["bytes"]
+            t0 = time.perf_counter()
+            for seq in range(CLIPS):
+                fn(c, body, seq)
+            wall = time.perf_counter() - t0
+            through = stream_stats.snapshot()["bytes"] - before
+            print(f"{name:<8} {through:>18} {wall:>8.2f}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
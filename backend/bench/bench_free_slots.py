@@ -0,0 +1,72 @@
+# backend/bench/bench_free_slots.py
+# Free-slot engine: a week x N doctors, template bitmap minus booked set.
+#   python bench/bench_free_slots.py [doctors] [days]
+import os
+import sys
+import random
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.appointments.schedule import ScheduleBook  # noqa: E402
+
+
+def main():
+    doctors = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    random.seed(7)
+
+    book = ScheduleBook({
+        "default": {
+            "slotMinutes": 15,
+            "hours": {d: [["09:00", "17:00"]] for d in ("mon", "tue", "wed", "thu", "fri", "sat")},
+            "breaks": [["13:00", "14:00"]],
+            "holidays": [],
+        }
+    })
+    tpl = book.default
+    start = date(2025, 1, 6)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    open_labels = {d: tpl.labels_for(tpl.open_mask(d)) for d in dates}
+
+    # ~40% of open slots booked per resource-day
+    booked = {
+        f"doctor#{i}": {d: random.sample(open_labels[d], int(len(open_labels[d]) * 0.4)) for d in dates}
+        for i in range(doctors)
+    }
+
+    def run():
+        for rk, by_date in booked.items():
+            book.free_slots(rk, by_date, dates, next_n=5)
+
+    def run_naive():
+        # what clients did before: rebuild the hour list and filter with list membership
+        for rk, by_date in booked.items():
+            for d in dates:
+                taken = by_date.get(d, [])
+                [t for t in open_labels[d] if t not in taken]
+
+    def run_masks():
+        # set algebra only (template & ~booked), no label decoding
+        for rk, by_date in booked.items():
+            for d in dates:
+                tpl.free_mask(d, by_date[d])
+
+    for rk, by_date in booked.items():
+        free, _ = book.free_slots(rk, by_date, dates)
+        for d in dates:
+            assert free[d] == [t for t in open_labels[d] if t not in by_date[d]]
+
+    n = 200
+    t_engine = min(timeit.repeat(run, number=n, repeat=5)) / n
+    t_masks = min(timeit.repeat(run_masks, number=n, repeat=5)) / n
+    t_naive = min(timeit.repeat(run_naive, number=n, repeat=5)) / n
+    print(f"{doctors} doctors x {days} days ({doctors * days} resource-days)")
+    print(f"bitmap engine : {t_engine * 1e6:9.1f} us/call  ({t_engine * 1e6 / (doctors * days):.2f} us/resource-day)")
+    print(f"mask ops only : {t_masks * 1e6:9.1f} us/call")
+    print(f"naive lists   : {t_naive * 1e6:9.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
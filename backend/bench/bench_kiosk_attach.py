@@ -0,0 +1,130 @@
+# backend/bench/bench_kiosk_attach.py
+# Kiosk attach against DynamoDB Local: old get_item + whole-map SET (ALL_NEW) vs one
+# nested-path update_item (UPDATED_NEW). Also counts keys lost when two attaches race,
+# and times a multi-slot checkout: one attach per appointment vs attach-batch.
+#   docker run -p 8001:8000 amazon/dynamodb-local
+#   DYNAMODB_LOCAL_URL=http://localhost:8001 python bench/bench_kiosk_attach.py [n]
+import os
+import sys
+import time
+import uuid
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not (os.getenv("DYNAMODB_LOCAL_URL") or "").strip():
+    sys.exit("Set DYNAMODB_LOCAL_URL to a DynamoDB Local endpoint")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+os.environ.setdefault("DDB_TABLE_APPOINTMENTS", "bench_appointments")
+
+from app.db import dynamo  # noqa: E402
+from app.appointments import kiosk_attach as ka  # noqa: E402
+
+
+def _ensure_table():
+    cl = dynamo.client()
+    if dynamo.DDB_TABLE_APPOINTMENTS in cl.list_tables()["TableNames"]:
+        return
+    cl.create_table(
+        TableName=dynamo.DDB_TABLE_APPOINTMENTS,
+        KeySchema=[{"AttributeName": "patientId", "KeyType": "HASH"}, {"AttributeName": "appointmentId", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "patientId", "AttributeType": "S"}, {"AttributeName": "appointmentId", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def _old_attach(tbl, pid: str, aid: str, kiosk):
+    # previous flow: read the row, merge in Python, write the whole map back
+    kiosk_in = dict(kiosk)
+    kiosk_in.setdefault("source", "kiosk")
+    kiosk_in["updatedAt"] = ka._now()
+    item = tbl.get_item(Key={"patientId": pid, "appointmentId": aid}).get("Item")
+    existing = item.get("kiosk") or {}
+    if "createdAt" not in existing:
+        kiosk_in.setdefault("createdAt", ka._now())
+    tbl.update_item(
+        Key={"patientId": pid, "appointmentId": aid},
+        UpdateExpression="SET #k = :k, #u = :u",
+        ExpressionAttributeNames={"#k": "kiosk", "#u": "updatedAt"},
+        ExpressionAttributeValues={":k": ka._ddb_value({**existing, **kiosk_in}), ":u": ka._now()},
+        ConditionExpression=ka._KEY_COND,
+        ReturnValues="ALL_NEW",
+    )
+
+
+def _new_attach(tbl, pid: str, aid: str, kiosk):
+    ka._attach(tbl, pid, aid, kiosk)
+
+
+def _row(tbl) -> tuple:
+    pid, aid = "bench-patient", uuid.uuid4().hex
+    # rows usually carry a sizeable kiosk map by the time payment lands
+    tbl.put_item(Item={"patientId": pid, "appointmentId": aid, "kiosk": {
+        "createdAt": ka._now(), "reason": {"selected": ["fever", "cough"], "custom": "x" * 400},
+        "device": {"id": "kiosk-01", "ua": "y" * 300},
+    }})
+    return pid, aid
+
+
+def _measure(label: str, fn, tbl, n: int):
+    pid, aid = _row(tbl)
+    fn(tbl, pid, aid, {"warm": True})
+    samples = []
+    for i in range(n):
+        payload = {"payment": {"status": "success", "amount": 499, "paymentId": f"pay_{i}"}}
+        t0 = time.perf_counter()
+        fn(tbl, pid, aid, payload)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<30} p50={statistics.median(samples):6.2f} ms  p95={p95:6.2f} ms  (n={n})")
+
+
+def _race(label: str, fn, tbl, rounds: int, writers: int = 4):
+    lost = 0
+    with ThreadPoolExecutor(writers) as ex:
+        for _ in range(rounds):
+            pid, aid = _row(tbl)
+            list(ex.map(lambda i: fn(tbl, pid, aid, {f"flag{i}": True}), range(writers)))
+            kiosk = tbl.get_item(Key={"patientId": pid, "appointmentId": aid})["Item"]["kiosk"]
+            lost += sum(1 for i in range(writers) if f"flag{i}" not in kiosk)
+    print(f"{label:<30} lost {lost} of {rounds * writers} concurrent keys")
+
+
+def _checkout(tbl, rounds: int, per_checkout: int = 6):
+    payload = {"payment": {"status": "success", "amount": 499, "paymentId": "pay_bench"}}
+
+    def rows():
+        return [ka.KioskPayload(patientId=pid, appointmentId=aid, kiosk=payload)
+                for pid, aid in (_row(tbl) for _ in range(per_checkout))]
+
+    flows = (
+        ("one /attach per appointment", lambda items: [_old_attach(tbl, p.patientId, p.appointmentId, p.kiosk) for p in items]),
+        ("attach-batch (concurrent)", lambda items: list(ka._batch_pool.map(ka._attach_result, items))),
+        ("attach-batch (allOrNothing)", ka._attach_all),
+    )
+    for label, fn in flows:
+        samples = []
+        for _ in range(rounds):
+            items = rows()
+            t0 = time.perf_counter()
+            fn(items)
+            samples.append((time.perf_counter() - t0) * 1000)
+        print(f"{label:<30} p50={statistics.median(samples):6.2f} ms  ({per_checkout} appointments, n={rounds})")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    _ensure_table()
+    tbl = dynamo.appointments_table()
+    _measure("before: get + whole-map SET", _old_attach, tbl, n)
+    _measure("after: nested-path update", _new_attach, tbl, n)
+    _race("before: get + whole-map SET", _old_attach, tbl, n // 4)
+    _race("after: nested-path update", _new_attach, tbl, n // 4)
+    _checkout(tbl, max(5, n // 10))
+
+
+if __name__ == "__main__":
+    main()
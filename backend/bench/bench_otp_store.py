@@ -0,0 +1,77 @@
+# backend/bench/bench_otp_store.py
+# OTP session store throughput: send (put) + verify (consume) per backend.
+#   python bench/bench_otp_store.py [n]                       # memory only
+#   DYNAMODB_LOCAL_URL=http://localhost:8001 python bench/bench_otp_store.py [n]   # + dynamodb
+import os
+import sys
+import time
+import random
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+os.environ.setdefault("DDB_TABLE_KIOSK_OTP", "bench_kiosk_otp")
+os.environ["OTP_STORE"] = "memory"  # keep the module singleton off the network
+
+from app.kiosk import otp_store as store_mod  # noqa: E402
+
+
+def _ensure_table(name: str):
+    from app.db import dynamo
+    cl = dynamo.client()
+    if name in cl.list_tables()["TableNames"]:
+        return
+    cl.create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": "phone", "KeyType": "HASH"}, {"AttributeName": "sessionId", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "phone", "AttributeType": "S"}, {"AttributeName": "sessionId", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def _flow(store, i: int):
+    phone = f"+9190{i:08d}"
+    sid = store.put_session(phone, f"sub-{i}", "123456")
+    if i % 4 == 0:  # a quarter of users mistype once
+        store.consume(phone, sid, "000000")
+    outcome, _ = store.consume(phone, sid, "123456")
+    assert outcome == store_mod.OK, outcome
+
+
+def _measure(store, n: int, threads: int):
+    samples = []
+
+    def one(i):
+        t0 = time.perf_counter()
+        _flow(store, i)
+        samples.append((time.perf_counter() - t0) * 1e6)
+
+    base = random.randint(0, 10 ** 6) * n
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(one, range(base, base + n)))
+    wall = time.perf_counter() - t0
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{store.name:<9} threads={threads:<3} {n / wall:9.0f} send+verify/s  "
+          f"p50={statistics.median(samples):8.1f} us  p95={p95:8.1f} us  (n={n})")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    stores = [store_mod.MemoryOtpStore(300, 5, 100000)]
+    if (os.getenv("DYNAMODB_LOCAL_URL") or "").strip():
+        _ensure_table(store_mod.DDB_TABLE_OTP)
+        stores.append(store_mod.DynamoOtpStore(store_mod.DDB_TABLE_OTP, 300, 5))
+    else:
+        print("DYNAMODB_LOCAL_URL not set; skipping the dynamodb backend")
+    for store in stores:
+        for threads in (1, 8):
+            _measure(store, n if store.name == "memory" else min(n, 500), threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# backend/bench/bench_preprocess.py
+# /transcribe-audio with and without ?preprocess on synthetic kiosk-style clips
+# (tone bursts between silent lead-in/tail, 44.1/48 kHz, mono/stereo) against the local
+# STT stub, whose latency grows with payload size (--per-mb, default 0.25 s/MB).
+#   pip install httpx numpy && python bench/bench_preprocess.py [--per-mb 0.25]
+import os
+import sys
+import time
+import struct
+import asyncio
+import argparse
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stt_stub  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--per-mb", type=float, default=0.25)
+ap.add_argument("--latency", type=float, default=0.05)
+ap.add_argument("--runs", type=int, default=3)
+args = ap.parse_args()
+
+os.environ["STT_URL"] = f"http://127.0.0.1:{stt_stub.start_in_thread(0, args.latency, args.per_mb)}/v1/audio/transcriptions"
+os.environ["TRANSCRIPT_CACHE_TTL"] = "0"  # measure the upstream path every time
+
+from fastapi import FastAPI  # noqa: E402
+from app.voice import wav  # noqa: E402
+from app.voice import router as voice  # noqa: E402
+
+# (name, rate, channels, lead-in s, speech s, tail s)
+CLIPS = [
+    ("48k-stereo-short", 48000, 2, 2.0, 3.0, 3.0),
+    ("48k-stereo-long", 48000, 2, 4.0, 12.0, 6.0),
+    ("44k-mono", 44100, 1, 1.5, 6.0, 2.5),
+    ("16k-mono-tight", 16000, 1, 0.1, 5.0, 0.1),
+]
+
+
+def make_clip(rate: int, channels: int, lead: float, speech: float, tail: float) -> bytes:
+    rng = np.random.default_rng(7)
+    n_lead, n_speech, n_tail = int(lead * rate), int(speech * rate), int(tail * rate)
+    t = np.arange(n_speech) / rate
+    # syllable-like bursts of a few harmonics under an envelope, plus room noise throughout
+    env = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) ** 0.5
+    voice_ = env * (0.3 * np.sin(2 * np.pi * 180 * t) + 0.15 * np.sin(2 * np.pi * 360 * t) + 0.05 * np.sin(2 * np.pi * 1250 * t))
+    x = np.concatenate([np.zeros(n_lead), voice_, np.zeros(n_tail)])
+    x += rng.normal(0, 10 ** (-60 / 20), len(x))
+    pcm = (np.clip(np.repeat(x[:, None], channels, axis=1), -1, 1) * 32767).astype("<i2").tobytes()
+    return wav.header(wav.pcm_info(rate, channels, 16), len(pcm)) + pcm
+
+
+async def main():
+    app = FastAPI()
+    app.include_router(voice.router, prefix="/api")
+    transport = httpx.ASGITransport(app=app)
+    print(f"stub latency {args.latency}s + {args.per_mb}s/MB, {args.runs} runs each\n")
+    print(f"{'clip':<18} {'bytes in':>10} {'bytes out':>10} {'ratio':>6} {'raw ms':>8} {'pp ms':>8} {'trim ms':>8} {'speedup':>8}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://t", timeout=120) as c:
+        for name, rate, ch, lead, speech, tail in CLIPS:
+            data = make_clip(rate, ch, lead, speech, tail)
+            timings = {}
+            report = None
+            for flag in ("false", "true"):
+                best = float("inf")
+                for _ in range(args.runs):
+                    t0 = time.perf_counter()
+                    r = await c.post(f"/api/transcribe-audio?preprocess={flag}", files={"file": ("a.wav", data, "audio/wav")})
+                    best = min(best, time.perf_counter() - t0)
+                    r.raise_for_status()
+                    if flag == "true":
+                        report = r.json()["preprocess"]
+                timings[flag] = best * 1000
+            out = report["bytesOut"]
+            print(
+                f"{name:<18} {len(data):>10} {out:>10} {len(data) / max(out, 1):>5.1f}x "
+                f"{timings['false']:>8.0f} {timings['true']:>8.0f} {report['ms']:>8.1f} "
+                f"{timings['false'] / timings['true']:>7.1f}x"
+            )
+
+        # headers whose block align disagrees with channels x bits: sent to STT as recorded
+        print(f"\n{'bad header':<18} {'status':>6}  preprocess")
+        for name, ch, align in (("1ch/16bit/align=4", 1, 4), ("2ch/16bit/align=2", 2, 2)):
+            pcm = make_clip(16000, 1, 0.2, 1.0, 0.2)[44:]
+            fmt = struct.pack("<HHIIHH", 1, ch, 16000, 16000 * align, align, 16)
+            bad = wav.header(wav.WavInfo(1, ch, 16000, 16000 * align, align, 16, fmt, 0, 0), len(pcm)) + pcm
+            r = await c.post("/api/transcribe-audio", files={"file": ("a.wav", bad, "audio/wav")})
+            print(f"{name:<18} {r.status_code:>6}  {r.json().get('preprocess')}")
+    await voice.stt_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
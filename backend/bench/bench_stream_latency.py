@@ -0,0 +1,95 @@
+# backend/bench/bench_stream_latency.py
+# Perceived latency (patient stops speaking -> transcript available) for the batch
+# /transcribe-audio flow vs the /transcribe-stream WebSocket, against the local STT stub.
+# The clip is streamed in real time (20 ms frames; --speed to accelerate).
+#   pip install httpx numpy && python bench/bench_stream_latency.py [--speed 1] [--latency 0.5] [--per-mb 2]
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stt_stub  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--speed", type=float, default=1.0)
+ap.add_argument("--latency", type=float, default=0.5, help="stub seconds per request")
+ap.add_argument("--per-mb", type=float, default=2.0, help="stub seconds per MB (~30 s of 16 kHz audio)")
+ap.add_argument("--utterances", type=int, default=4)
+args = ap.parse_args()
+
+os.environ["STT_URL"] = f"http://127.0.0.1:{stt_stub.start_in_thread(0, args.latency, args.per_mb)}/v1/audio/transcriptions"
+os.environ["TRANSCRIPT_CACHE_TTL"] = "0"
+
+from app.voice import wav  # noqa: E402
+from app.voice import router as voice  # noqa: E402
+
+RATE = 16000
+FRAME = RATE * 20 // 1000 * 2
+
+
+def make_pcm(utterances: int) -> bytes:
+    rng = np.random.default_rng(3)
+    parts = [np.zeros(RATE // 2)]
+    for i in range(utterances):
+        t = np.arange(int((1.5 + i % 3) * RATE)) / RATE
+        parts.append(0.3 * np.clip(np.sin(2 * np.pi * 3 * t), 0.2, None) * np.sin(2 * np.pi * (150 + 40 * i) * t))
+        parts.append(np.zeros(int(0.9 * RATE)))
+    x = np.concatenate(parts) + rng.normal(0, 1e-3, sum(map(len, parts)))
+    return (np.clip(x, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def main():
+    pcm = make_pcm(args.utterances)
+    clip_s = len(pcm) / (RATE * 2)
+    app = FastAPI()
+    app.include_router(voice.router, prefix="/api")
+    app.add_event_handler("shutdown", voice.stt_client.close)
+    print(f"clip {clip_s:.1f}s, {args.utterances} utterances, stub {args.latency}s + {args.per_mb}s/MB, speed x{args.speed}\n")
+
+    with TestClient(app) as c:
+        # batch: record everything, then upload + transcribe
+        t_rec = time.perf_counter()
+        time.sleep(clip_s / args.speed)
+        t_stop = time.perf_counter()
+        body = wav.header(wav.pcm_info(RATE, 1, 16), len(pcm)) + pcm
+        r = c.post("/api/transcribe-audio?preprocess=false", files={"file": ("a.wav", body, "audio/wav")})
+        r.raise_for_status()
+        batch_after_stop = time.perf_counter() - t_stop
+        batch_total = time.perf_counter() - t_rec
+
+        # streaming: frames go out while "speaking"
+        with c.websocket_connect("/api/transcribe-stream") as ws:
+            ws.receive_json()
+            t_rec = time.perf_counter()
+            for i in range(0, len(pcm), FRAME):
+                ws.send_bytes(pcm[i:i + FRAME])
+                target = t_rec + (i + FRAME) / (RATE * 2) / args.speed
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            t_stop = time.perf_counter()
+            ws.send_text(json.dumps({"type": "end"}))
+            partials = 0
+            while True:
+                m = ws.receive_json()
+                if m["type"] == "final":
+                    break
+                partials += m["type"] == "partial"
+            stream_after_stop = time.perf_counter() - t_stop
+            stream_total = time.perf_counter() - t_rec
+
+    print(f"{'flow':<8} {'after stop (ms)':>16} {'total (s)':>10}")
+    print(f"{'batch':<8} {batch_after_stop * 1000:>16.0f} {batch_total:>10.2f}")
+    print(f"{'stream':<8} {stream_after_stop * 1000:>16.0f} {stream_total:>10.2f}   ({partials} partials, {m['segments']} segments)")
+
+
+if __name__ == "__main__":
+    main()
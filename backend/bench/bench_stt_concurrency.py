@@ -0,0 +1,55 @@
+# backend/bench/bench_stt_concurrency.py
+# N concurrent /transcribe-audio upstream calls against the local STT stub:
+# blocking requests.post inside the event loop (old) vs the shared aiohttp client.
+#   python bench/bench_stt_concurrency.py [concurrency] [latency_s]
+import os
+import sys
+import time
+import asyncio
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stt_stub  # noqa: E402
+from app.voice.stt import SttClient  # noqa: E402
+
+AUDIO = b"RIFF" + b"\0" * (256 * 1024)  # 256 KB payload
+
+
+async def run_blocking(url: str, n: int):
+    async def one():
+        # what transcribe_audio did: a sync HTTP call on the event loop thread
+        files = {"file": ("a.wav", AUDIO, "audio/wav"), "model": (None, "whisper-1")}
+        requests.post(url, files=files, timeout=60).raise_for_status()
+    await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def run_async(client: SttClient, n: int):
+    await asyncio.gather(*(client.transcribe(AUDIO, "a.wav", "audio/wav") for _ in range(n)))
+    await client.close()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    port = stt_stub.start_in_thread(0, latency)
+    url = f"http://127.0.0.1:{port}/v1/audio/transcriptions"
+
+    t0 = time.perf_counter()
+    asyncio.run(run_blocking(url, n))
+    t_block = time.perf_counter() - t0
+
+    client = SttClient(url, "", "whisper-1", 60, max_concurrency=n, pool_size=n)
+    t0 = time.perf_counter()
+    asyncio.run(run_async(client, n))
+    t_async = time.perf_counter() - t0
+
+    print(f"{n} concurrent transcriptions, upstream latency {latency * 1000:.0f} ms")
+    print(f"blocking requests.post : {t_block:6.2f} s  (~{t_block / latency:.1f}x latency, serialised)")
+    print(f"shared aiohttp client  : {t_async:6.2f} s  (~{t_async / latency:.1f}x latency)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# backend/bench/bench_upload_memory.py
+# Peak Python heap per /transcribe-audio request: old UploadFile + read() + temp file
+# vs the streamed body (against the local STT stub).
+#   pip install httpx && python bench/bench_upload_memory.py [size_mb]
+import os
+import sys
+import asyncio
+import tempfile
+import tracemalloc
+
+import httpx
+from fastapi import FastAPI, File, UploadFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stt_stub  # noqa: E402
+
+os.environ["STT_URL"] = f"http://127.0.0.1:{stt_stub.start_in_thread(0, 0.0)}/v1/audio/transcriptions"
+
+from app.voice import router as voice  # noqa: E402
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(voice.router, prefix="/api")
+
+    @app.post("/old/transcribe-audio")
+    async def old_transcribe(file: UploadFile = File(...)):
+        # previous flow: whole upload in memory, then a temp file, then re-read for the post
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            tmp.write(await file.read())
+            path = tmp.name
+        try:
+            with open(path, "rb") as fh:
+                return {"transcript": await voice.stt_client.transcribe(fh.read(), "a.wav", "audio/wav")}
+        finally:
+            os.remove(path)
+
+    return app
+
+
+async def _peak(client: httpx.AsyncClient, path: str, size: int) -> float:
+    async def body():
+        chunk = b"\x01" * (64 * 1024)
+        for _ in range(size // len(chunk)):
+            yield chunk
+
+    boundary = "benchboundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.wav\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async def form():
+        yield head
+        async for c in body():
+            yield c
+        yield tail
+
+    tracemalloc.start()
+    r = await client.post(path, content=form(), headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    r.raise_for_status()
+    return peak / 1e6
+
+
+async def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 20 * 1024 * 1024
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://bench", timeout=120) as c:
+        old = await _peak(c, "/old/transcribe-audio", size)
+        new = await _peak(c, "/api/transcribe-audio", size)
+    await voice.stt_client.close()
+    print(f"upload {size / 1e6:.1f} MB")
+    print(f"old (read + temp file) : peak {old:7.1f} MB")
+    print(f"streamed               : peak {new:7.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
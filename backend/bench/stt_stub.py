@@ -0,0 +1,81 @@
+# backend/bench/stt_stub.py
+# Whisper-compatible /v1/audio/transcriptions stand-in for local runs and benches.
+#   python bench/stt_stub.py [--port 9100] [--latency 0.3] [--per-mb 0]
+#   STT_URL=http://127.0.0.1:9100/v1/audio/transcriptions uvicorn app.main:app
+import time
+import asyncio
+import argparse
+import threading
+
+from aiohttp import web
+
+
+def make_app(latency: float, per_mb: float = 0.0) -> web.Application:
+    """`per_mb` adds seconds per MB of audio (upload + decode cost that scales with payload)."""
+    stats = {"requests": 0, "bytes": 0, "concurrent": 0, "maxConcurrent": 0}
+
+    async def transcribe(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        stats["concurrent"] += 1
+        stats["maxConcurrent"] = max(stats["maxConcurrent"], stats["concurrent"])
+        try:
+            size, lang = 0, None
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "file":
+                    while True:
+                        chunk = await part.read_chunk(64 * 1024)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                elif part.name == "language":
+                    lang = (await part.text()).strip()
+            stats["bytes"] += size
+            await asyncio.sleep(latency + per_mb * size / (1024 * 1024))
+            return web.json_response({"text": f"stub transcript ({size} bytes, lang={lang or 'auto'})"})
+        finally:
+            stats["concurrent"] -= 1
+
+    async def get_stats(_request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application(client_max_size=1024 ** 3)
+    app.router.add_post("/v1/audio/transcriptions", transcribe)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def start_in_thread(port: int = 0, latency: float = 0.3, per_mb: float = 0.0) -> int:
+    """Serve on 127.0.0.1 from a daemon thread; returns the bound port."""
+    ready = threading.Event()
+    bound = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(make_app(latency, per_mb))
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        loop.run_until_complete(site.start())
+        bound["port"] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="stt-stub", daemon=True).start()
+    ready.wait(10)
+    return bound["port"]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--per-mb", type=float, default=0.0)
+    args = ap.parse_args()
+    port = start_in_thread(args.port, args.latency, args.per_mb)
+    print(f"STT stub on http://127.0.0.1:{port}/v1/audio/transcriptions (latency {args.latency}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass